@@ -0,0 +1,108 @@
+"""
+Concurrent throughput of /process-prompt against stubbed upstreams.
+
+Compares the previous request path (blocking OpenAI/Weaviate calls inside the
+async endpoint) with the async PromptProcessor.  Run from MinuteMate/back:
+
+    python -m benchmarks.bench_concurrency --requests 50 --concurrency 25
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+os.environ.setdefault('OPENAI_API_KEY', 'stub')
+os.environ.setdefault('WEAVIATE_ENDPOINT_URL', 'http://stub')
+os.environ.setdefault('WEAVIATE_API_KEY', 'stub')
+
+import main  # noqa: E402
+from benchmarks.stubs import (  # noqa: E402
+    StubAsyncOpenAI,
+    StubAsyncWeaviate,
+    StubBlockingOpenAI,
+    StubBlockingWeaviate,
+)
+
+
+def build_blocking_app(llm_latency: float, search_latency: float) -> FastAPI:
+    """Reproduce the old request path: four blocking upstream calls on the event loop"""
+    openai_client = StubBlockingOpenAI(llm_latency)
+    weaviate_client = StubBlockingWeaviate(search_latency)
+    app = FastAPI()
+
+    @app.post("/process-prompt", response_model=main.PromptResponse)
+    async def process_prompt_endpoint(prompt_request: main.PromptRequest):
+        openai_client.chat.completions.create(model="gpt-4o", messages=[])
+        results = weaviate_client.collections.get('MeetingDocument').query.bm25(query=prompt_request.user_prompt_text, limit=5)
+        generated = openai_client.chat.completions.create(model="gpt-4o", messages=[])
+        openai_client.chat.completions.create(model="gpt-4o", messages=[])
+        return main.PromptResponse(
+            generated_response=generated.choices[0].message.content,
+            context_segments=[
+                main.ContextSegment(chunk_id=0, content=item.properties['content']) for item in results.objects
+            ]
+        )
+
+    return app
+
+
+def build_async_app(llm_latency: float, search_latency: float) -> FastAPI:
+    """Use the real app with an async PromptProcessor wired to async stubs"""
+    main.preload_modules()  # what the startup task does before the first request
+    main.processor = main.PromptProcessor(
+        openai_client=StubAsyncOpenAI(llm_latency),
+        weaviate_client=StubAsyncWeaviate(search_latency)
+    )
+    return main.app
+
+
+async def run_load(app: FastAPI, total: int, concurrency: int) -> dict:
+    """Send `total` prompts with at most `concurrency` in flight and collect latencies"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        async def one(i: int):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/process-prompt", json={"user_prompt_text": f"Benchmark prompt {i}"})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2),
+        'p50_ms': round(statistics.median(latencies) * 1000, 1),
+        'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=25)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='seconds per stubbed OpenAI call')
+    parser.add_argument('--search-latency', type=float, default=0.05, help='seconds per stubbed Weaviate query')
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    for label, build in (('blocking (before)', build_blocking_app), ('async (after)', build_async_app)):
+        app = build(args.llm_latency, args.search_latency)
+        result = asyncio.run(run_load(app, args.requests, args.concurrency))
+        print(f"{label:>18}: {result}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,109 @@
+"""
+Keyword extraction on MinuteMate/test/test_data.json: RAKE phrases vs corpus IDF terms.
+
+The expected outputs and retrieval contexts of the test cases are split into
+chunk-sized passages to stand in for the MeetingDocument corpus.  Each extractor's
+keywords are scored with local BM25 over those passages; a passage is relevant if it
+comes from the test case's own retrieval context.  Run from MinuteMate/back:
+
+    python -m benchmarks.bench_keywords
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+from keywords import CorpusStats, KeywordExtractor, rake_keywords, terms
+from nltk_resources import missing_nltk_resources
+from rerank import STOPWORDS, term_overlap_scores
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), '..', '..', 'test', 'test_data.json')
+# Moderation test cases expect a refusal rather than retrieved context
+REFUSAL_PREFIX = "I can't"
+
+
+def split_passages(text: str, words: int) -> List[str]:
+    tokens = text.split()
+    return [' '.join(tokens[i:i + words]) for i in range(0, len(tokens), words)]
+
+
+def build_corpus(cases: List[dict], words: int) -> Tuple[List[str], List[Tuple[str, set]]]:
+    """Unique passages, and (prompt, indices of its relevant passages) for each distinct answerable prompt"""
+    passages: Dict[str, int] = {}
+    queries = []
+    for case in cases:
+        for passage in split_passages(case['expected_output'], words):
+            passages.setdefault(passage, len(passages))
+        relevant = {passages.setdefault(passage, len(passages))
+                    for passage in split_passages(case['retrieval_context'], words)}
+        if not case['retrieval_context'].startswith(REFUSAL_PREFIX) and case['prompt'] not in (q for q, _ in queries):
+            queries.append((case['prompt'], relevant))
+    return list(passages), queries
+
+
+def rake_without_nltk_data(text: str, count: int = 3) -> List[str]:
+    """RAKE with the built-in stopwords and a regex sentence split, for machines without NLTK data"""
+    from rake_nltk import Rake
+
+    rake = Rake(stopwords=set(STOPWORDS), sentence_tokenizer=lambda t: re.split(r'(?<=[.!?])\s+', t))
+    rake.extract_keywords_from_text(text)
+    return rake.get_ranked_phrases()[:count]
+
+
+def evaluate(extract: Callable[[str], List[str]], passages: List[str], queries: List[Tuple[str, set]], repeat: int) -> dict:
+    term_counts, reciprocal_ranks, hits = [], [], []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        keywords = [extract(prompt) for prompt, _ in queries]
+    elapsed = time.perf_counter() - start
+
+    for (prompt, relevant), query_keywords in zip(queries, keywords):
+        term_counts.append(len(set(terms(' '.join(query_keywords)))))
+        scores = term_overlap_scores(','.join(query_keywords), passages)
+        ranking = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+        first = next((rank for rank, i in enumerate(ranking) if i in relevant and scores[i] > 0), None)
+        reciprocal_ranks.append(0.0 if first is None else 1 / (first + 1))
+        hits.append(first is not None and first < 3)
+    return {
+        'us_per_prompt': round(elapsed / (repeat * len(queries)) * 1e6, 1),
+        'bm25_terms': round(statistics.mean(term_counts), 2),
+        'mrr': round(statistics.mean(reciprocal_ranks), 3),
+        'hit@3': round(sum(hits) / len(hits), 3),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--passage-words', type=int, default=60, help='words per stand-in chunk')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(TEST_DATA) as f:
+        cases = json.load(f)
+    passages, queries = build_corpus(cases, args.passage_words)
+    stats = CorpusStats()
+    stats.add(passages)
+    extractor = KeywordExtractor(stats)
+    print(f"{len(queries)} prompts, {len(passages)} passages")
+
+    missing = missing_nltk_resources()
+    if missing:
+        print(f"NLTK resources missing ({', '.join(missing)}), rake* approximates RAKE without them")
+        extractors = {'rake*': rake_without_nltk_data, 'idf': extractor.extract}
+    else:
+        extractors = {'rake': rake_keywords, 'idf': extractor.extract}
+
+    for label, extract in extractors.items():
+        print(f"{label:>5}: {evaluate(extract, passages, queries, args.repeat)}")
+    for prompt, _ in queries:
+        print(f"  {prompt[:60]!r}")
+        for label, extract in extractors.items():
+            print(f"    {label}={extract(prompt)}")
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,65 @@
+"""
+Import-time report for the backend worker.
+
+Imports `main` in a fresh interpreter with `-X importtime`, then again together
+with the client libraries that startup loads in the background, and prints wall
+time plus the slowest top-level imports.  Run from MinuteMate/back:
+
+    python -m benchmarks.bench_startup --top 15
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# Loaded by main.preload_modules() after the worker is serving
+DEFERRED_IMPORTS = 'import openai, rake_nltk, weaviate.classes.query'
+
+
+def import_report(statement: str) -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Wall seconds for `statement` in a new interpreter, and (module, self_us, cumulative_us) per import"""
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('OPENAI_API_KEY', 'WEAVIATE_ENDPOINT_URL', 'WEAVIATE_API_KEY')}
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        capture_output=True, text=True, env=env, check=True
+    )
+    elapsed = time.perf_counter() - start
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append((name.rstrip(), int(self_us), int(cumulative_us)))
+    return elapsed, modules
+
+
+def slowest(modules: List[Tuple[str, int, int]], depth: int, top: int) -> List[Tuple[str, int]]:
+    """Slowest imports nested at most `depth` levels below the statement, by cumulative time"""
+    # importtime indents each nesting level by two spaces after a single leading space
+    direct = [(name.strip(), cumulative) for name, _, cumulative in modules
+              if len(name) - len(name.lstrip()) <= 1 + 2 * depth]
+    return sorted(direct, key=lambda item: item[1], reverse=True)[:top]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=10, help='number of modules to list')
+    args = parser.parse_args()
+
+    # main's own imports, then the deferred libraries as a whole
+    for label, statement, depth in (('import main', 'import main', 1),
+                                    ('main + deferred clients', f'import main; {DEFERRED_IMPORTS}', 0)):
+        elapsed, modules = import_report(statement)
+        print(f"{label}: {elapsed * 1000:.0f} ms wall, {len(modules)} modules")
+        for name, cumulative in slowest(modules, depth, args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main_cli()
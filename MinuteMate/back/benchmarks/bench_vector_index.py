@@ -0,0 +1,117 @@
+"""
+Vector search latency: the local memory-mapped index vs a near_vector round trip.
+
+Builds a synthetic corpus of unit vectors (text-embedding-3-small sized) in a
+temporary LocalVectorIndex and times brute-force float16/int8 and IVF searches,
+with recall@k against exact float32 search.  The remote path is a real Weaviate
+near_vector query when --remote is given (WEAVIATE_ENDPOINT_URL/WEAVIATE_API_KEY),
+and a stub with --stub-latency otherwise.  Run from MinuteMate/back:
+
+    python -m benchmarks.bench_vector_index --rows 20000 --queries 200
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+from benchmarks.stubs import StubAsyncWeaviate
+from vector_index import LocalVectorIndex, VectorIndexConfig, normalize
+
+
+def percentiles(latencies_ms):
+    latencies_ms = sorted(latencies_ms)
+    return {
+        'p50_ms': round(statistics.median(latencies_ms), 3),
+        'p95_ms': round(latencies_ms[int(0.95 * (len(latencies_ms) - 1))], 3),
+    }
+
+
+def synthetic_corpus(rows: int, dimensions: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions))
+    vectors = centers[rng.integers(clusters, size=rows)] + 0.6 * rng.normal(size=(rows, dimensions))
+    return normalize(vectors)
+
+
+def build_index(directory: str, vectors: np.ndarray, dtype: str) -> LocalVectorIndex:
+    """An index over `vectors` whose uuids encode the corpus row (IVF may reorder rows)"""
+    index = LocalVectorIndex(directory, dtype)
+    keys = [str(uuid.UUID(int=row)) for row in range(len(vectors))]
+    fetched = [
+        SimpleNamespace(uuid=key, properties={'content': ''}, vector={'default': vector}) for key, vector in zip(keys, vectors)
+    ]
+    index.write(None, dict.fromkeys(keys, 0), fetched)
+    return index
+
+
+def bench_local(index: LocalVectorIndex, vectors: np.ndarray, queries: np.ndarray, k: int) -> dict:
+    exact_rows = [set(np.argsort(-(vectors @ query))[:k]) for query in queries]
+    latencies, recalls = [], []
+    for query, exact in zip(queries, exact_rows):
+        start = time.perf_counter()
+        results = index.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len({item.uuid.int for item in results} & exact) / k)
+    return {**percentiles(latencies), f'recall@{k}': round(statistics.mean(recalls), 3)}
+
+
+async def bench_remote(client, queries: np.ndarray, k: int) -> dict:
+    collection = client.collections.get('MeetingDocument')
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await collection.query.near_vector(near_vector=query.tolist(), limit=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+async def remote_result(args, queries: np.ndarray) -> dict:
+    if not args.remote:
+        return await bench_remote(StubAsyncWeaviate(latency=args.stub_latency / 1000), queries, args.k)
+    from main import WeaviateConfig
+
+    client = WeaviateConfig.get_weaviate_client(os.environ['WEAVIATE_ENDPOINT_URL'], os.environ['WEAVIATE_API_KEY'])
+    await client.connect()
+    try:
+        return await bench_remote(client, queries, args.k)
+    finally:
+        await client.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--dimensions', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--remote', action='store_true', help='time a real Weaviate near_vector query')
+    parser.add_argument('--stub-latency', type=float, default=40, help='ms per stubbed near_vector round trip')
+    args = parser.parse_args()
+
+    vectors = synthetic_corpus(args.rows, args.dimensions)
+    queries = normalize(vectors[np.random.default_rng(1).integers(args.rows, size=args.queries)]
+                        + 0.3 * np.random.default_rng(2).normal(size=(args.queries, args.dimensions)))
+    for label, dtype, ivf_min_rows in (('brute float16', 'float16', args.rows + 1), ('brute int8', 'int8', args.rows + 1),
+                                       ('ivf int8', 'int8', 0)):
+        with tempfile.TemporaryDirectory() as directory, patch.object(VectorIndexConfig, 'IVF_MIN_ROWS', ivf_min_rows):
+            start = time.perf_counter()
+            index = build_index(directory, vectors, dtype)
+            build_s = time.perf_counter() - start
+            result = bench_local(index, vectors, queries, args.k)
+            print(f"{label:>16}: {result} (build {build_s:.1f}s, {index.snapshot.codes.nbytes / 2 ** 20:.0f} MiB)")
+
+    label = 'remote weaviate' if args.remote else 'remote stub'
+    print(f"{label:>16}: {asyncio.run(remote_result(args, queries))}")
+
+
+if __name__ == '__main__':
+    main_cli()
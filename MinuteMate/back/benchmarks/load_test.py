@@ -0,0 +1,231 @@
+"""
+Open-loop load test of /process-prompt.
+
+Replays the prompts in MinuteMate/test/test_data.json at a target rate and
+prints a JSON report: latency percentiles, throughput, errors, and the
+per-stage breakdown from each response's stage_timings_ms.  Requests are sent
+on schedule whether or not earlier ones have finished, so a backend that falls
+behind shows up as growing latency rather than as a slower sender.
+
+Without --url the backend is started for the run (uvicorn, or gunicorn with
+--workers) against the stand-in servers of benchmarks/stub_servers.py, with the
+latencies given here.  With --url it targets a running backend as configured.
+Run from MinuteMate/back:
+
+    python -m benchmarks.load_test --qps 10 --duration 60 --llm-latency 0.4 --output report.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+import httpx
+import numpy as np
+
+from benchmarks.stub_servers import TEST_DATA_PATH
+
+PERCENTILES = (50, 95, 99)
+
+
+def load_prompts(path: str = TEST_DATA_PATH) -> List[str]:
+    with open(path) as f:
+        return [item['prompt'] for item in json.load(f)]
+
+
+def distribution(values: List[float]) -> Dict[str, float]:
+    """count, mean, p50/p95/p99 and max of millisecond values"""
+    if not values:
+        return {'count': 0}
+    summary = {'count': len(values), 'mean': round(float(np.mean(values)), 1)}
+    for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f'p{q}'] = round(float(value), 1)
+    summary['max'] = round(float(max(values)), 1)
+    return summary
+
+
+def arrival_offsets(qps: float, count: int, poisson: bool, seed: int = 0) -> List[float]:
+    """Seconds after the start at which to send each request: evenly spaced, or Poisson arrivals"""
+    if not poisson:
+        return [i / qps for i in range(count)]
+    rng = random.Random(seed)
+    offsets, t = [], 0.0
+    for _ in range(count):
+        offsets.append(t)
+        t += rng.expovariate(qps)
+    return offsets
+
+
+def summarize(records: List[dict], qps: float) -> dict:
+    """Report for the measured requests: each record has sent/finished times, status and response body"""
+    ok = [r for r in records if r['status'] == 200]
+    stages = defaultdict(list)
+    for record in ok:
+        for stage, ms in (record['body'].get('stage_timings_ms') or {}).items():
+            stages[stage].append(ms)
+    window = (max(r['finished'] for r in records) - min(r['sent'] for r in records)) if records else 0
+    return {
+        'offered_qps': qps,
+        'requests': len(records),
+        'errors': len(records) - len(ok),
+        'status_codes': dict(Counter(str(r['status']) for r in records)),
+        'duration_s': round(window, 2),
+        'throughput_rps': round(len(ok) / window, 2) if window else 0.0,
+        'latency_ms': distribution([(r['finished'] - r['sent']) * 1000 for r in ok]),
+        # How late requests left relative to the schedule; large values mean the load generator saturated
+        'send_lag_ms': distribution([r['lag'] * 1000 for r in records]),
+        'stages_ms': {stage: distribution(values) for stage, values in sorted(stages.items())},
+        'cache_hits': dict(Counter(r['body']['cache'] for r in ok if r['body'].get('cache'))),
+        'degraded': dict(Counter(flag for r in ok for flag in r['body'].get('degraded') or [])),
+    }
+
+
+async def run_load(url: str, prompts: List[str], qps: float, duration: float, warmup: float = 0.0,
+                   poisson: bool = False, unique: bool = False, request_timeout: float = 120.0) -> List[dict]:
+    """Send prompts at `qps` for `warmup + duration` seconds; records of the requests sent after the warmup"""
+    offsets = arrival_offsets(qps, int((warmup + duration) * qps), poisson)
+    records = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+
+    async with httpx.AsyncClient(base_url=url, timeout=request_timeout, limits=limits) as client:
+        async def one(i: int, scheduled: float):
+            prompt = prompts[i % len(prompts)]
+            if unique:
+                prompt = f"{prompt} (request {i})"  # defeats the answer cache
+            sent = time.perf_counter()
+            try:
+                response = await client.post('/process-prompt', json={'user_prompt_text': prompt})
+                status, body = response.status_code, response.json() if response.status_code == 200 else {}
+            except httpx.HTTPError as e:
+                status, body = type(e).__name__, {}
+            if offsets[i] >= warmup:
+                records.append({'sent': sent, 'finished': time.perf_counter(), 'lag': sent - scheduled,
+                                'status': status, 'body': body})
+
+        start = time.perf_counter()
+        tasks = []
+        for i, offset in enumerate(offsets):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(i, start + offset)))
+        await asyncio.gather(*tasks)
+    return records
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(check, process: subprocess.Popen, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{what} exited with code {process.returncode}")
+        if check():
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"{what} not ready after {timeout:.0f}s")
+
+
+def ready(url: str) -> bool:
+    try:
+        return httpx.get(f"{url}/ready", timeout=1).status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+@contextmanager
+def local_backend(args, log) -> Iterator[str]:
+    """Start the stand-in servers and a backend using them; yields the backend's URL"""
+    with tempfile.TemporaryDirectory() as tmp:
+        ready_file = os.path.join(tmp, 'stub_env.json')
+        stubs = subprocess.Popen([
+            sys.executable, '-m', 'benchmarks.stub_servers', '--ready-file', ready_file,
+            '--openai-port', str(free_port()), '--weaviate-port', str(free_port()), '--grpc-port', str(free_port()),
+            '--llm-latency', str(args.llm_latency), '--embedding-latency', str(args.embedding_latency),
+            '--search-latency', str(args.search_latency), '--jitter', str(args.jitter),
+            '--completion-tokens', str(args.completion_tokens),
+        ], stdout=log, stderr=log)
+        backend = None
+        try:
+            wait_for(lambda: os.path.exists(ready_file), stubs, 30, 'Stand-in servers')
+            with open(ready_file) as f:
+                env = {**os.environ, **json.load(f)}
+            # Everything the backend writes stays in the run's directory: a keyword statistics snapshot of the
+            # stand-in corpus left in back/ would be loaded by the next real backend (and by the tests)
+            env.update(
+                SHARED_CACHE_DIR=os.path.join(tmp, 'cache'),
+                KEYWORD_STATS_PATH=os.path.join(tmp, 'keyword_stats.json'),
+                LOCAL_VECTOR_INDEX_DIR=os.path.join(tmp, 'vector_index'),
+            )
+            port = free_port()
+            if args.workers:
+                env.update(PORT=str(port), WEB_CONCURRENCY=str(args.workers))
+                command = ['gunicorn', '-c', 'gunicorn.conf.py', 'main:app']
+            else:
+                command = [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--no-access-log']
+            backend = subprocess.Popen(command, env=env, stdout=log, stderr=log)
+            url = f"http://127.0.0.1:{port}"
+            wait_for(lambda: ready(url), backend, 120, 'Backend')
+            yield url
+        finally:
+            for process in (backend, stubs):
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=30)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='running backend to test; default: start one against the stand-ins')
+    parser.add_argument('--qps', type=float, default=5.0, help='target request rate')
+    parser.add_argument('--duration', type=float, default=30.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='seconds of load before measuring')
+    parser.add_argument('--poisson', action='store_true', help='exponential inter-arrival times instead of even spacing')
+    parser.add_argument('--unique', action='store_true', help='make each prompt distinct so the answer cache misses')
+    parser.add_argument('--prompts', default=TEST_DATA_PATH, help='JSON list of objects with a "prompt" key')
+    parser.add_argument('--workers', type=int, default=0, help='serve with gunicorn and this many workers')
+    parser.add_argument('--llm-latency', type=float, default=0.4, help='seconds per stand-in chat completion')
+    parser.add_argument('--embedding-latency', type=float, default=0.05, help='seconds per stand-in embeddings call')
+    parser.add_argument('--search-latency', type=float, default=0.05, help='seconds per stand-in Weaviate query')
+    parser.add_argument('--jitter', type=float, default=0.2, help='stand-in latency spread, as a fraction of the mean')
+    parser.add_argument('--completion-tokens', type=int, default=80)
+    parser.add_argument('--output', help='also write the JSON report here')
+    parser.add_argument('--log', help='backend and stand-in output (default: discarded)')
+    args = parser.parse_args()
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    prompts = load_prompts(args.prompts)
+
+    def measure(url: str) -> dict:
+        records = asyncio.run(run_load(url, prompts, args.qps, args.duration, args.warmup, args.poisson, args.unique))
+        return {'target': url, 'settings': vars(args), **summarize(records, args.qps)}
+
+    if args.url:
+        report = measure(args.url)
+    else:
+        with open(args.log or os.devnull, 'w') as log, local_backend(args, log) as url:
+            report = measure(url)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,359 @@
+"""
+Local stand-in servers for the OpenAI and Weaviate APIs, with injected latency.
+
+Unlike benchmarks/stubs.py, which replaces the client objects, these speak the
+real wire protocols, so the backend under test runs unmodified: the openai
+package's HTTP client and connection pool, and the Weaviate client's REST
+handshake and gRPC queries.  Point the backend at them with
+
+    OPENAI_BASE_URL=http://127.0.0.1:8101/v1
+    WEAVIATE_ENDPOINT_URL=http://127.0.0.1:8102
+    WEAVIATE_GRPC_ENDPOINT_URL=grpc://127.0.0.1:50061
+
+Run from MinuteMate/back:
+
+    python -m benchmarks.stub_servers --llm-latency 0.4 --search-latency 0.05
+"""
+
+import argparse
+import asyncio
+import base64
+import bisect
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import struct
+import time
+import uuid
+from typing import Dict, List, Optional
+
+import grpc
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from grpc_health.v1 import health_pb2
+from weaviate.proto.v1 import properties_pb2, search_get_pb2
+
+TEST_DATA_PATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'test', 'test_data.json'))
+
+# Moderation system prompts ask for one of these as the first word
+VERDICT_INSTRUCTION = re.compile(r"'appropriate', 'inappropriate', or 'ambiguous'")
+WORDS = ('the board approved the budget amendment after discussion of the zoning request and the public '
+         'hearing on the school capital plan was continued to the next regular meeting').split()
+
+
+class Latency:
+    """Seconds to wait per call: `mean` spread uniformly by +/- `jitter` of itself"""
+    def __init__(self, mean: float, jitter: float = 0.0):
+        self.mean = mean
+        self.jitter = jitter
+
+    def sample(self) -> float:
+        return max(self.mean * random.uniform(1 - self.jitter, 1 + self.jitter), 0.0)
+
+    async def wait(self):
+        delay = self.sample()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+def text_vector(text: str, dimensions: int) -> np.ndarray:
+    """Unit vector seeded by the text: equal texts embed equally, different ones are near-orthogonal"""
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little')
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def load_corpus(path: str = TEST_DATA_PATH, size: int = 200) -> List[Dict[str, object]]:
+    """MeetingDocument properties for `size` chunks, cycling through the test data's retrieval context"""
+    try:
+        with open(path) as f:
+            contexts = [item.get('retrieval_context') or '' for item in json.load(f)]
+        # Each context is one string (or a list of them) of blank-line separated passages
+        texts = [passage.strip() for context in contexts for text in ([context] if isinstance(context, str) else context)
+                 for passage in text.split('\n\n') if passage.strip()]
+    except (OSError, ValueError):
+        texts = []
+    texts = texts or [' '.join(WORDS)]
+    return [{
+        'content': texts[i % len(texts)],
+        'source_document': f'meeting-{i // 20:03d}.pdf',
+        'chunk_index': i % 20,
+        'meeting_date': f'2024-{1 + i // 20 % 12:02d}-{1 + i % 28:02d}',
+        'meeting_type': 'Planning Board' if i % 2 else 'Board of Commissioners',
+        'file_type': 'Minutes',
+    } for i in range(size)]
+
+
+def create_openai_app(chat_latency: Latency, embedding_latency: Latency, completion_tokens: int = 80,
+                      dimensions: int = 1536) -> FastAPI:
+    """OpenAI stand-in: /v1/chat/completions (plain, streamed and JSON schema) and /v1/embeddings"""
+    app = FastAPI()
+
+    def answer_text(body: dict) -> str:
+        system = ' '.join(m.get('content') or '' for m in body.get('messages', []) if m.get('role') == 'system')
+        if VERDICT_INSTRUCTION.search(system):
+            return 'appropriate factual civic question about public meetings'
+        words = ' '.join(WORDS[i % len(WORDS)] for i in range(completion_tokens))
+        if body.get('response_format', {}).get('type') == 'json_schema':
+            return json.dumps({
+                'answer': words, 'verdict': 'appropriate', 'verdict_reasons': 'factual summary', 'cited_chunk_ids': [1]
+            })
+        return words
+
+    def usage(body: dict, content: str) -> dict:
+        prompt_tokens = sum(len(str(m.get('content') or '')) // 4 for m in body.get('messages', []))
+        completion = len(content.split())
+        return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion, 'total_tokens': prompt_tokens + completion}
+
+    @app.post('/v1/chat/completions')
+    async def chat_completions(request: Request):
+        body = await request.json()
+        content = answer_text(body)
+        created = int(time.time())
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        await chat_latency.wait()
+        if not body.get('stream'):
+            return {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': body.get('model'),
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'logprobs': None,
+                             'message': {'role': 'assistant', 'content': content}}],
+                'usage': usage(body, content),
+            }
+
+        async def events():
+            # Time to first token is the call latency; the remaining tokens take another 1/20 of it
+            tokens = content.split(' ')
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(chat_latency.sample() / 20 / len(tokens))
+                chunk = {
+                    'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': body.get('model'),
+                    'choices': [{'index': 0, 'finish_reason': None, 'logprobs': None,
+                                 'delta': {'content': token + (' ' if i + 1 < len(tokens) else '')}}],
+                }
+                yield f'data: {json.dumps(chunk)}\n\n'
+            yield 'data: [DONE]\n\n'
+
+        return StreamingResponse(events(), media_type='text/event-stream')
+
+    @app.post('/v1/embeddings')
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+        await embedding_latency.wait()
+        data = []
+        for i, text in enumerate(inputs):
+            vector = text_vector(str(text), body.get('dimensions') or dimensions)
+            encoded = (base64.b64encode(vector.tobytes()).decode() if body.get('encoding_format') == 'base64'
+                       else vector.tolist())
+            data.append({'object': 'embedding', 'index': i, 'embedding': encoded})
+        tokens = sum(len(str(text)) // 4 for text in inputs)
+        return {'object': 'list', 'model': body.get('model'), 'data': data,
+                'usage': {'prompt_tokens': tokens, 'total_tokens': tokens}}
+
+    return app
+
+
+def create_weaviate_rest_app(corpus_size: int) -> FastAPI:
+    """Weaviate REST stand-in: what the client checks on connect, and `aggregate.over_all` counts"""
+    app = FastAPI()
+
+    @app.get('/v1/meta')
+    async def meta():
+        return {'hostname': 'http://[::]:8080', 'version': '1.25.0', 'modules': {}}
+
+    @app.get('/v1/.well-known/ready')
+    async def ready():
+        return {}
+
+    @app.get('/v1/.well-known/openid-configuration')
+    async def openid_configuration():
+        return JSONResponse(status_code=404, content={})
+
+    @app.post('/v1/graphql')
+    async def graphql(request: Request):
+        body = await request.json()
+        match = re.search(r'Aggregate\s*{\s*(\w+)', body.get('query', ''))
+        collection = match.group(1) if match else 'MeetingDocument'
+        return {'data': {'Aggregate': {collection: [{'meta': {'count': corpus_size}}]}}}
+
+    return app
+
+
+class WeaviateSearchService:
+    """gRPC `weaviate.v1.Weaviate/Search` stand-in over a fixed corpus, plus the health check"""
+    def __init__(self, latency: Latency, corpus: List[Dict[str, object]], dimensions: int = 1536):
+        self.latency = latency
+        self.corpus = corpus
+        # Fixed-width lower-case hex, so string order is id order
+        self.ids = [str(uuid.UUID(int=i + 1)) for i in range(len(corpus))]
+        self.dimensions = dimensions
+
+    def pick(self, request) -> List[int]:
+        """Corpus positions returned for a request: a page of the `after` cursor, or a query-seeded sample"""
+        limit = request.limit or 10
+        if not (request.HasField('bm25_search') or request.HasField('near_vector') or request.HasField('hybrid_search')):
+            # Objects with ids after the cursor, like Weaviate: an empty or nil `after` starts at the first id
+            # and a cursor at (or past) the last id gives an empty page, which ends the client's iterator
+            start = bisect.bisect_right(self.ids, request.after)
+            return list(range(start, min(start + limit, len(self.ids))))
+        seed = int.from_bytes(hashlib.sha256(request.SerializeToString(deterministic=True)).digest()[:8], 'little')
+        return random.Random(seed).sample(range(len(self.corpus)), min(limit, len(self.corpus)))
+
+    def result(self, position: int, rank: int, request) -> search_get_pb2.SearchResult:
+        properties = self.corpus[position]
+        requested = set(request.properties.non_ref_properties) or set(properties)
+        fields = {
+            name: properties_pb2.Value(int_value=value) if isinstance(value, int) else properties_pb2.Value(text_value=value)
+            for name, value in properties.items() if name in requested
+        }
+        metadata = search_get_pb2.MetadataResult(
+            id=self.ids[position], id_as_bytes=uuid.UUID(self.ids[position]).bytes,
+            score=1.0 / (rank + 1), score_present=True,
+            distance=0.2 + rank * 0.05, distance_present=True,
+            last_update_time_unix=1_700_000_000_000, last_update_time_unix_present=True
+        )
+        if request.metadata.vector:
+            vector = text_vector(str(properties['content']) + str(position), self.dimensions)
+            metadata.vector_bytes = struct.pack(f'{len(vector)}f', *vector)
+        return search_get_pb2.SearchResult(
+            properties=search_get_pb2.PropertiesResult(
+                non_ref_props=properties_pb2.Properties(fields=fields), target_collection=request.collection
+            ),
+            metadata=metadata
+        )
+
+    async def search(self, request, context):
+        started = time.perf_counter()
+        await self.latency.wait()
+        results = [self.result(position, rank, request)
+                   for rank, position in enumerate(self.pick(request))]
+        return search_get_pb2.SearchReply(took=time.perf_counter() - started, results=results)
+
+    async def health(self, request, context):
+        return health_pb2.HealthCheckResponse(status=health_pb2.HealthCheckResponse.SERVING)
+
+    def server(self, port: int):
+        """grpc.aio server with the Search and health check handlers, bound to `port`"""
+        server = grpc.aio.server()
+        server.add_generic_rpc_handlers([
+            grpc.method_handlers_generic_handler('weaviate.v1.Weaviate', {
+                'Search': grpc.unary_unary_rpc_method_handler(
+                    self.search,
+                    request_deserializer=search_get_pb2.SearchRequest.FromString,
+                    response_serializer=search_get_pb2.SearchReply.SerializeToString
+                ),
+            }),
+            grpc.method_handlers_generic_handler('grpc.health.v1.Health', {
+                'Check': grpc.unary_unary_rpc_method_handler(
+                    self.health,
+                    request_deserializer=health_pb2.HealthCheckRequest.FromString,
+                    response_serializer=health_pb2.HealthCheckResponse.SerializeToString
+                ),
+            }),
+        ])
+        server.add_insecure_port(f'127.0.0.1:{port}')
+        return server
+
+
+class StubServers:
+    """The OpenAI, Weaviate REST and Weaviate gRPC stand-ins, run together on the current event loop"""
+    def __init__(self, openai_port: int = 8101, weaviate_port: int = 8102, grpc_port: int = 50061,
+                 llm_latency: float = 0.4, embedding_latency: float = 0.05, search_latency: float = 0.05,
+                 jitter: float = 0.2, completion_tokens: int = 80, corpus_size: int = 200,
+                 test_data_path: str = TEST_DATA_PATH):
+        self.openai_port = openai_port
+        self.weaviate_port = weaviate_port
+        self.grpc_port = grpc_port
+        self.openai_app = create_openai_app(
+            Latency(llm_latency, jitter), Latency(embedding_latency, jitter), completion_tokens
+        )
+        self.weaviate_app = create_weaviate_rest_app(corpus_size)
+        self.search_service = WeaviateSearchService(Latency(search_latency, jitter), load_corpus(test_data_path, corpus_size))
+        self.http_servers: List[uvicorn.Server] = []
+        self.grpc_server = None
+        self.tasks: List[asyncio.Task] = []
+
+    def env(self) -> Dict[str, str]:
+        """Environment pointing the backend at these servers"""
+        return {
+            'OPENAI_API_KEY': 'stub',
+            'OPENAI_BASE_URL': f'http://127.0.0.1:{self.openai_port}/v1',
+            'WEAVIATE_ENDPOINT_URL': f'http://127.0.0.1:{self.weaviate_port}',
+            'WEAVIATE_GRPC_ENDPOINT_URL': f'grpc://127.0.0.1:{self.grpc_port}',
+            'WEAVIATE_API_KEY': 'stub',
+        }
+
+    async def start(self):
+        for app, port in ((self.openai_app, self.openai_port), (self.weaviate_app, self.weaviate_port)):
+            server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning',
+                                                  access_log=False, lifespan='off'))
+            self.http_servers.append(server)
+            self.tasks.append(asyncio.create_task(server.serve()))
+        self.grpc_server = self.search_service.server(self.grpc_port)
+        await self.grpc_server.start()
+        while not all(server.started for server in self.http_servers):
+            if any(task.done() for task in self.tasks):
+                await asyncio.gather(*self.tasks)  # re-raise why a server stopped
+                raise RuntimeError('Stand-in server exited during startup')
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        for server in self.http_servers:
+            server.should_exit = True
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        if self.grpc_server is not None:
+            await self.grpc_server.stop(grace=None)
+
+
+def write_ready_file(path: str, env: Dict[str, str]):
+    """Write atomically, so a reader polling for the file never sees it half written"""
+    with open(path + '.tmp', 'w') as f:
+        json.dump(env, f)
+    os.replace(path + '.tmp', path)
+
+
+async def serve(servers: StubServers, ready_file: Optional[str] = None):
+    await servers.start()
+    for name, value in servers.env().items():
+        print(f'{name}={value}', flush=True)
+    if ready_file:
+        await asyncio.to_thread(write_ready_file, ready_file, servers.env())
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servers.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--openai-port', type=int, default=8101)
+    parser.add_argument('--weaviate-port', type=int, default=8102)
+    parser.add_argument('--grpc-port', type=int, default=50061)
+    parser.add_argument('--llm-latency', type=float, default=0.4, help='seconds per chat completion')
+    parser.add_argument('--embedding-latency', type=float, default=0.05, help='seconds per embeddings call')
+    parser.add_argument('--search-latency', type=float, default=0.05, help='seconds per Weaviate query')
+    parser.add_argument('--jitter', type=float, default=0.2, help='latency spread, as a fraction of the mean')
+    parser.add_argument('--completion-tokens', type=int, default=80)
+    parser.add_argument('--corpus-size', type=int, default=200)
+    parser.add_argument('--ready-file', help='write the backend environment here once listening')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    servers = StubServers(
+        args.openai_port, args.weaviate_port, args.grpc_port, args.llm_latency, args.embedding_latency,
+        args.search_latency, args.jitter, args.completion_tokens, args.corpus_size
+    )
+    try:
+        asyncio.run(serve(servers, args.ready_file))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+In-process stand-ins for the OpenAI and Weaviate clients used by PromptProcessor.
+
+Each call sleeps for a configurable latency instead of making a network request,
+so benchmarks measure how the backend schedules upstream calls rather than how
+fast the upstream services happen to be.
+"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+
+def _completion(content: str):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(prompt_tokens=50, completion_tokens=len(content.split()))
+    )
+
+
+def _embedding(count: int, dimensions: int = 1536):
+    return SimpleNamespace(
+        data=[SimpleNamespace(embedding=[0.01] * dimensions) for _ in range(count)],
+        usage=SimpleNamespace(prompt_tokens=8 * count)
+    )
+
+
+def _search_results():
+    return SimpleNamespace(objects=[
+        SimpleNamespace(
+            uuid=f'00000000-0000-0000-0000-{i:012d}',
+            properties={'content': f'Stub meeting chunk {i}', 'chunk_index': i},
+            metadata=SimpleNamespace(distance=None, score=1.0 / (i + 1))
+        ) for i in range(5)
+    ])
+
+
+class StubAsyncOpenAI:
+    """Async OpenAI stand-in: every call awaits `latency` seconds"""
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    async def _create_completion(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        if kwargs.get('stream'):
+            return self._stream('appropriate stub answer streamed one token at a time'.split(' '))
+        return _completion('appropriate stub verdict')
+
+    async def _stream(self, words):
+        for word in words:
+            await asyncio.sleep(self.latency / 20)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + ' '))])
+
+    async def _create_embedding(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        inputs = kwargs.get('input')
+        return _embedding(len(inputs) if isinstance(inputs, list) else 1)
+
+    async def close(self):
+        pass
+
+
+class StubAsyncWeaviate:
+    """Async Weaviate stand-in: every query awaits `latency` seconds"""
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        query = SimpleNamespace(bm25=self._query, near_vector=self._query, hybrid=self._query)
+        self.collections = SimpleNamespace(get=lambda name: SimpleNamespace(query=query))
+
+    async def _query(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _search_results()
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def connect(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class StubBlockingOpenAI:
+    """Synchronous OpenAI stand-in: every call blocks the calling thread for `latency` seconds"""
+    def __init__(self, latency: float = 0.2):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embedding)
+
+    def _create_completion(self, **kwargs):
+        time.sleep(self.latency)
+        return _completion('appropriate stub verdict')
+
+    def _create_embedding(self, **kwargs):
+        time.sleep(self.latency)
+        return _embedding(1)
+
+
+class StubBlockingWeaviate:
+    """Synchronous Weaviate stand-in: every query blocks the calling thread for `latency` seconds"""
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        query = SimpleNamespace(bm25=self._query, near_vector=self._query)
+        self.collections = SimpleNamespace(get=lambda name: SimpleNamespace(query=query))
+
+    def _query(self, **kwargs):
+        time.sleep(self.latency)
+        return _search_results()
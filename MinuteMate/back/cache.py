@@ -0,0 +1,341 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+T = TypeVar('T')
+
+
+def normalize_prompt(text: str) -> str:
+    """Normalize prompt text for cache lookups (case, whitespace, trailing punctuation)"""
+    return re.sub(r'\s+', ' ', text).strip().lower().rstrip('?.! ')
+
+
+class LRUCache:
+    """Size-bounded in-memory cache with optional TTL expiry and hit/miss counters"""
+    def __init__(self, max_size: int = 1024, ttl_seconds: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(entry[0]):
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entries beyond max_size"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def touch(self, key: Hashable):
+        """Mark an entry as recently used without counting a lookup"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Snapshot of the unexpired (key, value) pairs, least recently used first"""
+        with self._lock:
+            for key in [key for key, (stored_at, _) in self._entries.items() if self._expired(stored_at)]:
+                del self._entries[key]
+            return [(key, value) for key, (_, value) in self._entries.items()]
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+        }
+
+
+class CacheConfig:
+    """Answer cache settings, read from the environment"""
+    ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '1024'))
+    ANSWER_CACHE_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_TTL_SECONDS', '3600'))
+    SEMANTIC_CACHE_SIZE = int(os.getenv('SEMANTIC_CACHE_SIZE', '512'))
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+    # SQLite file shared by every worker for exact-match answers and invalidations (empty keeps them per process)
+    ANSWER_CACHE_PATH = os.getenv('ANSWER_CACHE_PATH', '')
+    ANSWER_CACHE_MAX_ROWS = int(os.getenv('ANSWER_CACHE_MAX_ROWS', '100000'))
+    # Seconds a worker trusts its copy of the shared generation before reading it again from the SQLite file
+    ANSWER_CACHE_GENERATION_TTL_SECONDS = float(os.getenv('ANSWER_CACHE_GENERATION_TTL_SECONDS', '1'))
+    # Seconds between checks of the MeetingDocument object count (0 disables polling)
+    CORPUS_POLL_SECONDS = float(os.getenv('CACHE_CORPUS_POLL_SECONDS', '300'))
+
+
+class AnswerCache:
+    """Two-tier response cache: exact normalized prompt, then query-embedding similarity
+
+    Both tiers are LRU-bounded with TTL expiry. `invalidate` clears both and bumps
+    `generation`; answers computed under an older generation are not stored, so a
+    request that was in flight during an ingestion cannot repopulate stale data.
+
+    With a `path`, exact-match answers (stored with `encode`, read with `decode`) and the
+    generation also live in a SQLite file shared by every worker, so an answer or an
+    invalidation in one process is seen by the others (an invalidation within
+    `generation_ttl` seconds). The semantic tier stays per process. Methods that may
+    query the file block, so async callers run them with `off_loop`.
+    """
+    def __init__(
+        self,
+        exact_size: int = CacheConfig.ANSWER_CACHE_SIZE,
+        semantic_size: int = CacheConfig.SEMANTIC_CACHE_SIZE,
+        ttl_seconds: Optional[float] = CacheConfig.ANSWER_CACHE_TTL_SECONDS,
+        semantic_threshold: float = CacheConfig.SEMANTIC_CACHE_THRESHOLD,
+        path: str = CacheConfig.ANSWER_CACHE_PATH,
+        max_rows: int = CacheConfig.ANSWER_CACHE_MAX_ROWS,
+        generation_ttl: float = CacheConfig.ANSWER_CACHE_GENERATION_TTL_SECONDS,
+        encode: Callable[[Any], str] = json.dumps,
+        decode: Callable[[str], Any] = json.loads,
+    ):
+        self.exact = LRUCache(exact_size, ttl_seconds)
+        self.semantic = LRUCache(semantic_size, ttl_seconds)
+        self.semantic_threshold = semantic_threshold
+        self.ttl_seconds = ttl_seconds
+        self.store = SQLiteStore(path, 'answers', max_rows) if path else None
+        self.meta = SQLiteStore(path, 'answer_cache_meta') if path else None
+        self.encode = encode
+        self.decode = decode
+        self.store_hits = 0
+        self._generation = 0
+        self.generation_ttl = generation_ttl
+        self._generation_checked = float('-inf')
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        """Number of invalidations so far (in any worker sharing the store, read from it at most every `generation_ttl` seconds)"""
+        if self.meta is not None and time.monotonic() - self._generation_checked >= self.generation_ttl:
+            self._generation_checked = time.monotonic()
+            shared = int(self.meta.get('generation', touch=False) or 0)
+            if shared != self._generation:
+                # Another worker invalidated the cache; drop what this one still holds
+                self.exact.clear()
+                self.semantic.clear()
+                self._generation = shared
+        return self._generation
+
+    @property
+    def semantic_enabled(self) -> bool:
+        return self.semantic.max_size > 0
+
+    @staticmethod
+    def store_key(key: Hashable) -> str:
+        return json.dumps(key)
+
+    def get_exact(self, key: Hashable) -> Optional[Any]:
+        generation = self.generation
+        value = self.exact.get(key)
+        if value is None and self.store is not None:
+            stored = self.store.get(self.store_key(key))
+            if stored is not None:
+                entry = json.loads(stored)
+                fresh = self.ttl_seconds is None or time.time() - entry['stored_at'] <= self.ttl_seconds
+                if fresh and entry['generation'] == generation:
+                    value = self.decode(entry['value'])
+                    self.exact.set(key, value)
+                    self.store_hits += 1
+        return value
+
+    def lookup(self, key: Hashable) -> Tuple[int, Optional[Any]]:
+        """The current generation and the exact-match answer, read together so an async caller needs one `off_loop` call"""
+        return self.generation, self.get_exact(key)
+
+    def get_semantic(self, variant: Hashable, embedding: List[float]) -> Optional[Any]:
+        """Return the answer whose query embedding is most similar, if above the threshold"""
+        candidates = [(key, value) for key, value in self.semantic.items() if key[0] == variant]
+        if not candidates:
+            self.semantic.misses += 1
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        similarities = np.stack([vector for _, (vector, _) in candidates]) @ query
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.semantic_threshold:
+            self.semantic.misses += 1
+            return None
+        key, (_, value) = candidates[best]
+        self.semantic.touch(key)
+        self.semantic.hits += 1
+        return value
+
+    def put(self, key: Tuple[Hashable, Hashable], value: Any, embedding: Optional[List[float]] = None, generation: Optional[int] = None):
+        """Store an answer under (variant, normalized prompt); skipped if computed before an invalidation"""
+        current = self.generation
+        if generation is not None and generation != current:
+            return
+        self.exact.set(key, value)
+        if self.store is not None:
+            self.store.set(self.store_key(key), json.dumps(
+                {'value': self.encode(value), 'stored_at': time.time(), 'generation': current}
+            ))
+        if embedding is not None and self.semantic_enabled:
+            vector = np.asarray(embedding, dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+            self.semantic.set(key, (vector, value))
+
+    def discard(self, key: Tuple[Hashable, Hashable]):
+        """Drop one answer from both tiers, e.g. after it fails a later check"""
+        self.exact.delete(key)
+        self.semantic.delete(key)
+        if self.store is not None:
+            self.store.delete(self.store_key(key))
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after new MeetingDocument chunks are ingested"""
+        generation = self.generation + 1
+        self.exact.clear()
+        self.semantic.clear()
+        if self.store is not None:
+            self.meta.set('generation', str(generation))
+            self.store.clear()
+        self._generation = generation
+        self._generation_checked = time.monotonic()
+        self.invalidations += 1
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.meta.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'exact': self.exact.stats(),
+            'semantic': {**self.semantic.stats(), 'threshold': self.semantic_threshold},
+            'generation': self.generation,
+            'invalidations': self.invalidations,
+            'store_hits': self.store_hits,
+            'store_rows': len(self.store) if self.store is not None else None,
+        }
+
+
+class SQLiteStore:
+    """Size-bounded key/value store in a SQLite file, shared by every process that opens it
+
+    Uses WAL journaling so readers in other uvicorn workers never block on a writer.
+    When the table grows past max_rows, the least recently used rows are deleted.
+    Reads mark rows used in memory; the times are written TOUCH_BATCH at a time, or
+    with the next write, so a cache hit costs no write of its own.
+    """
+    TOUCH_BATCH = 64
+
+    def __init__(self, path: str, table: str, max_rows: int = 100_000):
+        if not re.fullmatch(r'\w+', table):
+            raise ValueError(f"Invalid table name: {table}")
+        self.table = table
+        self.max_rows = max_rows
+        self._writes = 0
+        self._touched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_used REAL NOT NULL)'
+        )
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS {table}_last_used ON {table} (last_used)')
+
+    def get(self, key: str, touch: bool = True) -> Optional[str]:
+        """The stored value; `touch` marks it recently used (written with the next batch of touches)"""
+        with self._lock:
+            row = self._conn.execute(f'SELECT value FROM {self.table} WHERE key = ?', (key,)).fetchone()
+            if row is not None and touch:
+                self._touched[key] = time.time()
+                if len(self._touched) >= self.TOUCH_BATCH:
+                    self._flush_touches()
+        return row[0] if row else None
+
+    def _flush_touches(self):
+        """Write the buffered last_used times in one statement (called with the lock held)"""
+        if self._touched:
+            self._conn.executemany(f'UPDATE {self.table} SET last_used = ? WHERE key = ?',
+                                   [(used, key) for key, used in self._touched.items()])
+            self._touched.clear()
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._touched.pop(key, None)
+            self._flush_touches()
+            self._conn.execute(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, last_used) VALUES (?, ?, ?)',
+                (key, value, time.time())
+            )
+            self._writes += 1
+            # Trimming scans the index, so only do it every few hundred writes
+            if self._writes % 256 == 0:
+                self._conn.execute(
+                    f'DELETE FROM {self.table} WHERE key IN '
+                    f'(SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)',
+                    (self.max_rows,)
+                )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._touched.pop(key, None)
+            self._conn.execute(f'DELETE FROM {self.table} WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute(f'DELETE FROM {self.table}')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f'SELECT COUNT(*) FROM {self.table}').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._flush_touches()
+            self._conn.close()
+
+
+async def off_loop(store: Optional[Any], function: Callable[..., T], *args, **kwargs) -> T:
+    """Call `function`, in a worker thread if it may query the on-disk `store` (in-memory calls stay on the event loop)"""
+    if store is None:
+        return function(*args, **kwargs)
+    return await asyncio.to_thread(function, *args, **kwargs)
@@ -0,0 +1,263 @@
+import asyncio
+import inspect
+import logging
+import os
+import time
+from contextlib import suppress
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class ClientConfig:
+    """Outbound connection pool settings, read from the environment"""
+    OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', '100'))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', '30'))
+    OPENAI_TIMEOUT_SECONDS = float(os.getenv('OPENAI_TIMEOUT_SECONDS', '60'))
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+    # Seconds between Weaviate readiness checks (a failed query triggers one immediately)
+    CLIENT_HEALTH_CHECK_SECONDS = float(os.getenv('CLIENT_HEALTH_CHECK_SECONDS', '15'))
+    # How long shutdown waits for in-flight upstream calls before closing connections
+    CLIENT_DRAIN_TIMEOUT_SECONDS = float(os.getenv('CLIENT_DRAIN_TIMEOUT_SECONDS', '10'))
+
+
+class InFlightCounter:
+    """In-flight, peak and total upstream calls of one pool"""
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.failures = 0
+
+    def start(self):
+        self.in_flight += 1
+        self.requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finish(self, failed: bool = False):
+        self.in_flight -= 1
+        if failed:
+            self.failures += 1
+
+    async def wait_idle(self, timeout: float) -> int:
+        """Wait until nothing is in flight or `timeout` passes; returns the calls still in flight"""
+        deadline = time.monotonic() + timeout
+        while self.in_flight > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        return self.in_flight
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            'in_flight': self.in_flight,
+            'peak_in_flight': self.peak_in_flight,
+            'requests': self.requests,
+            'failures': self.failures
+        }
+        if self.limit:
+            stats['limit'] = self.limit
+            stats['utilization'] = round(self.in_flight / self.limit, 3)
+        return stats
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """Response body that releases its in-flight slot when closed, so streamed completions count until done"""
+    def __init__(self, stream: httpx.AsyncByteStream, counter: InFlightCounter):
+        self._stream = stream
+        self._counter = counter
+        self._closed = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        if not self._closed:
+            self._closed = True
+            self._counter.finish()
+        await self._stream.aclose()
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that counts requests holding a pooled connection"""
+    def __init__(self, transport: httpx.AsyncBaseTransport, counter: InFlightCounter):
+        self._transport = transport
+        self.counter = counter
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.counter.start()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self.counter.finish(failed=True)
+            raise
+        response.stream = _CountedStream(response.stream, self.counter)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def create_openai_client(api_key: str, base_url: Optional[str] = None) -> Tuple[Any, InFlightCounter]:
+    """AsyncOpenAI client (of OpenAI, or an OpenAI-compatible server at `base_url`) on a sized keep-alive connection pool, and the counter tracking its use"""
+    from openai import AsyncOpenAI
+
+    counter = InFlightCounter(limit=ClientConfig.OPENAI_MAX_CONNECTIONS)
+    limits = httpx.Limits(
+        max_connections=ClientConfig.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=ClientConfig.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=ClientConfig.OPENAI_KEEPALIVE_EXPIRY
+    )
+    http_client = httpx.AsyncClient(
+        transport=CountingTransport(httpx.AsyncHTTPTransport(limits=limits), counter),
+        timeout=httpx.Timeout(ClientConfig.OPENAI_TIMEOUT_SECONDS, connect=10),
+        follow_redirects=True
+    )
+    client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=ClientConfig.OPENAI_MAX_RETRIES)
+    return client, counter
+
+
+class _PoolMember:
+    def __init__(self, client):
+        self.client = client
+        self.counter = InFlightCounter()
+        self.healthy = False
+
+
+class _Tracked:
+    """
+    Proxy over a member's `collections` that counts awaited calls against the member.
+
+    Plain attributes (`query`, `aggregate`) and collections from `get` are wrapped in
+    turn; anything else a call returns (e.g. `iterator()`) is passed through.
+    """
+    def __init__(self, target, member: _PoolMember, pool: 'WeaviatePool'):
+        self._target = target
+        self._member = member
+        self._pool = pool
+
+    def __getattr__(self, name: str):
+        value = getattr(self._target, name)
+        if not callable(value):
+            return _Tracked(value, self._member, self._pool)
+
+        def call(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if inspect.isawaitable(result):
+                return self._pool.track(self._member, result)
+            return _Tracked(result, self._member, self._pool) if name == 'get' else result
+        return call
+
+
+class WeaviatePool:
+    """
+    Several async Weaviate clients behind the single-client interface PromptProcessor uses.
+
+    Queries go to the healthy member with the fewest calls in flight.  A background task
+    checks each member's readiness and replaces members whose connection has dropped.
+    """
+    def __init__(self, factory: Callable[[], Any], size: int):
+        self.factory = factory
+        self.members: List[_PoolMember] = [_PoolMember(factory()) for _ in range(max(size, 1))]
+        self.reconnects = 0
+        self.health_task: Optional[asyncio.Task] = None
+        self._check_now = asyncio.Event()
+
+    def is_connected(self) -> bool:
+        return any(member.client.is_connected() for member in self.members)
+
+    async def connect(self):
+        """Connect every member; fails only if none can connect (the health check retries the rest)"""
+        errors = await asyncio.gather(*(self._connect(member) for member in self.members), return_exceptions=True)
+        if not any(member.healthy for member in self.members):
+            raise next(error for error in errors if error is not None)
+        if self.health_task is None:
+            self.health_task = asyncio.create_task(self.monitor(ClientConfig.CLIENT_HEALTH_CHECK_SECONDS))
+
+    async def _connect(self, member: _PoolMember):
+        await member.client.connect()
+        member.healthy = True
+
+    @property
+    def collections(self):
+        member = self.select()
+        return _Tracked(member.client.collections, member, self)
+
+    def select(self) -> _PoolMember:
+        candidates = [member for member in self.members if member.healthy] or self.members
+        return min(candidates, key=lambda member: member.counter.in_flight)
+
+    async def track(self, member: _PoolMember, awaitable):
+        member.counter.start()
+        try:
+            result = await awaitable
+        except BaseException as e:
+            member.counter.finish(failed=not isinstance(e, asyncio.CancelledError))
+            if not isinstance(e, asyncio.CancelledError):
+                self._check_now.set()
+            raise
+        member.counter.finish()
+        return result
+
+    async def monitor(self, interval: float):
+        """Check members every `interval` seconds, or right after a failed query"""
+        while True:
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._check_now.wait(), interval)
+            self._check_now.clear()
+            await asyncio.gather(*(self.check(member) for member in self.members))
+
+    async def check(self, member: _PoolMember):
+        try:
+            ready = await asyncio.wait_for(member.client.is_ready(), timeout=5)
+        except Exception:
+            ready = False
+        if ready:
+            member.healthy = True
+            return
+        member.healthy = False
+        await self.reconnect(member)
+
+    async def reconnect(self, member: _PoolMember):
+        """Swap in a freshly connected client; requests already on the old one fail over to other members"""
+        replacement = self.factory()
+        try:
+            await replacement.connect()
+        except Exception as e:
+            logger.error(f"Weaviate reconnect failed: {e}")
+            with suppress(Exception):
+                await replacement.close()
+            return
+        previous, member.client = member.client, replacement
+        member.healthy = True
+        self.reconnects += 1
+        logger.info("Weaviate client reconnected")
+        with suppress(Exception):
+            await previous.close()
+
+    async def drain(self, timeout: float) -> int:
+        """Wait for in-flight queries to finish; returns how many were still running at the timeout"""
+        remaining = await asyncio.gather(*(member.counter.wait_idle(timeout) for member in self.members))
+        return sum(remaining)
+
+    async def close(self):
+        if self.health_task is not None:
+            self.health_task.cancel()
+        for member in self.members:
+            with suppress(Exception):
+                await member.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        members = [member.counter.stats() for member in self.members]
+        return {
+            'size': len(self.members),
+            'healthy': sum(member.healthy for member in self.members),
+            'reconnects': self.reconnects,
+            'in_flight': sum(member['in_flight'] for member in members),
+            'requests': sum(member['requests'] for member in members),
+            'failures': sum(member['failures'] for member in members),
+            'members': members
+        }
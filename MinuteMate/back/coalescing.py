@@ -0,0 +1,49 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class CoalescingConfig:
+    """Request coalescing settings, read from the environment"""
+    # Concurrent /process-prompt requests with the same normalized prompt and search settings share one pipeline run
+    COALESCE_REQUESTS = os.getenv('COALESCE_REQUESTS', 'true').lower() == 'true'
+
+
+class SingleFlight:
+    """At most one computation in flight per key; callers arriving while it runs share its outcome
+
+    The computation runs in a task of its own, so a caller that goes away (a client
+    disconnecting) does not cancel it for the others.  A result or an exception
+    reaches every caller.  The key is forgotten as soon as the computation finishes:
+    this only merges concurrent work, and caching results is left to the caches.
+    """
+    def __init__(self):
+        self.flights: Dict[Hashable, asyncio.Task] = {}
+        self.started = 0
+        self.joined = 0
+
+    def flight(self, key: Hashable, start: Callable[[], Awaitable]) -> Tuple[asyncio.Task, bool]:
+        """The task computing `key`, started with `start()` if none is in flight; and whether it was already in flight"""
+        task = self.flights.get(key)
+        if task is not None:
+            self.joined += 1
+            return task, True
+        task = asyncio.ensure_future(start())
+        self.flights[key] = task
+        self.started += 1
+        task.add_done_callback(lambda done: self._landed(key, done))
+        return task, False
+
+    def _landed(self, key: Hashable, task: asyncio.Task):
+        if self.flights.get(key) is task:
+            del self.flights[key]
+        # Retrieve the exception, so a flight whose callers have all gone is not reported as never retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def cancel(self):
+        for task in self.flights.values():
+            task.cancel()
+
+    def stats(self) -> Dict[str, int]:
+        return {'in_flight': len(self.flights), 'started': self.started, 'joined': self.joined}
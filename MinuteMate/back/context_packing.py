@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import re
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from tokenization import count_tokens, get_encoding
+
+Segment = TypeVar('Segment')
+
+
+class ContextPackingConfig:
+    """Context packing settings, read from the environment"""
+    # Token budget for the context in the generation prompt, per model (JSON object)
+    CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {
+        'gpt-4o': 3000,
+        'gpt-4o-mini': 3000,
+        **json.loads(os.getenv('CONTEXT_TOKEN_BUDGETS', '{}')),
+    }
+    DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.getenv('DEFAULT_CONTEXT_TOKEN_BUDGET', '2000'))
+    # Segments scoring below this fraction of the best score are dropped
+    CONTEXT_MIN_SCORE_RATIO = float(os.getenv('CONTEXT_MIN_SCORE_RATIO', '0.2'))
+    # Shared spans at least this long (characters) count as overlap and are cut from the later segment
+    CONTEXT_MIN_OVERLAP_CHARS = int(os.getenv('CONTEXT_MIN_OVERLAP_CHARS', '80'))
+    # A segment truncated to fit the budget is only kept if at least this many tokens remain
+    CONTEXT_MIN_SEGMENT_TOKENS = int(os.getenv('CONTEXT_MIN_SEGMENT_TOKENS', '40'))
+
+    @classmethod
+    def budget_for(cls, model: str) -> int:
+        return cls.CONTEXT_TOKEN_BUDGETS.get(model, cls.DEFAULT_CONTEXT_TOKEN_BUDGET)
+
+
+# Approximate cost of the "<ContextSegmentN>" header generate_response adds to each segment
+SEGMENT_OVERHEAD_TOKENS = 8
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha1(re.sub(r'\s+', ' ', text).strip().lower().encode()).hexdigest()
+
+
+def remove_overlap(text: str, kept: Sequence[str], min_overlap_chars: int) -> str:
+    """Cut spans of `text` that repeat an already kept segment (e.g. adjacent chunks sharing a boundary)"""
+    for other in kept:
+        while len(text) >= min_overlap_chars:
+            match = SequenceMatcher(None, text, other, autojunk=False).find_longest_match(0, len(text), 0, len(other))
+            if match.size < min_overlap_chars:
+                break
+            text = (text[:match.a].rstrip() + ' ' + text[match.a + match.size:].lstrip()).strip()
+    return text
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * 4]
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+
+
+def pack_context(
+    segments: Sequence[Segment],
+    model: str,
+    budget: Optional[int] = None,
+    min_score_ratio: float = ContextPackingConfig.CONTEXT_MIN_SCORE_RATIO,
+    min_overlap_chars: int = ContextPackingConfig.CONTEXT_MIN_OVERLAP_CHARS,
+    min_segment_tokens: int = ContextPackingConfig.CONTEXT_MIN_SEGMENT_TOKENS,
+) -> Tuple[List[Segment], int]:
+    """Fit ContextSegments into the model's context token budget
+
+    Segments are ordered by score (highest first, stable for ties and unscored
+    segments); low-scoring, duplicate and overlapping text is dropped; and the last
+    segment that does not fit is truncated. Returns the packed segments (copies
+    with their content trimmed) and their total token count.
+    """
+    budget = ContextPackingConfig.budget_for(model) if budget is None else budget
+    ordered = list(segments)
+    scores = [seg.score for seg in ordered if seg.score is not None]
+    if scores:
+        ordered.sort(key=lambda seg: seg.score if seg.score is not None else float('-inf'), reverse=True)
+        if max(scores) > 0:
+            floor = min_score_ratio * max(scores)
+            ordered = [seg for seg in ordered if seg.score is None or seg.score >= floor]
+
+    packed: List[Segment] = []
+    kept_texts: List[str] = []
+    seen = set()
+    used = 0
+    for seg in ordered:
+        fingerprint = _fingerprint(seg.content)
+        if fingerprint in seen:
+            continue
+        seen.add(fingerprint)
+
+        text = remove_overlap(seg.content, kept_texts, min_overlap_chars)
+        if not text:
+            continue
+
+        remaining = budget - used - SEGMENT_OVERHEAD_TOKENS
+        tokens = count_tokens(text, model)
+        if tokens > remaining:
+            if remaining < min_segment_tokens:
+                break
+            text = truncate_to_tokens(text, remaining, model)
+            tokens = count_tokens(text, model)
+
+        packed.append(seg.model_copy(update={'content': text}) if text != seg.content else seg)
+        kept_texts.append(text)
+        used += tokens + SEGMENT_OVERHEAD_TOKENS
+    return packed, used
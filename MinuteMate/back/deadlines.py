@@ -0,0 +1,107 @@
+import asyncio
+import contextvars
+import enum
+import os
+import time
+from typing import Awaitable, List, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class DeadlineConfig:
+    """Request deadline settings, read from the environment"""
+    # End-to-end budget of a /process-prompt request (requests may ask for less with `deadline_ms`); 0 disables deadlines
+    REQUEST_DEADLINE_MS = float(os.getenv('REQUEST_DEADLINE_MS', '12000'))
+    # Time kept back for generation and the response check while the prompt check and search run
+    GENERATION_RESERVE_MS = float(os.getenv('GENERATION_RESERVE_MS', '4000'))
+    RESPONSE_CHECK_RESERVE_MS = float(os.getenv('RESPONSE_CHECK_RESERVE_MS', '1500'))
+    # Vector and hybrid searches fall back to BM25 when less than this is left, or when the query embedding takes longer
+    VECTOR_SEARCH_MIN_MS = float(os.getenv('VECTOR_SEARCH_MIN_MS', '6000'))
+    EMBED_QUERY_TIMEOUT_MS = float(os.getenv('EMBED_QUERY_TIMEOUT_MS', '1500'))
+    # With less than this left for generation, use the fallback model and a smaller context
+    FULL_GENERATION_MIN_MS = float(os.getenv('FULL_GENERATION_MIN_MS', '5000'))
+    FALLBACK_GENERATION_MODEL = os.getenv('FALLBACK_GENERATION_MODEL', 'gpt-4o-mini')
+    # Fraction of the model's context token budget used when degraded
+    DEGRADED_CONTEXT_RATIO = float(os.getenv('DEGRADED_CONTEXT_RATIO', '0.5'))
+
+    @classmethod
+    def retrieval_reserve_ms(cls) -> float:
+        """Time the prompt check and search must leave for the stages after them"""
+        return cls.GENERATION_RESERVE_MS + cls.RESPONSE_CHECK_RESERVE_MS
+
+
+class Degradation(enum.IntFlag):
+    """What a response gave up to finish within its deadline; reported as the response's `error_code`"""
+    SEARCH = 1  # vector or hybrid search fell back to BM25
+    CONTEXT = 2  # context was shrunk, or dropped because the search ran out of time
+    MODEL = 4  # answered by the fallback generation model
+    CHECK = 8  # a moderation check did not finish in time
+
+
+class Deadline:
+    """Time budget of one request, shared by its stages and the tasks they start"""
+    def __init__(self, budget_ms: float):
+        self.budget_ms = budget_ms
+        self.expires = time.monotonic() + budget_ms / 1000
+        self.degraded = Degradation(0)
+
+    def remaining_ms(self, reserve_ms: float = 0) -> float:
+        """Milliseconds left before the deadline, less `reserve_ms` kept for later stages
+
+        The reserve never takes more than half of what is left, so a tight deadline
+        still gives the current stage a chance (the later ones degrade instead).
+        """
+        left = max((self.expires - time.monotonic()) * 1000, 0)
+        return max(left - reserve_ms, left / 2)
+
+    def degrade(self, degradation: Degradation):
+        self.degraded |= degradation
+
+    def report(self) -> dict:
+        """`error_code` and `degraded` fields for the PromptResponse"""
+        return {'error_code': int(self.degraded), 'degraded': degradation_names(self.degraded)}
+
+
+def degradation_names(degraded: Degradation) -> List[str]:
+    return [flag.name.lower() for flag in Degradation if flag in degraded]
+
+
+# Deadline of the request being processed; tasks created while it is set share it
+DEADLINE: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar('deadline', default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return DEADLINE.get()
+
+
+def degradation_report() -> dict:
+    """`error_code` and `degraded` for a response under the current deadline (0 and [] without one)"""
+    deadline = current_deadline()
+    return deadline.report() if deadline is not None else {'error_code': 0, 'degraded': []}
+
+
+def start_deadline(deadline_ms: Optional[float] = None) -> Optional[Deadline]:
+    """The deadline for a new request: the requested budget, capped by REQUEST_DEADLINE_MS (None when disabled)"""
+    budgets = [budget for budget in (deadline_ms, DeadlineConfig.REQUEST_DEADLINE_MS) if budget]
+    return Deadline(min(budgets)) if budgets else None
+
+
+async def within(awaitable: Awaitable[T], reserve_ms: float = 0, cap_ms: Optional[float] = None,
+                 degradation: Optional[Degradation] = None) -> T:
+    """
+    Await `awaitable`, giving up with asyncio.TimeoutError once only `reserve_ms` of the
+    current deadline is left (or after `cap_ms`), and recording `degradation` if it does.
+    Without a deadline this is a plain await.
+    """
+    deadline = current_deadline()
+    if deadline is None:
+        return await awaitable
+    timeout_ms = deadline.remaining_ms(reserve_ms)
+    if cap_ms is not None:
+        timeout_ms = min(timeout_ms, cap_ms)
+    try:
+        return await asyncio.wait_for(awaitable, timeout_ms / 1000)
+    except asyncio.TimeoutError:
+        if degradation is not None:
+            deadline.degrade(degradation)
+        raise
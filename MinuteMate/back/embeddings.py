@@ -0,0 +1,169 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from cache import LRUCache
+
+
+class EmbeddingConfig:
+    """Query embedding settings, read from the environment"""
+    # Must match the model used to embed MeetingDocument chunks
+    EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
+    EMBEDDING_CACHE_SIZE = int(os.getenv('EMBEDDING_CACHE_SIZE', '2048'))
+    # Directory for the memory-mapped on-disk tier (empty disables it)
+    EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', '')
+    EMBEDDING_CACHE_DTYPE = os.getenv('EMBEDDING_CACHE_DTYPE', 'float16')
+    EMBEDDING_CACHE_CAPACITY = int(os.getenv('EMBEDDING_CACHE_CAPACITY', '50000'))
+    # Prompts embedded at startup, one per line
+    EMBEDDING_WARMUP_FILE = os.getenv(
+        'EMBEDDING_WARMUP_FILE',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warmup_prompts.txt')
+    )
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class MemmapEmbeddingStore:
+    """On-disk embedding tier: a fixed-capacity memory-mapped matrix plus a SQLite row index
+
+    Vectors are stored as compact float16/float32 rows in `vectors-<model>.<dtype>`.
+    Rows are allocated as a ring, so once the store is full the oldest embedding is
+    overwritten. The index is shared safely between processes; a row is claimed and
+    written inside one IMMEDIATE transaction.
+    """
+    def __init__(self, directory: str, model: str, dtype: str = 'float16', capacity: int = 50_000):
+        os.makedirs(directory, exist_ok=True)
+        safe_model = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in model)
+        self.vectors_path = os.path.join(directory, f'vectors-{safe_model}.{dtype}')
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.dimensions: Optional[int] = None
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, f'index-{safe_model}.sqlite'),
+            timeout=5, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'dimensions'").fetchone()
+        if row is not None:
+            self._open_matrix(row[0])
+
+    def _open_matrix(self, dimensions: int):
+        self.dimensions = dimensions
+        # Grow the file in place rather than opening with 'w+', which would truncate rows another worker wrote
+        with open(self.vectors_path, 'ab') as f:
+            size = self.capacity * dimensions * self.dtype.itemsize
+            if f.tell() < size:
+                f.truncate(size)
+        self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode='r+', shape=(self.capacity, dimensions))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            if self._matrix is None:
+                return None
+            row = self._conn.execute('SELECT row FROM rows WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            return np.asarray(self._matrix[row[0]], dtype=np.float32)
+
+    def set(self, key: str, vector: List[float]):
+        with self._lock:
+            if self._matrix is None:
+                self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('dimensions', ?)", (len(vector),))
+                self._open_matrix(self._conn.execute("SELECT value FROM meta WHERE name = 'dimensions'").fetchone()[0])
+            if len(vector) != self.dimensions:
+                raise ValueError(f"Expected {self.dimensions} dimensions, got {len(vector)}")
+
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                if self._conn.execute('SELECT 1 FROM rows WHERE key = ?', (key,)).fetchone() is None:
+                    counter = self._conn.execute("SELECT value FROM meta WHERE name = 'next_row'").fetchone()
+                    next_row = counter[0] if counter else 0
+                    row = next_row % self.capacity
+                    self._conn.execute('DELETE FROM rows WHERE row = ?', (row,))
+                    self._matrix[row] = np.asarray(vector, dtype=self.dtype)
+                    self._matrix.flush()
+                    self._conn.execute('INSERT INTO rows (key, row) VALUES (?, ?)', (key, row))
+                    self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('next_row', ?)", (next_row + 1,))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+            self._matrix = None
+
+
+class EmbeddingCache:
+    """Query embedding cache keyed on (model, text hash): in-memory LRU over an optional memmap tier"""
+    def __init__(
+        self,
+        model: str = EmbeddingConfig.EMBEDDING_MODEL,
+        max_size: int = EmbeddingConfig.EMBEDDING_CACHE_SIZE,
+        directory: str = EmbeddingConfig.EMBEDDING_CACHE_DIR,
+        dtype: str = EmbeddingConfig.EMBEDDING_CACHE_DTYPE,
+        capacity: int = EmbeddingConfig.EMBEDDING_CACHE_CAPACITY,
+    ):
+        self.model = model
+        self.memory = LRUCache(max_size)
+        self.disk = MemmapEmbeddingStore(directory, model, dtype, capacity) if directory else None
+        self.disk_hits = 0
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = (self.model, text_hash(text))
+        vector = self.memory.get(key)
+        if vector is None and self.disk is not None:
+            stored = self.disk.get(key[1])
+            if stored is not None:
+                vector = stored.tolist()
+                self.memory.set(key, vector)
+                self.disk_hits += 1
+        return vector
+
+    def set(self, text: str, vector: List[float]):
+        key = (self.model, text_hash(text))
+        self.memory.set(key, vector)
+        if self.disk is not None:
+            self.disk.set(key[1], vector)
+
+    def get_many(self, texts: List[str]) -> Dict[str, Optional[List[float]]]:
+        return {text: self.get(text) for text in texts}
+
+    def set_many(self, vectors: Dict[str, List[float]]):
+        for text, vector in vectors.items():
+            self.set(text, vector)
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'model': self.model,
+            'memory': self.memory.stats(),
+            'disk_hits': self.disk_hits,
+            'disk_rows': len(self.disk) if self.disk is not None else None,
+        }
+
+
+def load_warmup_prompts(path: str = EmbeddingConfig.EMBEDDING_WARMUP_FILE) -> List[str]:
+    """Read warm-up prompts, one per line; a missing file means no warm-up"""
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
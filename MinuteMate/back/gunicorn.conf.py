@@ -0,0 +1,42 @@
+"""
+Multi-worker serving: gunicorn forks uvicorn workers from a master that has already
+imported the app and loaded its read-only state, so CPU-bound work (keyword
+extraction, pydantic serialization, token counting) spreads across cores.
+Run from MinuteMate/back:
+
+    WEB_CONCURRENCY=4 gunicorn -c gunicorn.conf.py main:app
+
+Answers, moderation verdicts, query embeddings and conversation sessions are kept
+in files under SHARED_CACHE_DIR that every worker reads and writes.
+"""
+
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+worker_class = 'uvicorn.workers.UvicornWorker'
+# Import main (and everything preload_shared_state loads) once in the master, then fork
+preload_app = True
+timeout = int(os.getenv('WORKER_TIMEOUT_SECONDS', '120'))
+graceful_timeout = int(os.getenv('WORKER_GRACEFUL_TIMEOUT_SECONDS', '30'))
+keepalive = 5
+
+# Cross-process cache files; set before main is imported so its Config classes see them
+SHARED_CACHE_DIR = os.getenv('SHARED_CACHE_DIR', '/tmp/minutemate-cache')
+os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+os.environ.setdefault('ANSWER_CACHE_PATH', os.path.join(SHARED_CACHE_DIR, 'answers.sqlite'))
+os.environ.setdefault('VERDICT_CACHE_PATH', os.path.join(SHARED_CACHE_DIR, 'verdicts.sqlite'))
+os.environ.setdefault('EMBEDDING_CACHE_DIR', os.path.join(SHARED_CACHE_DIR, 'embeddings'))
+os.environ.setdefault('SESSION_STORE_PATH', os.path.join(SHARED_CACHE_DIR, 'sessions.sqlite'))
+
+
+def when_ready(server):
+    """Load shared read-only state in the master, after the app is imported and before workers fork"""
+    import main
+
+    main.preload_shared_state()
+    # Keep the garbage collector from touching (and so copying) the preloaded objects in every worker
+    gc.freeze()
+    server.log.info(f"Preloaded shared state; forking {workers} workers")
@@ -0,0 +1,5 @@
+"""When the app's import started: main imports this module first, so the timing covers its whole import."""
+
+import time
+
+IMPORT_STARTED = time.perf_counter()
@@ -0,0 +1,163 @@
+import fcntl
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rerank import STOPWORDS
+
+# Prompt boilerplate that says what to do rather than what to look for
+KEYWORD_STOPWORDS = STOPWORDS | frozenset('''
+find search include help please happened following top next held create name names mention mentioned
+'''.split())
+
+# Same split as Weaviate's default `word` tokenization, so counted terms are the terms BM25 matches
+TERM_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+class KeywordConfig:
+    """Keyword extraction settings, read from the environment"""
+    # 'idf' (corpus IDF over single terms) or 'rake' (RAKE phrases, needs NLTK data)
+    KEYWORD_EXTRACTOR = os.getenv('KEYWORD_EXTRACTOR', 'idf')
+    KEYWORD_COUNT = int(os.getenv('KEYWORD_COUNT', '4'))
+    # Terms found in more than this fraction of chunks are too common to help BM25
+    KEYWORD_MAX_DF = float(os.getenv('KEYWORD_MAX_DF', '0.3'))
+    # JSON snapshot of the corpus statistics; rebuilt from MeetingDocument when missing
+    KEYWORD_STATS_PATH = os.getenv(
+        'KEYWORD_STATS_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'keyword_stats.json')
+    )
+    # Seconds between checks for a snapshot written by another worker (0 disables reloading)
+    KEYWORD_STATS_RELOAD_SECONDS = float(os.getenv('KEYWORD_STATS_RELOAD_SECONDS', '10'))
+
+
+def terms(text: str, stopwords: frozenset = KEYWORD_STOPWORDS) -> List[str]:
+    """Lowercased terms of `text` in order, without stopwords or single characters"""
+    return [term for term in TERM_PATTERN.findall(text.lower())
+            if term not in stopwords and len(term) > 1]
+
+
+class CorpusStats:
+    """Thread-safe document frequencies of terms over the MeetingDocument chunks"""
+    def __init__(self, documents: int = 0, document_frequency: Optional[Dict[str, int]] = None):
+        self.documents = documents
+        self.document_frequency = Counter(document_frequency or {})
+        # Version of the snapshot file these statistics were loaded from or saved to
+        self.snapshot_version: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+
+    def add(self, texts: Iterable[str]):
+        """Count newly ingested chunks"""
+        counted = [set(terms(text)) for text in texts]
+        with self._lock:
+            self.documents += len(counted)
+            for chunk_terms in counted:
+                self.document_frequency.update(chunk_terms)
+
+    def remove(self, texts: Iterable[str]):
+        """Uncount deleted chunks (e.g. a document being re-ingested)"""
+        counted = [set(terms(text)) for text in texts]
+        with self._lock:
+            self.documents = max(self.documents - len(counted), 0)
+            for chunk_terms in counted:
+                self.document_frequency.subtract(chunk_terms)
+            self.document_frequency = +self.document_frequency  # drop zero counts
+
+    def lookup(self, query_terms: Iterable[str]) -> Tuple[int, Dict[str, int]]:
+        """Consistent (chunk count, document frequency per term) snapshot"""
+        with self._lock:
+            return self.documents, {term: self.document_frequency.get(term, 0) for term in query_terms}
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {'documents': self.documents, 'terms': len(self.document_frequency)}
+
+    def save(self, path: str):
+        """Write a JSON snapshot atomically so other workers never read a partial file"""
+        with self._lock:
+            snapshot = {'documents': self.documents, 'document_frequency': dict(self.document_frequency)}
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temporary_path, path)
+        self.snapshot_version = snapshot_version(path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CorpusStats':
+        """Read a snapshot, or return empty statistics if there is none"""
+        if not path or not os.path.exists(path):
+            return cls()
+        version = snapshot_version(path)
+        with open(path) as f:
+            snapshot = json.load(f)
+        stats = cls(snapshot.get('documents', 0), snapshot.get('document_frequency', {}))
+        stats.snapshot_version = version
+        return stats
+
+    def changed_on_disk(self, path: str) -> bool:
+        """True if the snapshot at `path` was written since these statistics were loaded or saved"""
+        version = snapshot_version(path)
+        return version is not None and version != self.snapshot_version
+
+
+def snapshot_version(path: str) -> Optional[Tuple[int, int]]:
+    """(inode, modification time) of a snapshot; every save replaces the file, so both change"""
+    try:
+        status = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return status.st_ino, status.st_mtime_ns
+
+
+@contextmanager
+def snapshot_lock(path: str):
+    """Exclusive lock on the snapshot, so read-modify-write updates from different workers do not overwrite each other"""
+    with open(f"{path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def idf(documents: int, frequency: int) -> float:
+    """BM25 inverse document frequency"""
+    return math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+
+
+class KeywordExtractor:
+    """Picks the few query terms that best discriminate between chunks; one instance is shared by all requests"""
+    def __init__(self, stats: Optional[CorpusStats] = None, max_keywords: int = KeywordConfig.KEYWORD_COUNT,
+                 max_df: float = KeywordConfig.KEYWORD_MAX_DF):
+        self.stats = stats or CorpusStats()
+        self.max_keywords = max_keywords
+        self.max_df = max_df
+
+    def extract(self, text: str) -> List[str]:
+        """Up to `max_keywords` distinct terms of `text`, rarest in the corpus first"""
+        candidates = list(dict.fromkeys(terms(text)))
+        documents, frequency = self.stats.lookup(candidates)
+        if not documents:
+            # No statistics yet: keep the first terms of the prompt
+            return candidates[:self.max_keywords]
+
+        # Terms absent from the corpus cannot match, and very common ones only add noise
+        useful = [term for term in candidates if 0 < frequency[term] <= self.max_df * documents]
+        if not useful:
+            useful = [term for term in candidates if frequency[term] > 0] or candidates
+        # sorted() is stable, so equally rare terms keep their prompt order
+        ranked = sorted(useful, key=lambda term: idf(documents, frequency[term]), reverse=True)
+        return ranked[:self.max_keywords]
+
+
+def rake_keywords(text: str, count: int = 3) -> List[str]:
+    """Top RAKE phrases (the previous extractor)"""
+    from rake_nltk import Rake
+
+    rake = Rake()
+    rake.extract_keywords_from_text(text)
+    return rake.get_ranked_phrases()[:count]
@@ -1,46 +1,83 @@
+from import_clock import IMPORT_STARTED  # first, so the import-time report covers every import below
+import time
 import os
+import json
+import random
+import secrets
+import asyncio
 import logging
-from typing import Optional, List
+from contextlib import suppress
+from typing import Optional, List, Tuple, Dict, AsyncIterator, Literal
+from urllib.parse import urlsplit
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 
-import weaviate
-from weaviate.classes.init import Auth
-from weaviate.classes.query import Rerank, MetadataQuery
-
-import openai
-from openai import OpenAI
-
-from rake_nltk import Rake
 from dotenv import load_dotenv
 
-import nltk
-import ssl
-
-try:
-    _create_unverified_https_context = ssl._create_unverified_context
-except AttributeError:
-    pass
-else:
-    ssl._create_default_https_context = _create_unverified_https_context
-
+from cache import AnswerCache, CacheConfig, LRUCache, normalize_prompt, off_loop
+from coalescing import CoalescingConfig, SingleFlight
+from embeddings import EmbeddingCache, EmbeddingConfig, load_warmup_prompts
+from retrieval import RetrievalConfig, cut_at_score_gap, reciprocal_rank_fusion
+from rerank import RerankConfig, rerank
+from tokenization import count_tokens, get_encoding
+from context_packing import ContextPackingConfig, pack_context, truncate_to_tokens
+from moderation import MODERATION_MODEL, SYSTEM_PROMPTS, LocalModerationConfig, LocalModerator, VerdictCache, is_verdict
+from nltk_resources import ensure_nltk_resources
+from structured import RESPONSE_FORMAT, STRUCTURED_INSTRUCTIONS, ResponseCheckCost, StructuredConfig, parse_structured_answer
+from query_filters import QueryFilter, QueryFilterConfig, parse_query_filter
+from vector_index import LocalVectorIndex, VectorIndexConfig
+from routing import LLMRouter
+from sessions import (
+    Conversation, Session, SessionConfig, SessionStore, contextual_query, extractive_summary, history_messages,
+    relevant_context, summary_messages
+)
+from keywords import CorpusStats, KeywordConfig, KeywordExtractor, rake_keywords, snapshot_lock
+from deadlines import (
+    DEADLINE, DeadlineConfig, Degradation, current_deadline, degradation_report, start_deadline, within
+)
+from metrics import (
+    HTTP_SECONDS, REGISTRY, TRACE_ID, MetricsConfig, TraceIdFilter, cache_metrics, client_metrics,
+    UPSTREAM_CALL_TALLY, llm_backend_metrics, local_moderation_metrics, record_audit, record_coalesced, record_error, record_pipeline,
+    record_upstream_call, record_usage, resolve_trace_id
+)
+from timing import StageTimer
 
-try:
-    nltk.download('punkt')
-    nltk.download('punkt_tab')
-    nltk.download('stopwords')
-except Exception as e:
-    print(f"Error downloading NLTK resources: {e}")
+# weaviate, openai and rake_nltk (nltk, KEYWORD_EXTRACTOR=rake only) are imported where first used: together they
+# dominate import time, and preload_modules() loads them off the event loop at startup
 
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(trace_id)s:%(message)s')
+for handler in logging.getLogger().handlers:
+    handler.addFilter(TraceIdFilter())
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Fixed responses returned instead of a generated answer (never cached)
+INAPPROPRIATE_PROMPT_RESPONSE = 'inappropriate prompt detected'
+INAPPROPRIATE_RESPONSE_RESPONSE = 'inappropriate response detected'
+GENERATION_ERROR_RESPONSE = "I'm sorry, but I couldn't generate a response."
+PROCESSING_ERROR_RESPONSE = "An error occurred while processing your request."
+DEADLINE_EXCEEDED_RESPONSE = "I'm sorry, but I couldn't answer in time."
+SESSION_NOT_FOUND_RESPONSE = "Session not found or expired"
+
+GENERATION_MODEL = os.getenv('GENERATION_MODEL', 'gpt-4o')
+
+# Batch endpoint limits: prompts per request, default and maximum prompts in flight
+BATCH_MAX_PROMPTS = int(os.getenv('BATCH_MAX_PROMPTS', '500'))
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+BATCH_MAX_CONCURRENCY_LIMIT = int(os.getenv('BATCH_MAX_CONCURRENCY_LIMIT', '32'))
+
+# Characters of new streamed text between background response checks
+STREAM_CHECK_INTERVAL_CHARS = int(os.getenv('STREAM_CHECK_INTERVAL_CHARS', '400'))
+
+# Initial delay between startup attempts while Weaviate is unreachable (doubles up to a minute)
+STARTUP_RETRY_SECONDS = float(os.getenv('STARTUP_RETRY_SECONDS', '2'))
+
 
 # Initialize the FastAPI app
 app = FastAPI(
@@ -61,17 +98,58 @@ app.add_middleware(
 # Define request and response models
 class PromptRequest(BaseModel):
     user_prompt_text: str = Field(..., min_length=1, max_length=1000)
+    search_type: Literal['keyword', 'vector', 'hybrid'] = 'keyword'
+    # Hybrid only: weight of the vector search (0 = pure BM25, 1 = pure vector)
+    alpha: Optional[float] = Field(None, ge=0, le=1)
+    # End-to-end budget in milliseconds (capped by REQUEST_DEADLINE_MS)
+    deadline_ms: Optional[int] = Field(None, ge=100, le=120000)
+
+class BatchPromptRequest(BaseModel):
+    prompts: List[PromptRequest] = Field(..., min_length=1, max_length=BATCH_MAX_PROMPTS)
+    max_concurrency: Optional[int] = Field(None, ge=1, le=BATCH_MAX_CONCURRENCY_LIMIT)
+
+class CorpusUpdate(BaseModel):
+    added: List[str] = []  # content of newly ingested chunks
+    removed: List[str] = []  # content of deleted chunks
+    rebuild: bool = False  # recount the whole MeetingDocument collection instead
 
 class ContextSegment(BaseModel):
-    chunk_id: int
+    chunk_id: int  # 1-based position in this response: the N of <ContextSegmentN> and of cited_chunk_ids
     content: str
     score: Optional[float] = None
+    source_document: Optional[str] = None
+    chunk_index: Optional[int] = None  # position of the chunk within source_document
 
 class PromptResponse(BaseModel):
     generated_response: str
     context_segments: List[ContextSegment] = []
     keywords: List[str] = []
+    # 0, 500 (processing failed), 504 (deadline exceeded), or Degradation flags for what was given up to meet the deadline
     error_code: int = 0
+    degraded: List[str] = []  # names of the Degradation flags in error_code
+    stage_timings_ms: Dict[str, float] = {}
+    latency_saved_ms: Optional[float] = None
+    cache: Optional[str] = None  # 'exact' or 'semantic' when answered from the answer cache
+    coalesced: bool = False  # shared the pipeline run of an identical request that was already in flight
+    candidates_considered: Optional[int] = None  # retrieved before reranking
+    context_tokens: Optional[int] = None  # tokens of packed context sent to generation
+    baseline_context_tokens: Optional[int] = None  # tokens the unreranked top results would have used
+    metadata_filter: Optional[Dict[str, List[str]]] = None  # dates, meeting and file types retrieval was restricted to
+    # Structured generation only: segments the answer cites, and the estimated cost of the response check it replaced
+    cited_chunk_ids: Optional[List[int]] = None
+    response_check_saved_ms: Optional[float] = None
+    response_check_saved_tokens: Optional[int] = None
+
+class SessionPromptResponse(PromptResponse):
+    session_id: str
+    turn: int  # 1-based position of this turn in the session
+    history_tokens: int = 0  # tokens of summary and earlier turns sent with the prompt (at most SESSION_HISTORY_TOKEN_BUDGET)
+    reused_context_segments: int = 0  # context segments carried over from the previous turn
+    summarized_turns: int = 0  # earlier turns rolled into the session summary
+
+class SessionCreated(BaseModel):
+    session_id: str
+    ttl_seconds: float  # the session expires this long after its last turn
 
 class WeaviateConfig:
     """Configuration for Weaviate connection and querying"""
@@ -80,34 +158,283 @@ class WeaviateConfig:
         'vector': 'near_vector',
         'hybrid': 'hybrid'
     }
+    # 'rrf' runs BM25 and near_vector concurrently and fuses locally; 'native' uses Weaviate's hybrid query
+    HYBRID_FUSION = os.getenv('HYBRID_FUSION', 'rrf')
+    # Properties fetched with each result: what a ContextSegment needs
+    RETURN_PROPERTIES = ['content', 'source_document', 'chunk_index']
+    HYBRID_ALPHA = float(os.getenv('HYBRID_ALPHA', '0.5'))
+    RRF_K = int(os.getenv('RRF_K', '60'))
+    # Clients (each with its own gRPC channel) in the pool, and each client's REST connection pool
+    WEAVIATE_POOL_SIZE = int(os.getenv('WEAVIATE_POOL_SIZE', '2'))
+    WEAVIATE_SESSION_POOL_CONNECTIONS = int(os.getenv('WEAVIATE_SESSION_POOL_CONNECTIONS', '20'))
+    WEAVIATE_SESSION_POOL_MAXSIZE = int(os.getenv('WEAVIATE_SESSION_POOL_MAXSIZE', '100'))
+    # Set for a self-hosted (or stand-in) Weaviate, e.g. grpc://localhost:50051; unset means Weaviate Cloud
+    WEAVIATE_GRPC_ENDPOINT_URL = os.getenv('WEAVIATE_GRPC_ENDPOINT_URL')
 
     @classmethod
-    def get_weaviate_client(cls, url: str, api_key: str):
-        """Establish Weaviate connection"""
+    def get_weaviate_client(cls, url: str, api_key: str, skip_init_checks: bool = False):
+        """Create an async Weaviate client (connected on app startup)"""
+        import weaviate
+        from weaviate.classes.init import AdditionalConfig, Auth, Timeout
+        from weaviate.config import ConnectionConfig
+
+        additional_config = AdditionalConfig(
+            connection=ConnectionConfig(
+                session_pool_connections=cls.WEAVIATE_SESSION_POOL_CONNECTIONS,
+                session_pool_maxsize=cls.WEAVIATE_SESSION_POOL_MAXSIZE
+            ),
+            timeout=Timeout(init=10, query=30)
+        )
         try:
-            return weaviate.connect_to_weaviate_cloud(
+            if cls.WEAVIATE_GRPC_ENDPOINT_URL:
+                http, grpc = urlsplit(url), urlsplit(cls.WEAVIATE_GRPC_ENDPOINT_URL)
+                return weaviate.use_async_with_custom(
+                    http_host=http.hostname, http_port=http.port or (443 if http.scheme == 'https' else 80),
+                    http_secure=http.scheme == 'https',
+                    grpc_host=grpc.hostname, grpc_port=grpc.port or 50051, grpc_secure=grpc.scheme == 'grpcs',
+                    auth_credentials=Auth.api_key(api_key),
+                    additional_config=additional_config,
+                    skip_init_checks=skip_init_checks
+                )
+            return weaviate.use_async_with_weaviate_cloud(
                 cluster_url=url,
                 auth_credentials=Auth.api_key(api_key),
-                additional_config=weaviate.classes.init.AdditionalConfig(
-                    timeout=weaviate.classes.init.Timeout(init=10, query=30)
-                )
+                additional_config=additional_config,
+                skip_init_checks=skip_init_checks
             )
         except Exception as e:
             logger.error(f"Weaviate connection error: {e}")
             raise
 
+def similarity_from_distance(distance: Optional[float]) -> Optional[float]:
+    return None if distance is None else 1 - distance
+
+def query_options(query_filter: Optional[QueryFilter] = None) -> Dict[str, object]:
+    """`filters` and `return_properties` arguments of a MeetingDocument query"""
+    properties = list(WeaviateConfig.RETURN_PROPERTIES)
+    if query_filter:
+        # QueryFilter.matches checks the filtered properties of each result
+        properties += sorted(QueryFilterConfig.QUERY_FILTER_FIELDS - set(properties))
+    return {'filters': query_filter.to_weaviate() if query_filter else None, 'return_properties': properties}
+
 class PromptProcessor:
     """Main class for processing user prompts"""
-    def __init__(self):
+    def __init__(self, openai_client=None, weaviate_client=None):
         # Load environment variables
         self.load_env_vars()
         
-        # Initialize clients
-        self.weaviate_client = WeaviateConfig.get_weaviate_client(
-            self.WEAVIATE_ENDPOINT_URL, 
-            self.WEAVIATE_API_KEY
+        # Initialize clients (injectable for tests and benchmarks; injected clients are used as-is)
+        self.weaviate_pool = None
+        self.openai_usage = None
+        if weaviate_client is None:
+            from clients import WeaviatePool
+
+            weaviate_client = self.weaviate_pool = WeaviatePool(
+                lambda: WeaviateConfig.get_weaviate_client(self.WEAVIATE_ENDPOINT_URL, self.WEAVIATE_API_KEY),
+                WeaviateConfig.WEAVIATE_POOL_SIZE
+            )
+        self.weaviate_client = weaviate_client
+        if openai_client is None:
+            from clients import create_openai_client
+
+            openai_client, self.openai_usage = create_openai_client(self.OPENAI_API_KEY)
+        self.openai_client = openai_client
+        # Chat completions go through the router (OpenAI plus any LLM_BACKENDS); embeddings always use OpenAI
+        self.llm = LLMRouter.from_config(openai_client)
+
+        self.answer_cache = AnswerCache(encode=PromptResponse.model_dump_json, decode=PromptResponse.model_validate_json)
+        self.verdict_cache = VerdictCache()
+        self.local_moderator = LocalModerator.load() if LocalModerationConfig.LOCAL_MODERATION_ENABLED else None
+        self.embedding_cache = EmbeddingCache()
+        self.keyword_extractor = KeywordExtractor(
+            preloaded.get('keyword_stats') or CorpusStats.load(KeywordConfig.KEYWORD_STATS_PATH)
+        )
+        self.response_check_cost = ResponseCheckCost()
+        self.audit_tasks = set()
+        # Answers rejected by an audit, by cache key, so one audited before it is stored is never cached
+        self.rejected_answers = LRUCache(CacheConfig.ANSWER_CACHE_SIZE, CacheConfig.ANSWER_CACHE_TTL_SECONDS)
+        self.flights = SingleFlight()
+        # Concurrent checks of one prompt (the pipeline's and a semantic cache hit's) share a moderation call
+        self.prompt_checks = SingleFlight()
+        self.upstream_calls_saved = 0
+        self.sessions = SessionStore()
+        self.corpus_watch_task = None
+        self.warmup_task = None
+        self.keyword_stats_task = None
+        self.keyword_reload_task = None
+        self.vector_index = preloaded.get('vector_index') or (
+            LocalVectorIndex() if VectorIndexConfig.LOCAL_VECTOR_INDEX != 'off' else None
         )
-        self.openai_client = OpenAI(api_key=self.OPENAI_API_KEY)
+        self.vector_index_task = None
+
+    async def connect(self):
+        """Open the Weaviate connection if it is not already open"""
+        if not self.weaviate_client.is_connected():
+            await self.weaviate_client.connect()
+        if CacheConfig.CORPUS_POLL_SECONDS > 0 and self.corpus_watch_task is None:
+            self.corpus_watch_task = asyncio.create_task(self.watch_corpus(CacheConfig.CORPUS_POLL_SECONDS))
+        if self.warmup_task is None:
+            self.warmup_task = asyncio.create_task(self.warm_embeddings(load_warmup_prompts()))
+        if self.keyword_stats_task is None and not self.keyword_extractor.stats.documents:
+            self.keyword_stats_task = asyncio.create_task(self.rebuild_keyword_stats())
+        if KeywordConfig.KEYWORD_STATS_RELOAD_SECONDS > 0 and self.keyword_reload_task is None:
+            self.keyword_reload_task = asyncio.create_task(self.watch_keyword_stats(KeywordConfig.KEYWORD_STATS_RELOAD_SECONDS))
+        if self.vector_index is not None and self.vector_index_task is None:
+            self.vector_index_task = asyncio.create_task(
+                self.sync_vector_index(VectorIndexConfig.LOCAL_VECTOR_INDEX_SYNC_SECONDS)
+            )
+
+    async def close(self):
+        """Let in-flight upstream calls finish, then close the Weaviate and OpenAI connections"""
+        from clients import ClientConfig
+
+        for task in (self.corpus_watch_task, self.warmup_task, self.keyword_stats_task, self.keyword_reload_task,
+                     self.vector_index_task, *self.audit_tasks):
+            if task is not None:
+                task.cancel()
+        self.flights.cancel()
+        self.prompt_checks.cancel()
+        remaining = await self.drain(ClientConfig.CLIENT_DRAIN_TIMEOUT_SECONDS)
+        if remaining:
+            logger.error(f"Closing clients with {remaining} upstream calls still in flight")
+        await self.weaviate_client.close()
+        await self.llm.close()
+        await self.openai_client.close()
+        self.answer_cache.close()
+        self.verdict_cache.close()
+        self.embedding_cache.close()
+        self.sessions.close()
+        if self.vector_index is not None:
+            self.vector_index.close()
+
+    async def drain(self, timeout: float) -> int:
+        """Wait up to `timeout` seconds for pooled upstream calls to finish; returns how many are left"""
+        waits = []
+        if self.weaviate_pool is not None:
+            waits.append(self.weaviate_pool.drain(timeout))
+        if self.openai_usage is not None:
+            waits.append(self.openai_usage.wait_idle(timeout))
+        return sum(await asyncio.gather(*waits))
+
+    def cache_stats(self) -> Dict[str, dict]:
+        """Statistics of the answer, verdict and embedding caches"""
+        return {
+            'answer_cache': self.answer_cache.stats(),
+            'verdict_cache': self.verdict_cache.stats(),
+            'embedding_cache': self.embedding_cache.stats()
+        }
+
+    async def read_cache_stats(self) -> Dict[str, dict]:
+        """cache_stats, read in a worker thread when a cache is on disk (its row counts query SQLite)"""
+        stores = (self.answer_cache.store, self.verdict_cache.store, self.embedding_cache.disk)
+        return await off_loop(next((store for store in stores if store is not None), None), self.cache_stats)
+
+    def client_stats(self) -> Dict[str, dict]:
+        """Utilization of the pooled upstream clients"""
+        stats = {}
+        if self.weaviate_pool is not None:
+            stats['weaviate'] = self.weaviate_pool.stats()
+        if self.openai_usage is not None:
+            stats['openai'] = self.openai_usage.stats()
+        return stats
+
+    async def watch_corpus(self, interval: float):
+        """Invalidate the answer cache whenever the MeetingDocument object count changes"""
+        last_count = None
+        while True:
+            try:
+                collection = self.weaviate_client.collections.get('MeetingDocument')
+                count = (await collection.aggregate.over_all(total_count=True)).total_count
+                if last_count is not None and count != last_count:
+                    logger.info(f"MeetingDocument count changed ({last_count} -> {count}), invalidating answer cache")
+                    await off_loop(self.answer_cache.store, self.answer_cache.invalidate)
+                last_count = count
+            except Exception as e:
+                logger.error(f"Corpus watch error: {e}")
+                record_error('corpus_watch')
+            await asyncio.sleep(interval)
+
+    async def sync_vector_index(self, interval: float):
+        """Keep the local vector index current: one worker syncs it from Weaviate, the others map what it writes"""
+        while True:
+            try:
+                if self.vector_index.acquire_writer():
+                    collection = self.weaviate_client.collections.get('MeetingDocument')
+                    changes = await self.vector_index.sync(collection)
+                    if any(changes.values()):
+                        logger.info(f"Local vector index synced: {changes}")
+                else:
+                    await asyncio.to_thread(self.vector_index.refresh)
+            except Exception as e:
+                logger.error(f"Local vector index sync error: {e}")
+                record_error('vector_index_sync')
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    async def rebuild_keyword_stats(self) -> CorpusStats:
+        """Count term document frequencies over every MeetingDocument chunk and snapshot them"""
+        try:
+            stats = CorpusStats()
+            collection = self.weaviate_client.collections.get('MeetingDocument')
+            batch = []
+            async for item in collection.iterator(return_properties=['content']):
+                batch.append(item.properties.get('content') or '')
+                if len(batch) >= 1000:
+                    stats.add(batch)
+                    batch = []
+            stats.add(batch)
+            self.keyword_extractor.stats = stats
+            await asyncio.to_thread(self.save_keyword_stats, stats)
+            logger.info(f"Keyword statistics rebuilt: {stats.summary()}")
+        except Exception as e:
+            logger.error(f"Keyword statistics rebuild error: {e}")
+            record_error('keyword_stats')
+        return self.keyword_extractor.stats
+
+    async def update_keyword_stats(self, update: CorpusUpdate) -> CorpusStats:
+        """Apply chunks added or removed by ingestion to the keyword statistics"""
+        if update.rebuild:
+            return await self.rebuild_keyword_stats()
+        try:
+            return await asyncio.to_thread(self.apply_keyword_update, update)
+        except OSError as e:
+            logger.error(f"Keyword statistics snapshot error: {e}")
+            record_error('keyword_stats')
+            return self.keyword_extractor.stats
+
+    def apply_keyword_update(self, update: CorpusUpdate) -> CorpusStats:
+        """Apply an update to the latest snapshot and save it, holding the snapshot lock (blocking)"""
+        with snapshot_lock(KeywordConfig.KEYWORD_STATS_PATH):
+            # Start from what other workers have saved, so their updates are kept
+            self.reload_keyword_stats()
+            stats = self.keyword_extractor.stats
+            stats.remove(update.removed)
+            stats.add(update.added)
+            stats.save(KeywordConfig.KEYWORD_STATS_PATH)
+        return stats
+
+    def save_keyword_stats(self, stats: CorpusStats):
+        with snapshot_lock(KeywordConfig.KEYWORD_STATS_PATH):
+            stats.save(KeywordConfig.KEYWORD_STATS_PATH)
+
+    def reload_keyword_stats(self) -> bool:
+        """Load the snapshot if another worker has saved it since this one loaded or saved it (blocking)"""
+        if not self.keyword_extractor.stats.changed_on_disk(KeywordConfig.KEYWORD_STATS_PATH):
+            return False
+        self.keyword_extractor.stats = CorpusStats.load(KeywordConfig.KEYWORD_STATS_PATH)
+        return True
+
+    async def watch_keyword_stats(self, interval: float):
+        """Pick up keyword statistics that another worker updated or rebuilt"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if await asyncio.to_thread(self.reload_keyword_stats):
+                    logger.info(f"Keyword statistics reloaded: {self.keyword_extractor.stats.summary()}")
+            except Exception as e:
+                logger.error(f"Keyword statistics reload error: {e}")
+                record_error('keyword_stats')
 
     def load_env_vars(self):
         """Load and validate environment variables"""
@@ -125,207 +452,1263 @@ class PromptProcessor:
             setattr(self, var, value)
 
     def extract_keywords(self, text: str) -> List[str]:
-        """Extract keywords using RAKE"""
+        """Extract the query's most discriminative terms (or RAKE phrases)"""
         try:
-            
-            rake = Rake()
-            rake.extract_keywords_from_text(text)
-            return rake.get_ranked_phrases()[:3]
+            if KeywordConfig.KEYWORD_EXTRACTOR == 'rake':
+                return rake_keywords(text)
+            return self.keyword_extractor.extract(text)
         except Exception as e:
             logger.error(f"Keyword extraction error: {e}")
+            record_error('extract_keywords')
             return []
 
-    def search_weaviate(self, query: str, search_type: str = 'keyword') -> List[ContextSegment]:
+    async def search_weaviate(self, query: str, search_type: str = 'keyword', timer: Optional[StageTimer] = None, alpha: Optional[float] = None) -> Tuple[List[ContextSegment], List[str]]:
         """Perform search in Weaviate database"""
+        timer = timer or StageTimer()
+        keywords = []
+        embedding = None
+        limit = RerankConfig.candidate_limit(default=RetrievalConfig.candidate_limit())
+        include_vector = RerankConfig.RERANK_ENABLED and RerankConfig.RERANK_SCORER == 'embedding'
         try:
             collection = self.weaviate_client.collections.get('MeetingDocument')
-            
-            if search_type == 'keyword':
-                keywords = self.extract_keywords(query)
-                results = collection.query.bm25(
-                    query=",".join(keywords),
-                    limit=5
+
+            deadline = current_deadline()
+            if search_type in ('vector', 'hybrid') and deadline is not None \
+                    and deadline.remaining_ms() < DeadlineConfig.VECTOR_SEARCH_MIN_MS:
+                search_type = 'keyword'
+                deadline.degrade(Degradation.SEARCH)
+
+            # Search only the meetings and documents the prompt names, if any
+            query_filter = None
+            if QueryFilterConfig.QUERY_FILTERS_ENABLED:
+                with timer.stage('parse_filters'):
+                    query_filter = parse_query_filter(query)
+            if query_filter:
+                scored, keywords, embedding = await self.query_collection(
+                    collection, query, search_type, timer, limit, include_vector, alpha, query_filter
                 )
-                print(keywords)
-            elif search_type == 'vector':
-                embedding = self.openai_client.embeddings.create(
-                    model='text-embedding-3-small',
-                    input=query
-                ).data[0].embedding
-                
-                results = collection.query.near_vector(
-                    near_vector=embedding,
-                    limit=5
+                # Push-down may over-match (see query_filters.date_values), so check the results exactly
+                scored = [(item, score) for item, score in scored if query_filter.matches(item.properties)]
+                if scored:
+                    timer.details['metadata_filter'] = query_filter.describe()
+                else:
+                    timer.add('metadata_filter_fallback')
+                    # A vector search whose embedding was too slow already fell back to BM25
+                    if embedding is None:
+                        search_type = 'keyword'
+            if not query_filter or not scored:
+                scored, keywords, embedding = await self.query_collection(
+                    collection, query, search_type, timer, limit, include_vector, alpha
                 )
-            else:
-                raise ValueError(f"Unsupported search type: {search_type}")
+
+            if RerankConfig.RERANK_ENABLED:
+                top_k = RerankConfig.RERANK_TOP_K
+                timer.add('candidates', len(scored))
+                timer.add('baseline_context_tokens', sum(
+                    count_tokens(item.properties.get('content', '')) for item, _ in scored[:top_k]
+                ))
+                with timer.stage('rerank'):
+                    scored = rerank(query, scored, query_vector=embedding, top_k=top_k)
+            if RetrievalConfig.ADAPTIVE_TOP_K:
+                scored = cut_at_score_gap(scored)
 
             context_segments =  [
                 ContextSegment(
-                    chunk_id=int(item.properties.get('chunk_id', 0)),
+                    chunk_id=position,
+                    source_document=item.properties.get('source_document'),
+                    chunk_index=int(item.properties['chunk_index']) if item.properties.get('chunk_index') is not None else None,
                     content=item.properties.get('content', ''),
-                    score=getattr(item.metadata, 'distance', None)
-                ) for item in results.objects
+                    score=score
+                ) for position, (item, score) in enumerate(scored, start=1)
             ]
             return context_segments, keywords
         except Exception as e:
             logger.error(f"Weaviate search error: {e}")
-            return []
+            record_error('search')
+            return [], keywords
+
+    async def query_collection(self, collection, query: str, search_type: str, timer: StageTimer, limit: int,
+                               include_vector: bool, alpha: Optional[float], query_filter: Optional[QueryFilter] = None) -> Tuple[list, List[str], Optional[List[float]]]:
+        """Run one search of `search_type`, restricted by `query_filter` if given; returns (object, score) pairs, keywords and the query embedding"""
+        if search_type == 'keyword':
+            scored, keywords = await self.search_bm25(collection, query, timer, limit, include_vector, query_filter)
+            return scored, keywords, None
+        if search_type == 'vector':
+            embedding = await self.embed_search_query(query, timer)
+            if embedding is None:
+                scored, keywords = await self.search_bm25(collection, query, timer, limit, include_vector, query_filter)
+                return scored, keywords, None
+            objects = await self.search_near_vector(collection, embedding, timer, limit, include_vector, query_filter)
+            # Cosine distance -> similarity, so every search type scores higher-is-better
+            return [(item, similarity_from_distance(getattr(item.metadata, 'distance', None))) for item in objects], [], embedding
+        if search_type == 'hybrid':
+            alpha = WeaviateConfig.HYBRID_ALPHA if alpha is None else alpha
+            return await self.search_hybrid(collection, query, alpha, timer, limit, include_vector, query_filter)
+        raise ValueError(f"Unsupported search type: {search_type}")
+
+    async def search_near_vector(self, collection, embedding: List[float], timer: StageTimer, limit: int,
+                                 include_vector: bool, query_filter: Optional[QueryFilter] = None) -> list:
+        """Nearest chunks to `embedding` from the local vector index (when primary, or when Weaviate fails) or Weaviate"""
+        from weaviate.classes.query import MetadataQuery
+
+        index = self.vector_index
+        use_local = index is not None and index.ready
+        if use_local and VectorIndexConfig.LOCAL_VECTOR_INDEX == 'primary':
+            with timer.stage('local_vector_query'):
+                return index.search(embedding, limit, query_filter, include_vector)
+        try:
+            record_upstream_call('weaviate')
+            results = await timer.measure('weaviate_query', collection.query.near_vector(
+                near_vector=embedding,
+                limit=limit,
+                include_vector=include_vector,
+                return_metadata=MetadataQuery(distance=True),
+                **query_options(query_filter)
+            ))
+            return results.objects
+        except Exception as e:
+            if not use_local:
+                raise
+            logger.error(f"Weaviate vector search error, using the local vector index: {e}")
+            record_error('search')
+            timer.add('local_vector_fallback')
+            with timer.stage('local_vector_query'):
+                return index.search(embedding, limit, query_filter, include_vector)
+
+    async def search_bm25(self, collection, query: str, timer: StageTimer, limit: int, include_vector: bool,
+                          query_filter: Optional[QueryFilter] = None) -> Tuple[list, List[str]]:
+        """BM25 over the extracted keywords; returns (object, score) pairs and the keywords"""
+        from weaviate.classes.query import MetadataQuery
+
+        with timer.stage('extract_keywords'):
+            keywords = self.extract_keywords(query)
+        record_upstream_call('weaviate')
+        results = await timer.measure('weaviate_query', collection.query.bm25(
+            query=",".join(keywords),
+            limit=limit,
+            include_vector=include_vector,
+            return_metadata=MetadataQuery(score=True),
+            **query_options(query_filter)
+        ))
+        print(keywords)
+        return [(item, getattr(item.metadata, 'score', None)) for item in results.objects], keywords
+
+    async def embed_search_query(self, query: str, timer: StageTimer) -> Optional[List[float]]:
+        """Query embedding for vector search, or None if it took longer than the deadline allows (search falls back to BM25)"""
+        try:
+            return await timer.measure('embed_query', within(
+                self.embed_query(query),
+                cap_ms=DeadlineConfig.EMBED_QUERY_TIMEOUT_MS,
+                degradation=Degradation.SEARCH
+            ))
+        except asyncio.TimeoutError:
+            return None
+
+    async def search_hybrid(self, collection, query: str, alpha: float, timer: StageTimer, limit: int, include_vector: bool,
+                            query_filter: Optional[QueryFilter] = None) -> Tuple[list, List[str], Optional[List[float]]]:
+        """Combine BM25 over the extracted keywords with near_vector search; returns (object, score) pairs, keywords and the query embedding"""
+        # Start the embedding request before extracting keywords so the two overlap
+        embed_task = asyncio.create_task(self.embed_search_query(query, timer))
+        try:
+            with timer.stage('extract_keywords'):
+                keywords = self.extract_keywords(query)
+            embedding = await embed_task
+        finally:
+            embed_task.cancel()
+        if embedding is None:
+            scored, keywords = await self.search_bm25(collection, query, timer, limit, include_vector, query_filter)
+            return scored, keywords, None
+
+        if WeaviateConfig.HYBRID_FUSION == 'native':
+            from weaviate.classes.query import MetadataQuery
+
+            record_upstream_call('weaviate')
+            results = await timer.measure('weaviate_query', collection.query.hybrid(
+                query=",".join(keywords) or query,
+                vector=embedding,
+                alpha=alpha,
+                limit=limit,
+                include_vector=include_vector,
+                return_metadata=MetadataQuery(score=True),
+                **query_options(query_filter)
+            ))
+            return [(item, getattr(item.metadata, 'score', None)) for item in results.objects], keywords, embedding
+
+        record_upstream_call('weaviate')
+        keyword_results, vector_objects = await timer.measure('weaviate_query', asyncio.gather(
+            collection.query.bm25(query=",".join(keywords) or query, limit=limit, include_vector=include_vector,
+                                  **query_options(query_filter)),
+            self.search_near_vector(collection, embedding, timer, limit, include_vector, query_filter)
+        ))
+        with timer.stage('fusion'):
+            fused = reciprocal_rank_fusion(
+                [keyword_results.objects, vector_objects],
+                weights=[1 - alpha, alpha],
+                k=WeaviateConfig.RRF_K,
+                limit=limit
+            )
+        return fused, keywords, embedding
+
+    async def embed_query(self, text: str) -> List[float]:
+        """Get the query embedding from the embedding cache or OpenAI"""
+        return (await self.embed_queries([text]))[0]
+
+    async def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Get query embeddings, fetching every cache miss in a single OpenAI call"""
+        embeddings = await off_loop(self.embedding_cache.disk, self.embedding_cache.get_many, texts)
+        missing = [text for text, embedding in embeddings.items() if embedding is None]
+        if missing:
+            record_upstream_call('openai')
+            response = await self.openai_client.embeddings.create(
+                model=EmbeddingConfig.EMBEDDING_MODEL,
+                input=missing
+            )
+            record_usage('embedding', EmbeddingConfig.EMBEDDING_MODEL, getattr(response, 'usage', None))
+            fetched = {text: item.embedding for text, item in zip(missing, response.data)}
+            await off_loop(self.embedding_cache.disk, self.embedding_cache.set_many, fetched)
+            embeddings.update(fetched)
+        return [embeddings[text] for text in texts]
 
-    def generate_response(self, prompt: str, context_segments: List[ContextSegment]) -> str:
-        """Generate response using OpenAI"""
+    async def warm_embeddings(self, texts: List[str]):
+        """Prefetch query embeddings for common prompts in one batch"""
+        if not texts:
+            return
+        try:
+            await self.embed_queries(texts)
+            logger.info(f"Warmed embedding cache with {len(texts)} prompts")
+        except Exception as e:
+            logger.error(f"Embedding warm-up error: {e}")
+            record_error('embedding_warmup')
+
+    def build_generation_messages(self, prompt: str, context_segments: List[ContextSegment],
+                                  history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """Build the chat messages sent to the generation model, with a session's history before the prompt"""
         context_text = "\n".join([
             f"<ContextSegment{seg.chunk_id}>\n{seg.content}" 
             for seg in context_segments
         ])
+        return [
+            {
+                "role": "system", 
+                "content": f"Use this context if relevant: {context_text}"
+            },
+            *(history or []),
+            {
+                "role": "user", 
+                "content": prompt
+            }
+        ]
 
+    async def generate_response(self, prompt: str, context_segments: List[ContextSegment], model: str = GENERATION_MODEL,
+                                history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Generate response using the routed LLM backends, leaving time in the deadline for the response check"""
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": f"Use this context if relevant: {context_text}"
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ]
+            record_upstream_call('llm')
+            response = await self.llm.complete(
+                'generation',
+                reserve_ms=DeadlineConfig.RESPONSE_CHECK_RESERVE_MS,
+                model=model,
+                messages=self.build_generation_messages(prompt, context_segments, history)
             )
+            record_usage('generation', model, getattr(response, 'usage', None))
             return response.choices[0].message.content
         
         except Exception as e:
             logger.error(f"OpenAI generation error: {e}")
-            return "I'm sorry, but I couldn't generate a response."
+            record_error('generate_response')
+            return GENERATION_ERROR_RESPONSE
 
-    def check_prompt(self, prompt: str) -> str:
-        """Check prompt appropriateness using OpenAI"""
+    async def generate_structured(self, prompt: str, context_segments: List[ContextSegment], model: str = GENERATION_MODEL,
+                                  history: Optional[List[Dict[str, str]]] = None):
+        """Generate the answer, its safety verdict and cited chunk IDs in one structured completion
 
+        Returns (StructuredAnswer, raw JSON content), or None if the completion failed or
+        did not match the schema (the caller falls back to separate generation and check).
+        """
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
+            record_upstream_call('llm')
+            response = await self.llm.complete(
+                'structured',
+                model=model,
                 messages=[
-                    {
-                        "role": "system", 
-                        "content": """A local government hosts a chat system that uses retrieval-augmented generation 
-                        to improve public access to the contents of its public meetings.  The system has access to 
-                        meeting agendas, minutes, and transcriptions.  
-                        
-                        Your role is to determine whether prompts provided by users of this system are appropriate. 
-                        It's very important that users be able to access reasonable to reasonable requests, but toxic, 
-                        abusive, or illegal responses should be identified.  
-                        
-                        Requests seeking information that is accurate and politically relevant are appropriate, 
-                        even if the information sought is embarassing to the government or individuals or includes
-                        references to abusive, illegal, or controversial actions or ideas.  
-                        
-                        The first word of your response is always 'appropriate', 'inappropriate', or 'ambiguous'. 
-                        The rest of your response provides the top three to five concise factors that explain this decision."""
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ]
+                    {"role": "system", "content": STRUCTURED_INSTRUCTIONS},
+                    *self.build_generation_messages(prompt, context_segments, history)
+                ],
+                response_format=RESPONSE_FORMAT
             )
-            if response.choices[0].message.content.split(maxsplit=1)[0] in {'appropriate', 'inappropriate', 'ambiguous'}:
-                return response.choices[0].message.content
-            else:
-                return 'error generating prompt check'
+            record_usage('generation', model, getattr(response, 'usage', None))
+            content = response.choices[0].message.content
+        except Exception as e:
+            logger.error(f"OpenAI structured generation error: {e!r}")
+            record_error('generate_structured')
+            return None
+        answer = parse_structured_answer(content)
+        if answer is None:
+            logger.error("Structured generation did not match the schema")
+            record_error('generate_structured')
+            return None
+        return answer, content
+
+    async def generate_response_stream(self, prompt: str, context_segments: List[ContextSegment], model: str = GENERATION_MODEL,
+                                       history: Optional[List[Dict[str, str]]] = None) -> AsyncIterator[str]:
+        """Generate response using the routed LLM backends, yielding text deltas as they arrive"""
+        record_upstream_call('llm')
+        # Only opening the stream can fail over (within the deadline); an error after the first delta ends the answer
+        stream = await self.llm.complete(
+            'generation',
+            reserve_ms=DeadlineConfig.RESPONSE_CHECK_RESERVE_MS,
+            model=model,
+            messages=self.build_generation_messages(prompt, context_segments, history),
+            stream=True,
+            # The last chunk then carries the token usage (and no choices)
+            stream_options={'include_usage': True}
+        )
+        async for chunk in stream:
+            if getattr(chunk, 'usage', None) is not None:
+                record_usage('generation', model, chunk.usage)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def run_check(self, check: str, text: str) -> Optional[str]:
+        """Get an appropriateness verdict for `text` from the verdict cache or the routed LLM backends
+
+        Returns None if OpenAI did not answer with a verdict.
+        """
+        cached = await off_loop(self.verdict_cache.store, self.verdict_cache.get, check, text)
+        if cached is not None:
+            return cached
+
+        # The prompt check must leave time in the deadline for generation and the response check
+        reserve_ms = DeadlineConfig.retrieval_reserve_ms() if check == 'prompt' else 0
+        started = time.perf_counter()
+        record_upstream_call('llm')
+        response = await self.llm.complete(
+            'moderation',
+            reserve_ms=reserve_ms,
+            degradation=Degradation.CHECK,
+            model=MODERATION_MODEL,
+            messages=[
+                {
+                    "role": "system", 
+                    "content": SYSTEM_PROMPTS[check]
+                },
+                {
+                    "role": "user", 
+                    "content": text
+                }
+            ]
+        )
+        record_usage(f'check_{check}', MODERATION_MODEL, getattr(response, 'usage', None))
+        if check == 'response':
+            self.response_check_cost.observe(
+                (time.perf_counter() - started) * 1000,
+                getattr(getattr(response, 'usage', None), 'completion_tokens', None)
+            )
+        verdict = response.choices[0].message.content
+        if not is_verdict(verdict):
+            return None
+        await off_loop(self.verdict_cache.store, self.verdict_cache.set, check, text, verdict)
+        if check == 'prompt' and self.local_moderator is not None:
+            self.local_moderator.observe(text, verdict)
+        return verdict
+
+    @staticmethod
+    def prompt_allowed(prompt_check: str) -> bool:
+        """True if a prompt check gave a verdict other than 'inappropriate'; a failed or timed-out check refuses the prompt"""
+        return is_verdict(prompt_check) and prompt_check.split(maxsplit=1)[0] != 'inappropriate'
+
+    async def check_prompt(self, prompt: str) -> str:
+        """Check prompt appropriateness, locally for clearly appropriate prompts and otherwise using OpenAI"""
+        if self.local_moderator is not None:
+            verdict = self.local_moderator.check(prompt)
+            if verdict is not None:
+                return verdict
+
+        try:
+            check, _ = self.prompt_checks.flight(self.verdict_cache.key('prompt', prompt), lambda: self.run_check('prompt', prompt))
+            return await asyncio.shield(check) or 'error generating prompt check'
         
         except Exception as e:
             logger.error(f"OpenAI generation error: {e}")
-            return "I'm sorry, but I couldn't generate a response."
+            record_error('check_prompt')
+            return GENERATION_ERROR_RESPONSE
 
-    def check_response(self, prompt: str) -> str:
-        """Check response appropriateness using OpenAI"""
+    async def check_response(self, response_text: str) -> str:
+        """Check generated response appropriateness using OpenAI"""
 
         try:
-            response = self.openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": """A local government hosts a chat system that uses retrieval-augmented generation 
-                        to improve public access to the contents of its public meetings.  The system has access to 
-                        meeting agendas, minutes, and transcriptions.  
-                        
-                        Your role is to determine whether the chat system's responses to prompts are appropriate. 
-                        It's very important that the chat system be able to deliver reasonable responses, 
-                        but clearly toxic, abusive, or illegal responses should be identified.
-                        
-                        Information that is accurate and politically relevant is appropriate, even if it is embarassing 
-                        to the government or individuals or includes references to abusive, illegal, or controversial 
-                        actions or ideas.
-                        
-                        The first word of your response is always 'appropriate', 'inappropriate', or 'ambiguous'.  
-                        The rest of your response provides the top three to five concise factors that explain this decision."""
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ]
-            )
-            if response.choices[0].message.content.split(maxsplit=1)[0] in {'appropriate', 'inappropriate', 'ambiguous'}:
-                return response.choices[0].message.content
-            else:
-                return 'error generating response check'
+            return await self.run_check('response', response_text) or 'error generating response check'
         
         except Exception as e:
             logger.error(f"OpenAI generation error: {e}")
-            return "I'm sorry, but I couldn't generate a response."
+            record_error('check_response')
+            return GENERATION_ERROR_RESPONSE
 
-    def process_prompt(self, prompt_request: PromptRequest) -> PromptResponse:
-        """Main method to process user prompt"""
+    async def check_and_retrieve(self, prompt_request: PromptRequest, timer: StageTimer,
+                                 search_query: Optional[str] = None) -> Optional[Tuple[List[ContextSegment], List[str]]]:
+        """Check the prompt while retrieval (for `search_query`, default the prompt) runs speculatively; None unless the prompt is allowed"""
+        prompt_check_task = asyncio.create_task(
+            timer.measure('check_prompt', self.check_prompt(prompt_request.user_prompt_text))
+        )
+        search_task = asyncio.create_task(
+            timer.measure('search', within(self.search_weaviate(
+                search_query or prompt_request.user_prompt_text,
+                search_type=prompt_request.search_type,
+                timer=timer,
+                alpha=prompt_request.alpha
+            ), reserve_ms=DeadlineConfig.retrieval_reserve_ms(), degradation=Degradation.CONTEXT))
+        )
         try:
-            
-            # Check the user prompt for inappropriate content
-            prompt_check = self.check_prompt(prompt_request.user_prompt_text)
-            if prompt_check.split(maxsplit=1)[0] == 'inappropriate':
-                return PromptResponse(generated_response = 'inappropriate prompt detected')
+            prompt_check = await prompt_check_task
+            if not self.prompt_allowed(prompt_check):
+                search_task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await search_task
+                return None
+
+            # Use the context retrieved alongside the prompt check
+            try:
+                return await search_task
+            except asyncio.TimeoutError:
+                # Answer without context rather than miss the deadline
+                return [], []
+        finally:
+            # Never leave speculative work running past the request
+            prompt_check_task.cancel()
+            search_task.cancel()
+
+    def pack_segments(self, context_segments: List[ContextSegment], timer: StageTimer,
+                      model: str = GENERATION_MODEL, budget: Optional[int] = None) -> List[ContextSegment]:
+        """Fit retrieved segments into the generation model's context budget, recording the packed size"""
+        with timer.stage('pack_context'):
+            packed, context_tokens = pack_context(context_segments, model, budget=budget)
+        timer.add('context_tokens', context_tokens)
+        return packed
+
+    def generation_plan(self) -> Tuple[str, Optional[int]]:
+        """Generation model and context token budget (None: the model's default) for the time left in the deadline"""
+        deadline = current_deadline()
+        # A structured completion carries its own verdict, so no response check follows it
+        reserve_ms = 0 if StructuredConfig.STRUCTURED_GENERATION else DeadlineConfig.RESPONSE_CHECK_RESERVE_MS
+        if deadline is None or deadline.remaining_ms(reserve_ms) >= DeadlineConfig.FULL_GENERATION_MIN_MS:
+            return GENERATION_MODEL, None
+        deadline.degrade(Degradation.MODEL | Degradation.CONTEXT)
+        budget = ContextPackingConfig.budget_for(GENERATION_MODEL)
+        return DeadlineConfig.FALLBACK_GENERATION_MODEL, int(budget * DeadlineConfig.DEGRADED_CONTEXT_RATIO)
+
+    def context_metadata(self, timer: StageTimer) -> dict:
+        """Retrieval and prompt-size measurements reported with a response"""
+        counters = {
+            name: int(timer.counters[name]) if name in timer.counters else None
+            for name in ('candidates', 'context_tokens', 'baseline_context_tokens')
+        }
+        return {
+            'candidates_considered': counters['candidates'],
+            'context_tokens': counters['context_tokens'],
+            'baseline_context_tokens': counters['baseline_context_tokens'],
+            'metadata_filter': timer.details.get('metadata_filter'),
+        }
+
+    def cache_key(self, prompt_request: PromptRequest) -> Tuple[str, str]:
+        """Answer cache key: (every request option besides the text and deadline, normalized prompt text)"""
+        variant = json.dumps(prompt_request.model_dump(exclude={'user_prompt_text', 'deadline_ms'}), sort_keys=True)
+        return variant, normalize_prompt(prompt_request.user_prompt_text)
+
+    @staticmethod
+    def is_answer(response: PromptResponse) -> bool:
+        """True for a generated answer that passed both checks (not a refusal, an error or a degraded answer)"""
+        return response.error_code == 0 and response.generated_response not in {
+            INAPPROPRIATE_PROMPT_RESPONSE, INAPPROPRIATE_RESPONSE_RESPONSE, GENERATION_ERROR_RESPONSE
+        }
+
+    async def store_answer(self, key: Tuple[str, str], response: PromptResponse, embedding: Optional[List[float]], generation: int):
+        """Cache a response if it is a generated answer that passed both checks (and was not rejected by an audit)"""
+        if self.is_answer(response) and self.rejected_answers.get(key) != response.generated_response:
+            await off_loop(self.answer_cache.store, self.answer_cache.put, key, response, embedding=embedding, generation=generation)
+
+    def start_conversation(self, session: Session, prompt_request: PromptRequest) -> Conversation:
+        """Plan a session turn: its retrieval query, the earlier context still relevant, and the summary roll-up (started now)"""
+        prompt = prompt_request.user_prompt_text
+        carried, covered = relevant_context(session.context, self.extract_keywords(prompt))
+        fold_count = max(len(session.turns) - SessionConfig.SESSION_RECENT_TURNS, 0)
+        fold_task = None
+        if fold_count:
+            # Only generation needs the summary, so it is written while the prompt check and retrieval run
+            fold_task = asyncio.create_task(self.summarize_turns(session.summary, session.turns[:fold_count]))
+        return Conversation(
+            session, contextual_query(session, prompt), [ContextSegment(**seg) for seg in carried], covered,
+            fold_task, fold_count
+        )
+
+    async def summarize_turns(self, summary: str, turns: List[Dict[str, str]]) -> str:
+        """Roll `turns` into a session summary using the summary model"""
+        model = SessionConfig.SESSION_SUMMARY_MODEL
+        record_upstream_call('llm')
+        response = await self.llm.complete(
+            'summary',
+            model=model,
+            messages=summary_messages(summary, turns)
+        )
+        record_usage('summary', model, getattr(response, 'usage', None))
+        return truncate_to_tokens(response.choices[0].message.content.strip(), SessionConfig.SESSION_SUMMARY_TOKENS, model)
+
+    async def conversation_history(self, conversation: Conversation, model: str, timer: StageTimer) -> List[Dict[str, str]]:
+        """History messages of a session turn within the history token budget, rolling the oldest turns into the summary first"""
+        session = conversation.session
+        if conversation.fold_task is not None:
+            folded = session.turns[:conversation.fold_count]
+            try:
+                summary = await timer.measure('summarize_history', within(
+                    asyncio.wait_for(conversation.fold_task, SessionConfig.SESSION_SUMMARY_TIMEOUT_MS / 1000),
+                    reserve_ms=DeadlineConfig.GENERATION_RESERVE_MS
+                ))
+            except Exception as e:
+                logger.error(f"Session summary error: {e!r}")
+                record_error('summarize_history')
+                summary = extractive_summary(session.summary, folded, model)
+            session.fold(summary, conversation.fold_count)
+            conversation.fold_task = None
+        messages, conversation.history_tokens = history_messages(session, model)
+        timer.add('history_tokens', conversation.history_tokens)
+        return messages
+
+    async def retrieve_for_turn(self, prompt_request: PromptRequest, timer: StageTimer,
+                                conversation: Conversation) -> Optional[Tuple[List[ContextSegment], List[str]]]:
+        """Check and retrieve for a session turn; the previous turn's context is reused, instead of searching if it covers the prompt"""
+        if conversation.covered:
+            prompt_check = await timer.measure('check_prompt', self.check_prompt(prompt_request.user_prompt_text))
+            if not self.prompt_allowed(prompt_check):
+                return None
+            return conversation.carried, self.extract_keywords(prompt_request.user_prompt_text)
+
+        retrieved = await self.check_and_retrieve(prompt_request, timer, search_query=conversation.search_query)
+        if retrieved is None:
+            return None
+        context_segments, keywords = retrieved
+        # Unscored, the earlier segments rank after the new results, and packing drops what repeats them
+        merged = context_segments + [seg.model_copy(update={'score': None}) for seg in conversation.carried]
+        return [seg.model_copy(update={'chunk_id': position}) for position, seg in enumerate(merged, start=1)], keywords
+
+    async def finish_turn(self, conversation: Conversation, prompt_request: PromptRequest, response: PromptResponse):
+        """Add an answered turn to its session (refusals and failures are left out) and save the session"""
+        if self.is_answer(response):
+            conversation.session.record(
+                prompt_request.user_prompt_text,
+                response.generated_response,
+                [seg.model_dump() for seg in response.context_segments]
+            )
+        await self.sessions.save(conversation.session)
+
+    async def process_session_prompt(self, session_id: str, prompt_request: PromptRequest) -> Optional[SessionPromptResponse]:
+        """Answer one turn of a session within its deadline; None if the session does not exist or has expired
+
+        Session turns bypass the answer cache and coalescing, since their answers depend
+        on the conversation.  Turns of one session run one at a time.
+        """
+        async with self.sessions.lock(session_id):
+            session = await self.sessions.load(session_id)
+            if session is None:
+                return None
+            token = DEADLINE.set(start_deadline(prompt_request.deadline_ms))
+            conversation = self.start_conversation(session, prompt_request)
+            try:
+                response = await self.answer_within_deadline(prompt_request, StageTimer(), conversation)
+            finally:
+                conversation.close()
+                DEADLINE.reset(token)
+            report = conversation.report()
+            await self.finish_turn(conversation, prompt_request, response)
+            return SessionPromptResponse(**response.model_dump(), **report)
+
+    async def process_session_prompt_stream(self, session_id: str, prompt_request: PromptRequest) -> AsyncIterator[Tuple[str, dict]]:
+        """Stream one turn of a session: the events of process_prompt_stream, with the session fields added to 'done'"""
+        async with self.sessions.lock(session_id):
+            session = await self.sessions.load(session_id)
+            if session is None:
+                yield 'error', PromptResponse(generated_response=SESSION_NOT_FOUND_RESPONSE, error_code=404).model_dump()
+                return
+            token = DEADLINE.set(start_deadline(prompt_request.deadline_ms))
+            conversation = self.start_conversation(session, prompt_request)
+            try:
+                async for event, data in self.stream_prompt(prompt_request, conversation):
+                    if event in ('done', 'error'):
+                        report = conversation.report()
+                        await self.finish_turn(conversation, prompt_request, PromptResponse.model_validate(data))
+                        if event == 'done':
+                            data = {**data, **report}
+                    yield event, data
+            finally:
+                conversation.close()
+                DEADLINE.reset(token)
 
-            # Search for relevant context
-            context_segments, keywords = self.search_weaviate(prompt_request.user_prompt_text)
+    async def process_prompt(self, prompt_request: PromptRequest) -> PromptResponse:
+        """Main method to process user prompt within its deadline, answering from the cache when possible"""
+        token = DEADLINE.set(start_deadline(prompt_request.deadline_ms))
+        try:
+            if CoalescingConfig.COALESCE_REQUESTS:
+                return await self.answer_coalesced(prompt_request)
+            return await self.answer_or_reuse(prompt_request)
+        finally:
+            DEADLINE.reset(token)
+
+    async def answer_coalesced(self, prompt_request: PromptRequest) -> PromptResponse:
+        """Share the pipeline run of an identical request in flight (same normalized prompt and search settings), or start one
+
+        The run keeps the deadline of the request that started it; a request that joins
+        it waits within its own deadline.  Either way an exception from the run is raised
+        to every request sharing it.
+        """
+        timer = StageTimer()
+        flight, joined = self.flights.flight(self.cache_key(prompt_request), lambda: self.tally_upstream_calls(prompt_request))
+        if not joined:
+            response, _ = await asyncio.shield(flight)
+            return response
+
+        try:
+            response, upstream_calls = await timer.measure('coalesced_wait', within(asyncio.shield(flight)))
+        except asyncio.TimeoutError:
+            record_error('deadline')
+            return PromptResponse(generated_response=DEADLINE_EXCEEDED_RESPONSE, error_code=504, stage_timings_ms=timer.report())
+        self.upstream_calls_saved += upstream_calls
+        record_coalesced(upstream_calls)
+        return response.model_copy(update={'coalesced': True, 'stage_timings_ms': timer.report(), 'latency_saved_ms': None})
+
+    async def tally_upstream_calls(self, prompt_request: PromptRequest) -> Tuple[PromptResponse, int]:
+        """Answer a prompt, counting the OpenAI and Weaviate calls it made (what each request joining the run saves)"""
+        # Runs in its own task, so the tally stays out of the caller's context
+        tally = [0]
+        UPSTREAM_CALL_TALLY.set(tally)
+        response = await self.answer_or_reuse(prompt_request)
+        return response, tally[0]
+
+    async def answer_or_reuse(self, prompt_request: PromptRequest) -> PromptResponse:
+        """Answer from the exact or semantic answer cache (a semantic hit once the prompt passes its check), or by running the pipeline"""
+        timer = StageTimer()
+        key = self.cache_key(prompt_request)
+        generation, cached = await off_loop(self.answer_cache.store, self.answer_cache.lookup, key)
+        if cached is not None:
+            return cached.model_copy(update={'cache': 'exact', 'stage_timings_ms': timer.report(), 'latency_saved_ms': None})
+
+        if not self.answer_cache.semantic_enabled:
+            response = await self.answer_within_deadline(prompt_request, timer)
+            await self.store_answer(key, response, None, generation)
+            return response
+
+        # Look for a similar cached prompt while the full pipeline starts speculatively
+        embed_task = asyncio.create_task(timer.measure('embed_cache_query', within(
+            self.embed_query(prompt_request.user_prompt_text), cap_ms=DeadlineConfig.EMBED_QUERY_TIMEOUT_MS
+        )))
+        answer_task = asyncio.create_task(self.answer_within_deadline(prompt_request, timer))
+        try:
+            embedding = None
+            try:
+                embedding = await embed_task
+            except Exception as e:
+                logger.error(f"Cache query embedding error: {e!r}")
+                record_error('embed_cache_query')
+
+            if embedding is not None:
+                cached = self.answer_cache.get_semantic(key[0], embedding)
+                if cached is not None:
+                    # The cached answer is for a similar prompt, so this one must still pass its own check
+                    prompt_check = await timer.measure('check_prompt', self.check_prompt(prompt_request.user_prompt_text))
+                    if not self.prompt_allowed(prompt_check):
+                        return PromptResponse(
+                            generated_response=INAPPROPRIATE_PROMPT_RESPONSE,
+                            **degradation_report(),
+                            stage_timings_ms=timer.report()
+                        )
+                    return cached.model_copy(update={'cache': 'semantic', 'stage_timings_ms': timer.report(), 'latency_saved_ms': None})
+
+            response = await answer_task
+            await self.store_answer(key, response, embedding, generation)
+            return response
+        finally:
+            embed_task.cancel()
+            answer_task.cancel()
+
+    async def answer_within_deadline(self, prompt_request: PromptRequest, timer: StageTimer,
+                                     conversation: Optional[Conversation] = None) -> PromptResponse:
+        """Run the pipeline, giving up with a 504 response if it overruns the deadline despite degrading"""
+        try:
+            return await within(self.answer_prompt(prompt_request, timer, conversation))
+        except asyncio.TimeoutError:
+            logger.error(f"Deadline exceeded after {timer.elapsed_ms()} ms")
+            record_error('deadline')
+            return PromptResponse(
+                generated_response=DEADLINE_EXCEEDED_RESPONSE,
+                error_code=504,
+                stage_timings_ms=timer.report()
+            )
+
+    async def answer_prompt(self, prompt_request: PromptRequest, timer: StageTimer,
+                            conversation: Optional[Conversation] = None) -> PromptResponse:
+        """Run the full check, retrieve, generate and check pipeline for a prompt (a session turn with `conversation`)"""
+        try:
+            
+            # Check the user prompt for inappropriate content and search for relevant context
+            if conversation is None:
+                retrieved = await self.check_and_retrieve(prompt_request, timer)
+            else:
+                retrieved = await self.retrieve_for_turn(prompt_request, timer, conversation)
+            if retrieved is None:
+                return PromptResponse(
+                    generated_response = INAPPROPRIATE_PROMPT_RESPONSE,
+                    **degradation_report(),
+                    stage_timings_ms=timer.report()
+                )
+            context_segments, keywords = retrieved
+            # Switch to a faster model and a smaller context if the deadline is close
+            model, context_budget = self.generation_plan()
+            context_segments = self.pack_segments(context_segments, timer, model, context_budget)
+            history = await self.conversation_history(conversation, model, timer) if conversation is not None else None
             
+            if StructuredConfig.STRUCTURED_GENERATION:
+                structured = await timer.measure('generate_response', self.generate_structured(
+                    prompt_request.user_prompt_text,
+                    context_segments,
+                    model=model,
+                    history=history
+                ))
+                if structured is not None:
+                    return self.structured_response(prompt_request, structured, context_segments, keywords, model, timer)
+
             # Generate response
-            generated_response = self.generate_response(
+            generated_response = await timer.measure('generate_response', self.generate_response(
                 prompt_request.user_prompt_text, 
-                context_segments
-            )
+                context_segments,
+                model=model,
+                history=history
+            ))
 
             # Check the generated response for inappropriate content
-            response_check = self.check_response(prompt_request.user_prompt_text)
+            response_check = await timer.measure('check_response', self.check_response(generated_response))
             if response_check.split(maxsplit=1)[0] == 'inappropriate':
-                return PromptResponse(generated_response = 'inappropriate response detected')
+                return PromptResponse(
+                    generated_response = INAPPROPRIATE_RESPONSE_RESPONSE,
+                    stage_timings_ms=timer.report()
+                )
 
             return PromptResponse(
                 generated_response=generated_response,
                 context_segments=context_segments,
                 keywords = keywords,
-                error_code=0
+                **degradation_report(),
+                stage_timings_ms=timer.report(),
+                # Running sequentially would have cost both stages instead of the longer one
+                latency_saved_ms=min(timer.timings['check_prompt'], timer.timings.get('search', 0.0)),
+                **self.context_metadata(timer)
             )
 
         except Exception as e:
             logger.error(f"Prompt processing error: {e}")
+            record_error('process_prompt')
+            return PromptResponse(
+                generated_response=PROCESSING_ERROR_RESPONSE,
+                error_code=500,
+                stage_timings_ms=timer.report()
+            )
+
+    def structured_response(self, prompt_request: PromptRequest, structured, context_segments: List[ContextSegment],
+                            keywords: List[str], model: str, timer: StageTimer) -> PromptResponse:
+        """PromptResponse for a structured completion, scheduling a background audit of a sample of answers"""
+        answer, content = structured
+        if answer.verdict == 'inappropriate':
             return PromptResponse(
-                generated_response="An error occurred while processing your request.",
-                error_code=500
+                generated_response=INAPPROPRIATE_RESPONSE_RESPONSE,
+                stage_timings_ms=timer.report()
             )
+        if random.random() < StructuredConfig.RESPONSE_AUDIT_RATE:
+            task = asyncio.create_task(self.audit_response(self.cache_key(prompt_request), answer.answer))
+            self.audit_tasks.add(task)
+            task.add_done_callback(self.audit_tasks.discard)
+
+        saved_ms, saved_tokens = self.response_check_cost.savings(answer.answer, content, model)
+        chunk_ids = {seg.chunk_id for seg in context_segments}
+        return PromptResponse(
+            generated_response=answer.answer,
+            context_segments=context_segments,
+            keywords=keywords,
+            **degradation_report(),
+            stage_timings_ms=timer.report(),
+            latency_saved_ms=min(timer.timings['check_prompt'], timer.timings.get('search', 0.0)),
+            cited_chunk_ids=[chunk_id for chunk_id in dict.fromkeys(answer.cited_chunk_ids) if chunk_id in chunk_ids],
+            response_check_saved_ms=saved_ms,
+            response_check_saved_tokens=saved_tokens,
+            **self.context_metadata(timer)
+        )
+
+    async def audit_response(self, key: Tuple[str, str], answer: str):
+        """Run the separate response check on a structured answer already sent; drop it from the cache if rejected"""
+        # Outside the request, so without its deadline
+        DEADLINE.set(None)
+        verdict = await self.check_response(answer)
+        result = verdict.split(maxsplit=1)[0] if is_verdict(verdict) else 'error'
+        record_audit(result)
+        if result == 'inappropriate':
+            logger.error(f"Response audit rejected a structured answer: {verdict}")
+            # The answer may not be cached yet (a cached verdict returns at once); the tombstone keeps it out
+            self.rejected_answers.set(key, answer)
+            await off_loop(self.answer_cache.store, self.answer_cache.discard, key)
+
+    async def process_prompt_stream(self, prompt_request: PromptRequest) -> AsyncIterator[Tuple[str, dict]]:
+        """Process user prompt within its deadline, yielding (event, data) pairs as the answer is generated
+
+        Events are 'context' (segments and keywords, sent before generation starts),
+        'token' (each generated text delta), 'error' (the prompt or the response was
+        rejected, processing failed or the deadline passed before generation started;
+        the client should discard any streamed text) and 'done' (the final PromptResponse).
+        """
+        token = DEADLINE.set(start_deadline(prompt_request.deadline_ms))
+        try:
+            async for event, data in self.stream_prompt(prompt_request):
+                yield event, data
+        finally:
+            DEADLINE.reset(token)
+
+    async def stream_prompt(self, prompt_request: PromptRequest,
+                            conversation: Optional[Conversation] = None) -> AsyncIterator[Tuple[str, dict]]:
+        """The events of process_prompt_stream (a session turn with `conversation`), under the caller's deadline"""
+        timer = StageTimer()
+        key = self.cache_key(prompt_request)
+        generation, cached = None, None
+        if conversation is None:
+            generation, cached = await off_loop(self.answer_cache.store, self.answer_cache.lookup, key)
+        if cached is not None:
+            yield 'context', {
+                'context_segments': [seg.model_dump() for seg in cached.context_segments],
+                'keywords': cached.keywords
+            }
+            yield 'token', {'text': cached.generated_response}
+            yield 'done', cached.model_copy(update={'cache': 'exact', 'stage_timings_ms': timer.report(), 'latency_saved_ms': None}).model_dump()
+            return
+
+        check_task = None
+        try:
+            if conversation is None:
+                retrieved = await self.check_and_retrieve(prompt_request, timer)
+            else:
+                retrieved = await self.retrieve_for_turn(prompt_request, timer, conversation)
+            if retrieved is None:
+                yield 'error', PromptResponse(
+                    generated_response=INAPPROPRIATE_PROMPT_RESPONSE,
+                    **degradation_report(),
+                    stage_timings_ms=timer.report()
+                ).model_dump()
+                return
+            context_segments, keywords = retrieved
+            # Switch to a faster model and a smaller context if the deadline is close
+            model, context_budget = self.generation_plan()
+            context_segments = self.pack_segments(context_segments, timer, model, context_budget)
+            history = await self.conversation_history(conversation, model, timer) if conversation is not None else None
+            yield 'context', {
+                'context_segments': [seg.model_dump() for seg in context_segments],
+                'keywords': keywords
+            }
+
+            # Stream the answer, re-checking the accumulated text in the background as it grows
+            generated_response = ''
+            checked_length = 0
+            generation_start = timer.elapsed_ms()
+            async for delta in self.generate_response_stream(prompt_request.user_prompt_text, context_segments,
+                                                             model=model, history=history):
+                if not generated_response:
+                    timer.timings['first_token'] = timer.elapsed_ms()
+                generated_response += delta
+                yield 'token', {'text': delta}
+
+                if check_task is not None and check_task.done():
+                    if check_task.result().split(maxsplit=1)[0] == 'inappropriate':
+                        yield 'error', PromptResponse(
+                            generated_response=INAPPROPRIATE_RESPONSE_RESPONSE,
+                            stage_timings_ms=timer.report()
+                        ).model_dump()
+                        return
+                    check_task = None
+                if check_task is None and len(generated_response) - checked_length >= STREAM_CHECK_INTERVAL_CHARS:
+                    checked_length = len(generated_response)
+                    check_task = asyncio.create_task(self.check_response(generated_response))
+            timer.timings['generate_response'] = round(timer.elapsed_ms() - generation_start, 1)
+
+            # The complete answer is always checked before it is confirmed
+            if check_task is not None:
+                check_task.cancel()
+            response_check = await timer.measure('check_response', self.check_response(generated_response))
+            if response_check.split(maxsplit=1)[0] == 'inappropriate':
+                yield 'error', PromptResponse(
+                    generated_response=INAPPROPRIATE_RESPONSE_RESPONSE,
+                    stage_timings_ms=timer.report()
+                ).model_dump()
+                return
+
+            response = PromptResponse(
+                generated_response=generated_response,
+                context_segments=context_segments,
+                keywords=keywords,
+                **degradation_report(),
+                stage_timings_ms=timer.report(),
+                latency_saved_ms=min(timer.timings['check_prompt'], timer.timings.get('search', 0.0)),
+                **self.context_metadata(timer)
+            )
+            if conversation is None:
+                await self.store_answer(key, response, None, generation)
+            yield 'done', response.model_dump()
+
+        except asyncio.TimeoutError:
+            logger.error("Prompt streaming ran out of time before generation started")
+            record_error('process_prompt_stream')
+            yield 'error', PromptResponse(
+                generated_response=DEADLINE_EXCEEDED_RESPONSE,
+                error_code=504,
+                stage_timings_ms=timer.report()
+            ).model_dump()
+        except Exception as e:
+            logger.error(f"Prompt streaming error: {e}")
+            record_error('process_prompt_stream')
+            yield 'error', PromptResponse(
+                generated_response=PROCESSING_ERROR_RESPONSE,
+                error_code=500,
+                stage_timings_ms=timer.report()
+            ).model_dump()
+        finally:
+            if check_task is not None:
+                check_task.cancel()
+
+    async def process_prompts(self, batch: BatchPromptRequest) -> AsyncIterator[dict]:
+        """Process many prompts with bounded concurrency, yielding {'index', 'response'} as each completes
+
+        Identical prompts (same cache key) are processed once and reported for every
+        index they appear at. Query embeddings for all unique prompts are fetched in
+        one batch call up front, so the per-prompt pipelines hit the embedding cache.
+        """
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for index, prompt_request in enumerate(batch.prompts):
+            groups.setdefault(self.cache_key(prompt_request), []).append(index)
+        unique = [(batch.prompts[indices[0]], indices) for indices in groups.values()]
+
+        needs_embedding = [
+            prompt_request.user_prompt_text for prompt_request, _ in unique
+            if self.answer_cache.semantic_enabled or prompt_request.search_type != 'keyword'
+        ]
+        if needs_embedding:
+            try:
+                await self.embed_queries(needs_embedding)
+            except Exception as e:
+                logger.error(f"Batch embedding error: {e}")
+                record_error('batch_embed')
+
+        semaphore = asyncio.Semaphore(batch.max_concurrency or BATCH_MAX_CONCURRENCY)
+
+        async def run(prompt_request: PromptRequest, indices: List[int]) -> Tuple[List[int], PromptResponse]:
+            async with semaphore:
+                try:
+                    return indices, await self.process_prompt(prompt_request)
+                except Exception as e:
+                    logger.error(f"Batch prompt error: {e}")
+                    record_error('process_prompts')
+                    return indices, PromptResponse(generated_response=PROCESSING_ERROR_RESPONSE, error_code=500)
+
+        tasks = [asyncio.create_task(run(prompt_request, indices)) for prompt_request, indices in unique]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                indices, response = await completed
+                for index in indices:
+                    yield {'index': index, 'response': response.model_dump()}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Encode one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def response_outcome(response: dict) -> str:
+    """Metrics label for how a prompt was answered"""
+    if response.get('cache'):
+        return f"cache_{response['cache']}"
+    if response.get('error_code') == 500:
+        return 'error'
+    if response.get('error_code') == 504:
+        return 'deadline_exceeded'
+    if response.get('error_code') == 404:
+        return 'session_not_found'
+    outcome = {
+        INAPPROPRIATE_PROMPT_RESPONSE: 'inappropriate_prompt',
+        INAPPROPRIATE_RESPONSE_RESPONSE: 'inappropriate_response',
+        GENERATION_ERROR_RESPONSE: 'generation_error',
+    }.get(response.get('generated_response'), 'answered')
+    # Any other error code lists what was degraded to meet the deadline
+    return 'degraded' if outcome == 'answered' and response.get('error_code') else outcome
+
+
+def record_response(endpoint: str, response: dict):
+    """Count a finished PromptResponse (as a dict) and observe its stage timings"""
+    if MetricsConfig.METRICS_ENABLED:
+        record_pipeline(endpoint, response_outcome(response), response.get('stage_timings_ms') or {}, response.get('degraded') or [])
+
+def preload_modules():
+    """Import the client libraries and find NLTK data; blocking, so run in a thread"""
+    import clients  # noqa: F401 (httpx)
+    import openai  # noqa: F401
+    import weaviate.classes.query  # noqa: F401
+
+    if KeywordConfig.KEYWORD_EXTRACTOR == 'rake':
+        import rake_nltk  # noqa: F401
+
+        ensure_nltk_resources()
+
+
+# Read-only state loaded by preload_shared_state() in a serving master, reused by the processors of forked workers
+preloaded: Dict[str, object] = {}
+
+
+def preload_shared_state():
+    """Load client libraries, NLTK data, tokenizers, keyword statistics and the local vector index once, before workers fork
+
+    Forked workers share these pages copy-on-write instead of each loading its own copy.
+    """
+    preload_modules()
+    for model in {GENERATION_MODEL, DeadlineConfig.FALLBACK_GENERATION_MODEL, MODERATION_MODEL}:
+        get_encoding(model)
+    preloaded['keyword_stats'] = CorpusStats.load(KeywordConfig.KEYWORD_STATS_PATH)
+    if VectorIndexConfig.LOCAL_VECTOR_INDEX != 'off':
+        preloaded['vector_index'] = LocalVectorIndex()
+
+
+# Created and connected by the startup task, so importing this module opens no connections
+processor: Optional[PromptProcessor] = None
+startup_task: Optional[asyncio.Task] = None
+startup_error: Optional[str] = None
+ready_ms: Optional[float] = None
+
+
+async def start_processor():
+    """Create and connect the processor, retrying with backoff until Weaviate is reachable"""
+    global processor, startup_error, ready_ms
+    delay = STARTUP_RETRY_SECONDS
+    while processor is None:
+        candidate = None
+        try:
+            await asyncio.to_thread(preload_modules)
+            candidate = PromptProcessor()
+            await candidate.connect()
+            processor = candidate
+            startup_error = None
+            ready_ms = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+            logger.info(f"Ready {ready_ms} ms after import started")
+        except Exception as e:
+            startup_error = str(e)
+            logger.error(f"Startup error, retrying in {delay:.0f}s: {e}")
+            if candidate is not None:
+                with suppress(Exception):
+                    await candidate.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+def get_processor() -> PromptProcessor:
+    """Endpoint dependency: the connected processor, or 503 until startup has finished"""
+    if processor is None:
+        raise HTTPException(status_code=503, detail="Service is starting")
+    return processor
 
-# Initialize processor
-processor = PromptProcessor()
 
 # API Endpoint
 @app.post("/process-prompt", response_model=PromptResponse)
-async def process_prompt_endpoint(prompt_request: PromptRequest):
+async def process_prompt_endpoint(prompt_request: PromptRequest, processor: PromptProcessor = Depends(get_processor)):
     """Process user prompt and return response"""
-    return processor.process_prompt(prompt_request)
+    response = await processor.process_prompt(prompt_request)
+    record_response('process-prompt', response.model_dump(include={'generated_response', 'error_code', 'degraded', 'cache', 'stage_timings_ms'}))
+    return response
+
+
+@app.post("/process-prompts")
+async def process_prompts_endpoint(batch: BatchPromptRequest, processor: PromptProcessor = Depends(get_processor)):
+    """Process a batch of prompts, streaming one NDJSON line per prompt as each completes"""
+    async def ndjson_stream():
+        async for result in processor.process_prompts(batch):
+            record_response('process-prompts', result['response'])
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(ndjson_stream(), media_type="application/x-ndjson")
+
+
+@app.post("/process-prompt/stream")
+async def process_prompt_stream_endpoint(prompt_request: PromptRequest, processor: PromptProcessor = Depends(get_processor)):
+    """Process user prompt and stream the response as Server-Sent Events"""
+    async def event_stream():
+        async for event, data in processor.process_prompt_stream(prompt_request):
+            if event in ('done', 'error'):
+                record_response('process-prompt-stream', data)
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/sessions", response_model=SessionCreated)
+async def create_session_endpoint(processor: PromptProcessor = Depends(get_processor)):
+    """Start a conversation session; its turns are sent to /sessions/{session_id}/prompt"""
+    session = await processor.sessions.create()
+    return SessionCreated(session_id=session.session_id, ttl_seconds=processor.sessions.ttl_seconds)
+
+
+@app.post("/sessions/{session_id}/prompt", response_model=SessionPromptResponse)
+async def session_prompt_endpoint(session_id: str, prompt_request: PromptRequest, processor: PromptProcessor = Depends(get_processor)):
+    """Answer the next prompt of a session in the context of the conversation so far"""
+    response = await processor.process_session_prompt(session_id, prompt_request)
+    if response is None:
+        raise HTTPException(status_code=404, detail=SESSION_NOT_FOUND_RESPONSE)
+    record_response('session-prompt', response.model_dump(include={'generated_response', 'error_code', 'degraded', 'cache', 'stage_timings_ms'}))
+    return response
+
+
+@app.post("/sessions/{session_id}/prompt/stream")
+async def session_prompt_stream_endpoint(session_id: str, prompt_request: PromptRequest, processor: PromptProcessor = Depends(get_processor)):
+    """Answer the next prompt of a session, streaming the response as Server-Sent Events"""
+    if await processor.sessions.load(session_id) is None:
+        raise HTTPException(status_code=404, detail=SESSION_NOT_FOUND_RESPONSE)
+
+    async def event_stream():
+        async for event, data in processor.process_session_prompt_stream(session_id, prompt_request):
+            if event in ('done', 'error'):
+                record_response('session-prompt-stream', data)
+            yield format_sse(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.delete("/sessions/{session_id}")
+async def delete_session_endpoint(session_id: str, processor: PromptProcessor = Depends(get_processor)):
+    """End a session, discarding its history"""
+    await processor.sessions.delete(session_id)
+    return {'session_id': session_id, 'deleted': True}
+
+
+@app.get("/stats")
+async def stats_endpoint(processor: PromptProcessor = Depends(get_processor)):
+    """Report cache, keyword statistics, local moderation, local vector index, upstream client pool, coalescing, session and LLM backend statistics"""
+    return {
+        **await processor.read_cache_stats(),
+        'keyword_stats': processor.keyword_extractor.stats.summary(),
+        'local_moderation': processor.local_moderator.stats() if processor.local_moderator is not None else None,
+        'vector_index': processor.vector_index.stats() if processor.vector_index is not None else None,
+        'clients': processor.client_stats(),
+        'coalescing': {**processor.flights.stats(), 'upstream_calls_saved': processor.upstream_calls_saved,
+                       'prompt_checks': processor.prompt_checks.stats()},
+        'sessions': processor.sessions.stats(),
+        'llm_backends': processor.llm.stats()
+    }
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    """Endpoint dependency: check X-Admin-Token against CACHE_ADMIN_TOKEN; admin endpoints are disabled while it is unset"""
+    admin_token = os.getenv('CACHE_ADMIN_TOKEN')
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (CACHE_ADMIN_TOKEN is not set)")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.post("/cache/invalidate", dependencies=[Depends(require_admin_token)])
+async def invalidate_cache_endpoint(processor: PromptProcessor = Depends(get_processor)):
+    """Drop cached answers; called after new MeetingDocument chunks are ingested"""
+    await off_loop(processor.answer_cache.store, processor.answer_cache.invalidate)
+    return {'generation': processor.answer_cache.generation}
+
+
+@app.post("/keywords/corpus", dependencies=[Depends(require_admin_token)])
+async def update_keyword_stats_endpoint(update: CorpusUpdate, processor: PromptProcessor = Depends(get_processor)):
+    """Update keyword IDF statistics; called by the preprocessing pipeline after ingestion"""
+    stats = await processor.update_keyword_stats(update)
+    return stats.summary()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus metrics of this worker: stage latencies, token usage, cache hits, errors and client pools"""
+    if not MetricsConfig.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # Cache statistics may query SQLite, so they are read off the event loop before rendering
+    families = cache_metrics(await processor.read_cache_stats()) if processor is not None else []
+    return PlainTextResponse(REGISTRY.render(families), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def processor_metrics():
+    """Scrape-time client pool, LLM backend and local moderation series (none until the processor is ready)"""
+    if processor is None:
+        return []
+    families = client_metrics(processor.client_stats()) + llm_backend_metrics(processor.llm.stats())
+    if processor.local_moderator is not None:
+        families += local_moderation_metrics(processor.local_moderator.stats())
+    return families
+
+
+REGISTRY.add_collector(processor_metrics)
+
+
+@app.middleware("http")
+async def observe_request(request, call_next):
+    """Time each request and tag it (logs and response header) with a trace ID"""
+    trace_id = resolve_trace_id(request.headers.get(MetricsConfig.TRACE_HEADER)) if MetricsConfig.TRACE_HEADER else None
+    token = TRACE_ID.set(trace_id)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        TRACE_ID.reset(token)
+    if MetricsConfig.METRICS_ENABLED:
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        HTTP_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route, status=response.status_code)
+    if trace_id:
+        response.headers[MetricsConfig.TRACE_HEADER] = trace_id
+    return response
+
+
+@app.get("/health")
+async def health_endpoint():
+    """Liveness probe: the worker is up, whether or not its upstream connections are"""
+    return {'status': 'ok'}
+
+
+@app.get("/ready")
+async def ready_endpoint():
+    """Readiness probe: 200 once the processor is connected, 503 while starting"""
+    body = {'import_ms': IMPORT_MS, 'ready_ms': ready_ms}
+    if processor is None:
+        return JSONResponse(status_code=503, content={'status': 'starting', 'error': startup_error, **body})
+    return {'status': 'ready', **body}
+
+
+# Connect on startup
+@app.on_event("startup")
+async def startup_event():
+    """Start connecting in the background so the worker serves /health immediately"""
+    global startup_task
+    if processor is None:
+        startup_task = asyncio.create_task(start_processor())
 
 
 # Cleanup on shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Close Weaviate connection on app shutdown"""
-    processor.weaviate_client.close()
\ No newline at end of file
+    """Close Weaviate and OpenAI connections on app shutdown"""
+    if startup_task is not None:
+        startup_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await startup_task
+    if processor is not None:
+        await processor.close()
+
+
+IMPORT_MS = round((time.perf_counter() - IMPORT_STARTED) * 1000, 1)
+logger.info(f"main imported in {IMPORT_MS} ms")
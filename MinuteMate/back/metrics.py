@@ -0,0 +1,326 @@
+"""
+Request metrics in the Prometheus text exposition format (version 0.0.4), and per-request trace IDs.
+
+A small in-process registry rather than a client library: counters and histograms
+are updated on the request path, and collectors add values read from the caches
+and client pools at scrape time.
+"""
+
+import abc
+import contextvars
+import logging
+import math
+import os
+import re
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Seconds; spans cache hits (milliseconds) to slow generations (tens of seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class MetricsConfig:
+    """Metrics and tracing settings, read from the environment"""
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    # Response header carrying the request's trace ID (reused from the request when present); empty disables it
+    TRACE_HEADER = os.getenv('TRACE_HEADER', 'X-Trace-Id')
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + '}'
+
+
+def format_value(value: float) -> str:
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric(abc.ABC):
+    """A named metric family with a fixed set of label names"""
+    type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """(sample name, labels, value) for every labelled series"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{format_labels(labels)} {format_value(value)}" for name, labels, value in self.samples()]
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, 'le': format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_sum", labels, round(total, 6)))
+                samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class Registry:
+    """Metrics updated as requests run, plus collectors called at scrape time"""
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]):
+        self.collectors.append(collector)
+
+    def render(self, extra: Iterable[Metric] = ()) -> str:
+        """Exposition text of the registered metrics, the collectors' families and `extra` families"""
+        families = list(self.metrics) + list(extra)
+        for collector in self.collectors:
+            families.extend(collector())
+        return '\n'.join(family.render() for family in families) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'minutemate_stage_duration_seconds', 'Duration of each prompt pipeline stage', ['stage']))
+PIPELINE_SECONDS = REGISTRY.register(Histogram(
+    'minutemate_pipeline_duration_seconds', 'End-to-end prompt processing time', ['endpoint', 'outcome']))
+RESPONSES = REGISTRY.register(Counter(
+    'minutemate_responses_total', 'Prompt responses by outcome', ['endpoint', 'outcome']))
+TOKENS = REGISTRY.register(Counter(
+    'minutemate_openai_tokens_total', 'Tokens reported in OpenAI usage fields', ['model', 'purpose', 'kind']))
+ERRORS = REGISTRY.register(Counter(
+    'minutemate_errors_total', 'Errors caught and logged, by stage', ['stage']))
+DEGRADATIONS = REGISTRY.register(Counter(
+    'minutemate_degradations_total', 'Responses that gave something up to meet their deadline, by what', ['kind']))
+AUDITS = REGISTRY.register(Counter(
+    'minutemate_response_audits_total', 'Background response checks of structured answers, by verdict', ['verdict']))
+UPSTREAM_CALLS = REGISTRY.register(Counter(
+    'minutemate_upstream_calls_total', 'OpenAI embedding, LLM chat and Weaviate calls made while answering prompts', ['service']))
+COALESCED = REGISTRY.register(Counter(
+    'minutemate_coalesced_requests_total', 'Requests that shared the pipeline run of an identical request in flight'))
+UPSTREAM_CALLS_SAVED = REGISTRY.register(Counter(
+    'minutemate_upstream_calls_saved_total', 'OpenAI, LLM and Weaviate calls coalesced requests did not make'))
+LLM_CALLS = REGISTRY.register(Counter(
+    'minutemate_llm_calls_total', 'Chat completions by backend, task and outcome', ['backend', 'task', 'outcome']))
+LLM_SECONDS = REGISTRY.register(Histogram(
+    'minutemate_llm_call_duration_seconds', 'Chat completion time by backend and task', ['backend', 'task']))
+LLM_FAILOVERS = REGISTRY.register(Counter(
+    'minutemate_llm_failovers_total', 'Chat completions moved to another backend, by the backend that failed', ['backend', 'task']))
+HTTP_SECONDS = REGISTRY.register(Histogram(
+    'minutemate_http_request_duration_seconds', 'Time until response headers are sent', ['method', 'route', 'status']))
+
+
+def record_usage(purpose: str, model: str, usage: Optional[Any]):
+    """Count the prompt and completion tokens of an OpenAI response's `usage`"""
+    for kind in ('prompt', 'completion'):
+        tokens = getattr(usage, f'{kind}_tokens', None)
+        if isinstance(tokens, int) and tokens:
+            TOKENS.inc(tokens, model=model, purpose=purpose, kind=kind)
+
+
+# Upstream calls made by the current pipeline run, when something is counting them (see record_upstream_call)
+UPSTREAM_CALL_TALLY: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar('upstream_call_tally', default=None)
+
+
+def record_upstream_call(service: str):
+    """Count an upstream (OpenAI embedding, LLM chat or Weaviate) call, also in the current run's tally if one is being kept"""
+    UPSTREAM_CALLS.inc(service=service)
+    tally = UPSTREAM_CALL_TALLY.get()
+    if tally is not None:
+        tally[0] += 1
+
+
+def record_coalesced(saved_calls: int):
+    COALESCED.inc()
+    UPSTREAM_CALLS_SAVED.inc(saved_calls)
+
+
+def record_llm_call(backend: str, task: str, outcome: str, seconds: float):
+    """Count a chat completion attempt ('ok', 'error' or 'timeout') and observe its duration"""
+    LLM_CALLS.inc(backend=backend, task=task, outcome=outcome)
+    LLM_SECONDS.observe(seconds, backend=backend, task=task)
+
+
+def record_failover(backend: str, task: str):
+    LLM_FAILOVERS.inc(backend=backend, task=task)
+
+
+def record_audit(verdict: str):
+    AUDITS.inc(verdict=verdict)
+
+
+def record_error(stage: str):
+    ERRORS.inc(stage=stage)
+
+
+def record_pipeline(endpoint: str, outcome: str, stage_timings_ms: Dict[str, float], degraded: Sequence[str] = ()):
+    """Count a finished prompt, what it degraded, and observe its stage timings ('total' is the whole pipeline)"""
+    RESPONSES.inc(endpoint=endpoint, outcome=outcome)
+    for kind in degraded:
+        DEGRADATIONS.inc(kind=kind)
+    for stage, milliseconds in stage_timings_ms.items():
+        if stage == 'total':
+            PIPELINE_SECONDS.observe(milliseconds / 1000, endpoint=endpoint, outcome=outcome)
+        else:
+            STAGE_SECONDS.observe(milliseconds / 1000, stage=stage)
+
+
+def cache_metrics(cache_stats: Dict[str, Dict[str, Any]]) -> List[Metric]:
+    """Hit, miss and size series from the answer, verdict and embedding cache stats()"""
+    hits = Counter('minutemate_cache_hits_total', 'Cache hits', ['cache', 'tier'])
+    misses = Counter('minutemate_cache_misses_total', 'Cache misses', ['cache', 'tier'])
+    entries = Gauge('minutemate_cache_entries', 'Entries held in memory', ['cache', 'tier'])
+
+    def lru(cache: str, tier: str, stats: Dict[str, Any]):
+        hits.inc(stats['hits'], cache=cache, tier=tier)
+        misses.inc(stats['misses'], cache=cache, tier=tier)
+        entries.set(stats['size'], cache=cache, tier=tier)
+
+    def store(cache: str, tier: str, store_hits: int, lookups: int):
+        # Lookups that missed the memory tier fall through to the store
+        hits.inc(store_hits, cache=cache, tier=tier)
+        misses.inc(max(lookups - store_hits, 0), cache=cache, tier=tier)
+
+    answer, verdict, embedding = cache_stats['answer_cache'], cache_stats['verdict_cache'], cache_stats['embedding_cache']
+    lru('answer', 'exact', answer['exact'])
+    lru('answer', 'semantic', answer['semantic'])
+    lru('verdict', 'memory', verdict['memory'])
+    if verdict['store_rows'] is not None:
+        store('verdict', 'sqlite', verdict['store_hits'], verdict['memory']['misses'])
+    lru('embedding', 'memory', embedding['memory'])
+    if embedding['disk_rows'] is not None:
+        store('embedding', 'disk', embedding['disk_hits'], embedding['memory']['misses'])
+    return [hits, misses, entries]
+
+
+def client_metrics(client_stats: Dict[str, Dict[str, Any]]) -> List[Metric]:
+    """Utilization series from PromptProcessor.client_stats()"""
+    in_flight = Gauge('minutemate_client_in_flight', 'Upstream calls in flight', ['pool'])
+    requests = Counter('minutemate_client_requests_total', 'Upstream calls made', ['pool'])
+    failures = Counter('minutemate_client_failures_total', 'Upstream calls that failed', ['pool'])
+    utilization = Gauge('minutemate_client_utilization', 'In-flight calls over the connection limit', ['pool'])
+    healthy = Gauge('minutemate_client_healthy', 'Healthy clients in the pool', ['pool'])
+    reconnects = Counter('minutemate_client_reconnects_total', 'Clients replaced after a failed health check', ['pool'])
+    for pool, stats in client_stats.items():
+        in_flight.set(stats['in_flight'], pool=pool)
+        requests.inc(stats['requests'], pool=pool)
+        failures.inc(stats['failures'], pool=pool)
+        if 'utilization' in stats:
+            utilization.set(stats['utilization'], pool=pool)
+        if 'healthy' in stats:
+            healthy.set(stats['healthy'], pool=pool)
+            reconnects.inc(stats['reconnects'], pool=pool)
+    return [in_flight, requests, failures, utilization, healthy, reconnects]
+
+
+def local_moderation_metrics(stats: Dict[str, Any]) -> List[Metric]:
+    """Prompt pre-filter series from LocalModerator.stats()"""
+    decisions = Counter('minutemate_local_moderation_total', 'Prompts seen by the local moderation tier, by decision', ['decision'])
+    for decision in ('approved', 'escalated', 'sampled'):
+        decisions.inc(stats[decision], decision=decision)
+    disagreements = Counter('minutemate_local_moderation_disagreements_total',
+                            'Escalated prompts the local tier would have approved but the LLM check did not')
+    disagreements.inc(stats['disagreements'])
+    return [decisions, disagreements]
+
+
+def llm_backend_metrics(stats: Dict[str, Any]) -> List[Metric]:
+    """Rolling health series from LLMRouter.stats()"""
+    healthy = Gauge('minutemate_llm_backend_healthy', 'LLM backend taking traffic (not cooling down after errors)', ['backend'])
+    error_rate = Gauge('minutemate_llm_backend_error_rate', 'Failed share of the recent calls to an LLM backend', ['backend'])
+    latency = Gauge('minutemate_llm_backend_latency_seconds', 'Mean of the recent successful calls to an LLM backend', ['backend', 'task'])
+    for backend, backend_stats in stats['backends'].items():
+        healthy.set(int(backend_stats['healthy']), backend=backend)
+        error_rate.set(backend_stats['error_rate'], backend=backend)
+        for task, milliseconds in backend_stats['latency_ms'].items():
+            latency.set(milliseconds / 1000, backend=backend, task=task)
+    return [healthy, error_rate, latency]
+
+
+# Trace ID of the request being handled, for log records and the response header
+TRACE_ID: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar('trace_id', default=None)
+TRACE_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,128}')
+
+
+def resolve_trace_id(incoming: Optional[str]) -> str:
+    """Keep a well-formed trace ID sent by the caller, otherwise make a new one"""
+    if incoming and TRACE_ID_PATTERN.fullmatch(incoming):
+        return incoming
+    return uuid.uuid4().hex
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds `trace_id` to log records ('-' outside a request)"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = TRACE_ID.get() or '-'
+        return True
@@ -0,0 +1,298 @@
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cache import LRUCache, SQLiteStore, normalize_prompt
+from keywords import terms
+
+MODERATION_MODEL = "gpt-4o"
+
+VERDICTS = {'appropriate', 'inappropriate', 'ambiguous'}
+
+PROMPT_CHECK_SYSTEM_PROMPT = """A local government hosts a chat system that uses retrieval-augmented generation 
+                        to improve public access to the contents of its public meetings.  The system has access to 
+                        meeting agendas, minutes, and transcriptions.  
+                        
+                        Your role is to determine whether prompts provided by users of this system are appropriate. 
+                        It's very important that users be able to access reasonable to reasonable requests, but toxic, 
+                        abusive, or illegal responses should be identified.  
+                        
+                        Requests seeking information that is accurate and politically relevant are appropriate, 
+                        even if the information sought is embarassing to the government or individuals or includes
+                        references to abusive, illegal, or controversial actions or ideas.  
+                        
+                        The first word of your response is always 'appropriate', 'inappropriate', or 'ambiguous'. 
+                        The rest of your response provides the top three to five concise factors that explain this decision."""
+
+RESPONSE_CHECK_SYSTEM_PROMPT = """A local government hosts a chat system that uses retrieval-augmented generation 
+                        to improve public access to the contents of its public meetings.  The system has access to 
+                        meeting agendas, minutes, and transcriptions.  
+                        
+                        Your role is to determine whether the chat system's responses to prompts are appropriate. 
+                        It's very important that the chat system be able to deliver reasonable responses, 
+                        but clearly toxic, abusive, or illegal responses should be identified.
+                        
+                        Information that is accurate and politically relevant is appropriate, even if it is embarassing 
+                        to the government or individuals or includes references to abusive, illegal, or controversial 
+                        actions or ideas.
+                        
+                        The first word of your response is always 'appropriate', 'inappropriate', or 'ambiguous'.  
+                        The rest of your response provides the top three to five concise factors that explain this decision."""
+
+SYSTEM_PROMPTS = {
+    'prompt': PROMPT_CHECK_SYSTEM_PROMPT,
+    'response': RESPONSE_CHECK_SYSTEM_PROMPT,
+}
+
+
+def moderation_prompt_version(check: str) -> str:
+    """Short hash of the model and system prompt; editing either invalidates cached verdicts"""
+    return hashlib.sha256(f"{MODERATION_MODEL}\n{SYSTEM_PROMPTS[check]}".encode()).hexdigest()[:12]
+
+
+def normalize_for_moderation(text: str) -> str:
+    """Normalize text for verdict lookups; numbers are masked so templated prompts share a verdict
+
+    "List the Agenda from the 7/16/2024 meeting" and "... from the 8/6/2024 meeting"
+    differ only in a date, which never changes whether the request is appropriate.
+    """
+    return re.sub(r'\d+', '#', normalize_prompt(text))
+
+
+def is_verdict(text: str) -> bool:
+    """True if a moderation response starts with one of the expected verdict words"""
+    words = text.split(maxsplit=1)
+    return bool(words) and words[0] in VERDICTS
+
+
+class ModerationConfig:
+    """Verdict cache settings, read from the environment"""
+    VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', '4096'))
+    # SQLite file shared by workers and kept across restarts (empty keeps verdicts in memory only)
+    VERDICT_CACHE_PATH = os.getenv('VERDICT_CACHE_PATH', '')
+    VERDICT_CACHE_MAX_ROWS = int(os.getenv('VERDICT_CACHE_MAX_ROWS', '100000'))
+
+
+class VerdictCache:
+    """Memoizes moderation verdicts keyed on a hash of the check, prompt version and normalized text
+
+    Lookups go to an in-process LRU first, then to the optional SQLite store.
+    """
+    def __init__(
+        self,
+        max_size: int = ModerationConfig.VERDICT_CACHE_SIZE,
+        path: str = ModerationConfig.VERDICT_CACHE_PATH,
+        max_rows: int = ModerationConfig.VERDICT_CACHE_MAX_ROWS,
+    ):
+        self.memory = LRUCache(max_size)
+        self.store = SQLiteStore(path, 'verdicts', max_rows) if path else None
+        self.store_hits = 0
+        self.versions = {check: moderation_prompt_version(check) for check in SYSTEM_PROMPTS}
+
+    def key(self, check: str, text: str) -> str:
+        payload = f"{check}\n{self.versions[check]}\n{normalize_for_moderation(text)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, check: str, text: str) -> Optional[str]:
+        key = self.key(check, text)
+        verdict = self.memory.get(key)
+        if verdict is None and self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None:
+                verdict = json.loads(stored)['verdict']
+                self.memory.set(key, verdict)
+                self.store_hits += 1
+        return verdict
+
+    def set(self, check: str, text: str, verdict: str):
+        """Remember a well-formed verdict; malformed or failed checks are never cached"""
+        if not is_verdict(verdict):
+            return
+        key = self.key(check, text)
+        self.memory.set(key, verdict)
+        if self.store is not None:
+            self.store.set(key, json.dumps({'check': check, 'verdict': verdict}))
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'memory': self.memory.stats(),
+            'store_hits': self.store_hits,
+            'store_rows': len(self.store) if self.store is not None else None,
+            'versions': self.versions,
+        }
+
+
+class LocalModerationConfig:
+    """In-process prompt pre-filter settings, read from the environment"""
+    # Off by default: until it is trained on logged verdicts, every prompt should get the LLM check
+    LOCAL_MODERATION_ENABLED = os.getenv('LOCAL_MODERATION_ENABLED', 'false').lower() == 'true'
+    # Prompts scored at least this likely to be appropriate are approved without the LLM check
+    LOCAL_MODERATION_THRESHOLD = float(os.getenv('LOCAL_MODERATION_THRESHOLD', '0.9'))
+    # Fraction of locally approved prompts escalated anyway, to measure agreement with the LLM check
+    LOCAL_MODERATION_ESCALATION_RATE = float(os.getenv('LOCAL_MODERATION_ESCALATION_RATE', '0.05'))
+    # Longer prompts are always escalated
+    LOCAL_MODERATION_MAX_WORDS = int(os.getenv('LOCAL_MODERATION_MAX_WORDS', '12'))
+    # Trained weights (JSON from `python -m moderation train`); empty uses the built-in lexicon
+    LOCAL_MODERATION_MODEL_PATH = os.getenv('LOCAL_MODERATION_MODEL_PATH', '')
+    # JSONL log of LLM prompt verdicts to train from; empty disables logging
+    LOCAL_MODERATION_LOG_PATH = os.getenv('LOCAL_MODERATION_LOG_PATH', '')
+
+
+LOCAL_APPROVAL_VERDICT = 'appropriate civic question (local pre-filter)'
+
+# Terms of ordinary questions about public meetings, weighted towards approval
+CIVIC_TERMS = {
+    **dict.fromkeys('''
+agenda agendas minutes meeting meetings council councilmember councilmembers commission commissioner commissioners
+board committee mayor ordinance ordinances resolution resolutions zoning rezoning budget budgets hearing hearings
+vote votes voted voting motion motions transcript transcripts clerk
+'''.split(), 2.0),
+    **dict.fromkeys('''
+city county town village public comment comments session item items plan planning proposal proposals project projects
+contract contracts grant grants funding fund funds tax taxes levy park parks library road roads street streets sidewalk
+sidewalks water sewer housing development infrastructure election appointment appointed discussed discussion decision
+decisions decided approved approve approval report reports department staff manager fiscal year amendment variance
+annexation policy policies program programs services transportation traffic utility utilities member members
+summary update updates issue issues resident residents concern concerns
+'''.split(), 1.0),
+}
+
+# Always escalated, whatever the score: violence, weapons, abuse, self-harm, personal data and prompt injection
+RISK_PATTERN = re.compile(r'''\b(
+    kill|murder|shoot|bomb|explosiv|weapon|gun|firearm|stab|arson|burn\s+down|poison|assassinat|terror|threat|attack|
+    hurt|harm|suicid|rape|sex|porn|nude|naked|drug|cocaine|heroin|meth|hack|steal|fraud|
+    fuck|shit|bitch|bastard|asshole|cunt|dick|whore|slut|retard|nigg|fag|
+    home\s+address|phone\s+number|social\s+security|ssn|password|
+    ignore\s+(all|any|previous|prior|the\s+above)|disregard|forget|instructions|system\s+prompt|jailbreak|pretend|
+    roleplay|role-play|racis|joke|molotov
+)''', re.IGNORECASE | re.VERBOSE)
+
+
+def moderation_terms(text: str) -> List[str]:
+    """Distinct terms of `text` that carry weight; numbers (dates, item numbers) are neutral"""
+    return [term for term in dict.fromkeys(terms(text)) if not term.isdigit()]
+
+
+class LocalModerator:
+    """
+    Logistic scorer over prompt terms that approves clearly appropriate prompts in-process.
+
+    It never rejects: uncertain or risky prompts, and a sample of the approvals, are
+    escalated to the LLM check.  Only short prompts made entirely of known benign terms
+    (positive weight) can be approved; a single unfamiliar term escalates, so a request
+    padded with civic vocabulary cannot outscore its own content.  The default weights come from CIVIC_TERMS; `fit`
+    retrains them from logged LLM verdicts.
+    """
+    def __init__(self, weights: Optional[Dict[str, float]] = None, bias: float = -1.0, unknown_weight: float = -0.3,
+                 threshold: float = LocalModerationConfig.LOCAL_MODERATION_THRESHOLD,
+                 escalation_rate: float = LocalModerationConfig.LOCAL_MODERATION_ESCALATION_RATE,
+                 max_words: int = LocalModerationConfig.LOCAL_MODERATION_MAX_WORDS,
+                 log_path: str = LocalModerationConfig.LOCAL_MODERATION_LOG_PATH):
+        self.weights = dict(CIVIC_TERMS if weights is None else weights)
+        self.bias = bias
+        # Score of a term the weights do not know (it also rules out a local approval, see `benign`)
+        self.unknown_weight = unknown_weight
+        self.threshold = threshold
+        self.escalation_rate = escalation_rate
+        self.max_words = max_words
+        self.log_path = log_path
+        self.random = random.Random()
+        self.approved = 0
+        self.escalated = 0
+        self.sampled = 0
+        self.disagreements = 0
+
+    def score(self, text: str) -> float:
+        """Estimated probability that the prompt is appropriate"""
+        logit = self.bias + sum(self.weights.get(term, self.unknown_weight) for term in moderation_terms(text))
+        return 1 / (1 + math.exp(-max(min(logit, 30), -30)))
+
+    def benign(self, text: str) -> bool:
+        """True if the prompt is short and every term in it has a positive weight"""
+        text_terms = moderation_terms(text)
+        return (len(text.split()) <= self.max_words and bool(text_terms)
+                and all(self.weights.get(term, 0.0) > 0 for term in text_terms))
+
+    def confident(self, text: str) -> bool:
+        return not RISK_PATTERN.search(text) and self.benign(text) and self.score(text) >= self.threshold
+
+    def check(self, text: str) -> Optional[str]:
+        """An approval verdict, or None to escalate the prompt to the LLM check"""
+        if not self.confident(text):
+            self.escalated += 1
+            return None
+        if self.random.random() < self.escalation_rate:
+            self.sampled += 1
+            return None
+        self.approved += 1
+        return LOCAL_APPROVAL_VERDICT
+
+    def observe(self, text: str, verdict: str):
+        """Record an LLM verdict: count prompts this tier would have wrongly approved, and log it for training"""
+        label = verdict.split(maxsplit=1)[0]
+        if label != 'appropriate' and self.confident(text):
+            self.disagreements += 1
+        if self.log_path:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps({'text': text, 'verdict': label}) + '\n')
+
+    def fit(self, examples: Iterable[Tuple[str, str]], epochs: int = 20, learning_rate: float = 0.2, l2: float = 1e-3) -> 'LocalModerator':
+        """Train the weights on (prompt, verdict) pairs by stochastic gradient descent on the log loss"""
+        examples = [(moderation_terms(text), 1.0 if verdict == 'appropriate' else 0.0) for text, verdict in examples]
+        for _ in range(epochs):
+            for example_terms, label in examples:
+                logit = self.bias + sum(self.weights.get(term, self.unknown_weight) for term in example_terms)
+                error = label - 1 / (1 + math.exp(-max(min(logit, 30), -30)))
+                self.bias += learning_rate * error
+                for term in example_terms:
+                    weight = self.weights.get(term, self.unknown_weight)
+                    self.weights[term] = weight + learning_rate * (error - l2 * weight)
+        return self
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump({'bias': self.bias, 'unknown_weight': self.unknown_weight, 'weights': self.weights}, f)
+
+    @classmethod
+    def load(cls, path: str = LocalModerationConfig.LOCAL_MODERATION_MODEL_PATH, **kwargs) -> 'LocalModerator':
+        """Trained weights from `path`, or the built-in lexicon if there are none"""
+        if not path or not os.path.exists(path):
+            return cls(**kwargs)
+        with open(path) as f:
+            model = json.load(f)
+        return cls(model['weights'], model['bias'], model['unknown_weight'], **kwargs)
+
+    def stats(self) -> Dict[str, object]:
+        checked = self.approved + self.escalated + self.sampled
+        return {
+            'approved': self.approved,
+            'escalated': self.escalated,
+            'sampled': self.sampled,
+            'disagreements': self.disagreements,
+            'escalation_rate': round((self.escalated + self.sampled) / checked, 3) if checked else None,
+        }
+
+
+def read_verdict_log(path: str) -> List[Tuple[str, str]]:
+    with open(path) as f:
+        return [(entry['text'], entry['verdict']) for entry in map(json.loads, f) if entry.get('verdict') in VERDICTS]
+
+
+if __name__ == '__main__':
+    # python -m moderation train <verdict log> <model path>
+    if len(sys.argv) != 4 or sys.argv[1] != 'train':
+        sys.exit('usage: python -m moderation train VERDICT_LOG MODEL_PATH')
+    examples = read_verdict_log(sys.argv[2])
+    moderator = LocalModerator().fit(examples)
+    moderator.save(sys.argv[3])
+    approved = sum(moderator.confident(text) for text, _ in examples)
+    print(f"Trained on {len(examples)} verdicts; {approved} would now be approved locally")
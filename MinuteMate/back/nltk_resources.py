@@ -0,0 +1,65 @@
+"""
+NLTK data used by keyword extraction, looked up locally instead of downloaded on import.
+
+Bake the data into an image (or a checkout) ahead of time from MinuteMate/back:
+
+    python -m nltk_resources
+"""
+
+import logging
+import os
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Resource name -> path checked with nltk.data.find
+NLTK_RESOURCES = {
+    'punkt': 'tokenizers/punkt',
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'stopwords': 'corpora/stopwords',
+}
+
+
+class NLTKConfig:
+    """Where NLTK data is read from and whether it may be fetched at runtime"""
+    NLTK_DATA_DIR = os.getenv('NLTK_DATA', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data'))
+    # Off by default so a worker never blocks on the network while booting
+    NLTK_DOWNLOAD = os.getenv('NLTK_DOWNLOAD', 'false').lower() == 'true'
+
+
+def missing_nltk_resources(data_dir: str = NLTKConfig.NLTK_DATA_DIR) -> List[str]:
+    """Names of the NLTK resources that cannot be found locally"""
+    import nltk
+
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def ensure_nltk_resources(data_dir: str = NLTKConfig.NLTK_DATA_DIR, download: bool = NLTKConfig.NLTK_DOWNLOAD) -> List[str]:
+    """Make local NLTK data visible, downloading missing resources only if allowed; returns what is still missing"""
+    missing = missing_nltk_resources(data_dir)
+    if missing and download:
+        import nltk
+
+        for name in missing:
+            try:
+                nltk.download(name, download_dir=data_dir, quiet=True)
+            except Exception as e:
+                logger.error(f"Error downloading NLTK resource {name}: {e}")
+        missing = missing_nltk_resources(data_dir)
+    if missing:
+        logger.warning(f"NLTK resources not found in {data_dir}: {', '.join(missing)}")
+    return missing
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    still_missing = ensure_nltk_resources(download=True)
+    raise SystemExit(1 if still_missing else 0)
@@ -0,0 +1,192 @@
+import os
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+DateSpan = Tuple[date, date]  # inclusive
+
+
+class QueryFilterConfig:
+    """Metadata filter push-down settings, read from the environment"""
+    QUERY_FILTERS_ENABLED = os.getenv('QUERY_FILTERS_ENABLED', 'true').lower() == 'true'
+    # MeetingDocument properties that prompts may filter on
+    QUERY_FILTER_FIELDS = frozenset(os.getenv('QUERY_FILTER_FIELDS', 'meeting_date,meeting_type,file_type').split(','))
+    # Longer date ranges are pushed down as months, then as years (and checked exactly on the results)
+    MAX_DAY_CLAUSES = int(os.getenv('QUERY_FILTER_MAX_DAY_CLAUSES', '31'))
+    MAX_MONTH_CLAUSES = int(os.getenv('QUERY_FILTER_MAX_MONTH_CLAUSES', '24'))
+
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ('january', 'jan'), ('february', 'feb'), ('march', 'mar'), ('april', 'apr'), ('may',), ('june', 'jun'),
+        ('july', 'jul'), ('august', 'aug'), ('september', 'sept', 'sep'), ('october', 'oct'), ('november', 'nov'),
+        ('december', 'dec'),
+    ], start=1)
+    for name in names
+}
+MONTH = r'(?P<month_name>' + '|'.join(sorted(MONTHS, key=len, reverse=True)) + r')\.?'
+ORDINAL = r'(?:st|nd|rd|th)?'
+
+# Most specific first; text matched by one pattern is not matched again by a later one
+DATE_PATTERNS = [
+    ('day', re.compile(r'\b(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})\b')),
+    ('day', re.compile(r'\b(?P<month>\d{1,2})/(?P<day>\d{1,2})/(?P<year>\d{4}|\d{2})\b')),
+    ('day', re.compile(rf'\b{MONTH}\s+(?P<day>\d{{1,2}}){ORDINAL},?\s+(?P<year>\d{{4}})\b', re.IGNORECASE)),
+    ('day', re.compile(rf'\b(?P<day>\d{{1,2}}){ORDINAL}\s+(?:of\s+)?{MONTH},?\s+(?P<year>\d{{4}})\b', re.IGNORECASE)),
+    ('month', re.compile(rf'\b{MONTH},?\s+(?:of\s+)?(?P<year>\d{{4}})\b', re.IGNORECASE)),
+    ('year', re.compile(r'\b(?P<year>(?:19|20)\d{2})\b')),
+]
+
+# Two dates joined like this form one range: "from January 2024 to March 2024", "between 2/20/24 and 3/19/24"
+RANGE_CONNECTOR = re.compile(r'\s*(?:to|through|thru|until|till|-|–)\s*$', re.IGNORECASE)
+RANGE_AND = re.compile(r'\s*and\s*$', re.IGNORECASE)
+RANGE_START = re.compile(r'\bbetween\s*$', re.IGNORECASE)
+
+# Values written by the preprocessing pipeline (Streamlit upload form)
+MEETING_TYPE_PATTERNS = {
+    'Board of Commissioners': re.compile(
+        r'\bboard\s+of\s+(?:county\s+)?commissioners?\b|\bcommissioners?\s+meetings?\b|(?-i:\bBOC\b)', re.IGNORECASE),
+    'Planning Board': re.compile(r'\bplanning\s+(?:board|commission)\b|(?-i:\bPB\b)', re.IGNORECASE),
+}
+FILE_TYPE_PATTERNS = {
+    'Agenda': re.compile(r'\bagendas?\b', re.IGNORECASE),
+    # Not durations such as "5 minutes"
+    'Minutes': re.compile(r'(?<!\d\s)\bminutes\b', re.IGNORECASE),
+    'Audio': re.compile(r'\b(?:transcripts?|transcriptions?|recordings?|audio)\b', re.IGNORECASE),
+}
+
+
+def _month_end(year: int, month: int) -> date:
+    return (date(year + month // 12, month % 12 + 1, 1)) - timedelta(days=1)
+
+
+def _date_mentions(text: str) -> List[Tuple[int, int, DateSpan]]:
+    """(start offset, end offset, date span) of each date, month or year mentioned, in order"""
+    taken = [False] * len(text)
+    mentions = []
+    for kind, pattern in DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            if any(taken[match.start():match.end()]):
+                continue
+            fields = match.groupdict()
+            year = int(fields['year'])
+            year += 2000 if year < 100 else 0
+            month = MONTHS[fields['month_name'].lower()] if fields.get('month_name') else int(fields.get('month') or 1)
+            try:
+                if kind == 'day':
+                    day = date(year, month, int(fields['day']))
+                    span = (day, day)
+                elif kind == 'month':
+                    span = (date(year, month, 1), _month_end(year, month))
+                else:
+                    span = (date(year, 1, 1), date(year, 12, 31))
+            except ValueError:
+                continue
+            taken[match.start():match.end()] = [True] * (match.end() - match.start())
+            mentions.append((match.start(), match.end(), span))
+    return sorted(mentions)
+
+
+def date_spans(text: str) -> List[DateSpan]:
+    """Dates, months, years and ranges of them mentioned in `text`"""
+    mentions = _date_mentions(text)
+    spans = []
+    i = 0
+    while i < len(mentions):
+        start, end, span = mentions[i]
+        if i + 1 < len(mentions):
+            gap = text[end:mentions[i + 1][0]]
+            if RANGE_CONNECTOR.match(gap) or (RANGE_AND.match(gap) and RANGE_START.search(text[:start])):
+                spans.append((span[0], mentions[i + 1][2][1]))
+                i += 2
+                continue
+        spans.append(span)
+        i += 1
+    return spans
+
+
+def date_values(span: DateSpan) -> List[str]:
+    """`meeting_date` values to match for a span: whole days, months ('YYYY-MM') or years ('YYYY')
+
+    meeting_date is stored as 'YYYY-MM-DD' text with word tokenization, so an Equal filter
+    on '2024-07' matches any date with the tokens 2024 and 07.  That can include days
+    outside the month, which is why results are also checked with QueryFilter.matches.
+    """
+    start, end = span
+    days = (end - start).days + 1
+    if start == date(start.year, 1, 1) and end == date(end.year, 12, 31):
+        return [str(year) for year in range(start.year, end.year + 1)]
+    if days <= QueryFilterConfig.MAX_DAY_CLAUSES:
+        return [(start + timedelta(days=offset)).isoformat() for offset in range(days)]
+    months = [(year, month) for year in range(start.year, end.year + 1) for month in range(1, 13)
+              if (year, month) >= (start.year, start.month) and (year, month) <= (end.year, end.month)]
+    if len(months) <= QueryFilterConfig.MAX_MONTH_CLAUSES:
+        return [f"{year}-{month:02d}" for year, month in months]
+    return [str(year) for year in range(start.year, end.year + 1)]
+
+
+class QueryFilter:
+    """Metadata constraints named in a prompt (each field: any of its values)"""
+    def __init__(self, spans: Optional[List[DateSpan]] = None, meeting_types: Optional[List[str]] = None,
+                 file_types: Optional[List[str]] = None):
+        self.spans = spans or []
+        self.meeting_types = meeting_types or []
+        self.file_types = file_types or []
+
+    def __bool__(self) -> bool:
+        return bool(self.spans or self.meeting_types or self.file_types)
+
+    def matches(self, properties: Dict[str, Any]) -> bool:
+        """Exact check of a result's properties; properties that are missing or unparsable pass"""
+        meeting_date = str(properties.get('meeting_date') or '')[:10]
+        if self.spans and re.fullmatch(r'\d{4}-\d{2}-\d{2}', meeting_date):
+            day = date.fromisoformat(meeting_date)
+            if not any(start <= day <= end for start, end in self.spans):
+                return False
+        for name, values in (('meeting_type', self.meeting_types), ('file_type', self.file_types)):
+            value = properties.get(name)
+            if values and value is not None and value.lower() not in {v.lower() for v in values}:
+                return False
+        return True
+
+    def to_weaviate(self):
+        """The constraints as a Weaviate v4 filter (all fields must match)"""
+        from weaviate.classes.query import Filter
+
+        def any_of(name: str, values: List[str]):
+            filters = [Filter.by_property(name).equal(value) for value in dict.fromkeys(values)]
+            return filters[0] if len(filters) == 1 else Filter.any_of(filters)
+
+        clauses = []
+        if self.spans:
+            clauses.append(any_of('meeting_date', [value for span in self.spans for value in date_values(span)]))
+        if self.meeting_types:
+            clauses.append(any_of('meeting_type', self.meeting_types))
+        if self.file_types:
+            clauses.append(any_of('file_type', self.file_types))
+        return clauses[0] if len(clauses) == 1 else Filter.all_of(clauses)
+
+    def describe(self) -> Dict[str, List[str]]:
+        """JSON-friendly summary for responses"""
+        description = {}
+        if self.spans:
+            description['meeting_date'] = [
+                start.isoformat() if start == end else f"{start.isoformat()}/{end.isoformat()}" for start, end in self.spans
+            ]
+        if self.meeting_types:
+            description['meeting_type'] = self.meeting_types
+        if self.file_types:
+            description['file_type'] = self.file_types
+        return description
+
+
+def parse_query_filter(text: str, fields: frozenset = QueryFilterConfig.QUERY_FILTER_FIELDS) -> QueryFilter:
+    """Dates, date ranges, meeting types and file types mentioned in a prompt"""
+    return QueryFilter(
+        spans=date_spans(text) if 'meeting_date' in fields else [],
+        meeting_types=[name for name, pattern in MEETING_TYPE_PATTERNS.items() if pattern.search(text)]
+        if 'meeting_type' in fields else [],
+        file_types=[name for name, pattern in FILE_TYPE_PATTERNS.items() if pattern.search(text)]
+        if 'file_type' in fields else [],
+    )
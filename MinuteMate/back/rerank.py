@@ -0,0 +1,137 @@
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Small built-in list so reranking never depends on NLTK data being present
+STOPWORDS = frozenset('''
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how i
+if in into is it its itself just me more most my no nor not now of off on once only or other our out over own same she
+should so some such than that the their them then there these they this those through to too under until up very was
+we were what when where which while who whom why will with would you your list give show tell summarize generate
+'''.split())
+
+
+class RerankConfig:
+    """Post-retrieval reranking settings, read from the environment"""
+    RERANK_ENABLED = os.getenv('RERANK_ENABLED', 'true').lower() == 'true'
+    # Candidates fetched from Weaviate before reranking
+    RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', '40'))
+    # Segments passed on to generation
+    RERANK_TOP_K = int(os.getenv('RERANK_TOP_K', '5'))
+    # 'overlap' (term overlap, no vectors needed) or 'embedding' (cosine, fetches chunk vectors)
+    RERANK_SCORER = os.getenv('RERANK_SCORER', 'overlap')
+    # MMR trade-off: 1.0 ranks purely on relevance, lower values favour diversity
+    RERANK_MMR_LAMBDA = float(os.getenv('RERANK_MMR_LAMBDA', '0.5'))
+    # Weight of the original retrieval rank in the relevance score
+    RERANK_RANK_PRIOR = float(os.getenv('RERANK_RANK_PRIOR', '0.3'))
+
+    @classmethod
+    def candidate_limit(cls, default: int = 5) -> int:
+        """How many results to request from Weaviate"""
+        return cls.RERANK_CANDIDATES if cls.RERANK_ENABLED else default
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in re.findall(r'[a-z0-9]+', text.lower()) if word not in STOPWORDS]
+
+
+def term_overlap_scores(query: str, documents: Sequence[str]) -> np.ndarray:
+    """BM25-style scores of the query terms against each candidate, with IDF taken over the candidates"""
+    query_terms = set(tokenize(query))
+    document_terms = [Counter(tokenize(document)) for document in documents]
+    if not query_terms or not documents:
+        return np.zeros(len(documents))
+
+    average_length = sum(sum(terms.values()) for terms in document_terms) / len(documents) or 1.0
+    scores = np.zeros(len(documents))
+    for term in query_terms:
+        frequency = sum(1 for terms in document_terms if term in terms)
+        if not frequency:
+            continue
+        idf = math.log(1 + (len(documents) - frequency + 0.5) / (frequency + 0.5))
+        for i, terms in enumerate(document_terms):
+            tf = terms.get(term, 0)
+            if tf:
+                length = sum(terms.values())
+                scores[i] += idf * tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * length / average_length))
+    return scores
+
+
+def jaccard_matrix(documents: Sequence[str]) -> np.ndarray:
+    """Pairwise Jaccard similarity of the candidates' term sets"""
+    sets = [set(tokenize(document)) for document in documents]
+    similarity = np.zeros((len(sets), len(sets)))
+    for i in range(len(sets)):
+        for j in range(i + 1, len(sets)):
+            union = len(sets[i] | sets[j])
+            similarity[i, j] = similarity[j, i] = len(sets[i] & sets[j]) / union if union else 0.0
+    return similarity
+
+
+def cosine_matrix(vectors: np.ndarray) -> np.ndarray:
+    normalized = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return normalized @ normalized.T
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, similarity: np.ndarray, top_k: int, mmr_lambda: float) -> List[int]:
+    """Greedily pick indices that are relevant but not similar to the ones already picked"""
+    selected: List[int] = []
+    remaining = list(range(len(relevance)))
+    while remaining and len(selected) < top_k:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        mmr = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        selected.append(remaining.pop(int(np.argmax(mmr))))
+    return selected
+
+
+def rerank(
+    query: str,
+    candidates: Sequence[Tuple[Any, Optional[float]]],
+    query_vector: Optional[Sequence[float]] = None,
+    top_k: int = RerankConfig.RERANK_TOP_K,
+    scorer: str = RerankConfig.RERANK_SCORER,
+    mmr_lambda: float = RerankConfig.RERANK_MMR_LAMBDA,
+    rank_prior: float = RerankConfig.RERANK_RANK_PRIOR,
+) -> List[Tuple[Any, float]]:
+    """Rerank (Weaviate object, retrieval score) candidates locally and de-duplicate them with MMR
+
+    Candidates must be in retrieval order. Relevance mixes a normalized local score
+    (term overlap, or cosine to `query_vector` when scorer is 'embedding' and the
+    objects carry vectors) with a prior from the original rank. Returns at most
+    `top_k` (object, relevance) pairs, best first.
+    """
+    if not candidates:
+        return []
+    items = [item for item, _ in candidates]
+    documents = [item.properties.get('content', '') for item in items]
+
+    vectors = None
+    if scorer == 'embedding' and query_vector is not None:
+        raw = [getattr(item, 'vector', None) or {} for item in items]
+        raw = [vector.get('default') if isinstance(vector, dict) else vector for vector in raw]
+        if all(vector is not None for vector in raw):
+            vectors = np.asarray(raw, dtype=np.float32)
+
+    if vectors is not None:
+        query = np.asarray(query_vector, dtype=np.float32)
+        local = cosine_matrix(np.vstack([query, vectors]))[0, 1:]
+        similarity = cosine_matrix(vectors)
+    else:
+        local = term_overlap_scores(query, documents)
+        similarity = jaccard_matrix(documents)
+
+    spread = local.max() - local.min()
+    local = (local - local.min()) / spread if spread > 0 else np.ones(len(items))
+    prior = 1 - np.arange(len(items)) / len(items)
+    relevance = (1 - rank_prior) * local + rank_prior * prior
+
+    selected = maximal_marginal_relevance(relevance, similarity, top_k, mmr_lambda)
+    return [(items[i], round(float(relevance[i]), 4)) for i in selected]
@@ -0,0 +1,76 @@
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+class RetrievalConfig:
+    """How many retrieved segments are passed on to generation, read from the environment"""
+    # Keep results up to the largest drop in score instead of a fixed number
+    ADAPTIVE_TOP_K = os.getenv('ADAPTIVE_TOP_K', 'true').lower() == 'true'
+    TOP_K_MIN = int(os.getenv('TOP_K_MIN', '2'))
+    TOP_K_MAX = int(os.getenv('TOP_K_MAX', '5'))
+    # A drop counts as a cut-off only if it is at least this fraction of the spread of the scores considered
+    TOP_K_MIN_GAP = float(os.getenv('TOP_K_MIN_GAP', '0.3'))
+
+    @classmethod
+    def candidate_limit(cls) -> int:
+        """Results to request when they are not reranked (one past TOP_K_MAX, to see the drop after it)"""
+        return cls.TOP_K_MAX + 1 if cls.ADAPTIVE_TOP_K else 5
+
+
+def score_gap_cutoff(
+    scores: Sequence[Optional[float]],
+    min_k: int = RetrievalConfig.TOP_K_MIN,
+    max_k: int = RetrievalConfig.TOP_K_MAX,
+    min_gap: float = RetrievalConfig.TOP_K_MIN_GAP,
+) -> int:
+    """How many of the best-first results to keep: up to the largest drop between consecutive scores
+
+    Only the first max_k + 1 scores are considered, and the drop must be at least `min_gap`
+    of their spread; otherwise (or when scores are missing) max_k results are kept.
+    """
+    count = min(len(scores), max_k)
+    window = list(scores[:max_k + 1])
+    if count <= min_k or any(score is None for score in window):
+        return count
+    ordered = sorted(window, reverse=True)
+    spread = ordered[0] - ordered[-1]
+    if spread <= 0:
+        return count
+    gaps = {k: ordered[k - 1] - ordered[k] for k in range(min_k, len(ordered))}
+    best = max(gaps, key=gaps.get)
+    return best if gaps[best] >= min_gap * spread and best < count else count
+
+
+def cut_at_score_gap(scored: Sequence[Tuple[Any, Optional[float]]], **cutoff) -> List[Tuple[Any, Optional[float]]]:
+    """Keep the (object, score) pairs scoring above the largest drop, in their given (e.g. MMR) order
+
+    The cut-off is found on the scores sorted best first, since reranking with MMR may
+    put a lower-scoring result before a higher one.  Keeps a prefix if scores are missing.
+    """
+    scores = [score for _, score in scored]
+    if any(score is None for score in scores):
+        return list(scored[:score_gap_cutoff(scores, **cutoff)])
+    best_first = sorted(range(len(scored)), key=lambda i: scores[i], reverse=True)
+    kept = set(best_first[:score_gap_cutoff([scores[i] for i in best_first], **cutoff)])
+    return [pair for i, pair in enumerate(scored) if i in kept]
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: Sequence[Sequence[Any]],
+    weights: Sequence[float],
+    k: int = 60,
+    limit: int = 5,
+) -> List[Tuple[Any, float]]:
+    """Merge ranked Weaviate result lists with weighted reciprocal-rank fusion
+
+    Each object scores sum(weight / (k + rank)) over the lists it appears in,
+    matched by uuid. Returns (object, fused score) pairs, best first.
+    """
+    scores: Dict[Any, float] = {}
+    objects: Dict[Any, Any] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, item in enumerate(ranked, start=1):
+            scores[item.uuid] = scores.get(item.uuid, 0.0) + weight / (k + rank)
+            objects.setdefault(item.uuid, item)
+    fused = sorted(scores.items(), key=lambda entry: entry[1], reverse=True)[:limit]
+    return [(objects[uuid], score) for uuid, score in fused]
@@ -0,0 +1,197 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from deadlines import Degradation, current_deadline, within
+from metrics import record_failover, record_llm_call
+
+logger = logging.getLogger(__name__)
+
+# What a chat completion is for; a backend only serves the tasks it lists
+TASKS = ('generation', 'structured', 'moderation', 'summary')
+
+
+class RoutingConfig:
+    """LLM backend routing settings, read from the environment"""
+    # OpenAI-compatible chat backends besides OpenAI itself (JSON list), e.g. the vLLM server of Llama_On_Modal/api.py:
+    # [{"name": "modal-llama", "base_url": "https://...modal.run/v1", "api_key_env": "DSBA_LLAMA3_KEY",
+    #   "model": "/models/NousResearch/Meta-Llama-3-8B-Instruct", "tasks": ["generation", "moderation", "summary"]}]
+    # "model" replaces the requested model name; "tasks" defaults to every task but 'structured' (JSON-schema output).
+    # An entry named "openai" (no base_url) sets OpenAI's place in the list and its tasks.
+    LLM_BACKENDS: List[Dict[str, Any]] = json.loads(os.getenv('LLM_BACKENDS', '[]'))
+    # 'latency': the fastest healthy backend first; 'priority': the listed order, later backends only on failover
+    LLM_ROUTING = os.getenv('LLM_ROUTING', 'latency')
+    # Recent calls per backend that the latency and error rate are computed over
+    LLM_ROUTER_WINDOW = int(os.getenv('LLM_ROUTER_WINDOW', '50'))
+    # A backend failing more than this fraction of its recent calls (at least LLM_ROUTER_MIN_CALLS of them)
+    # is skipped for LLM_ROUTER_COOLDOWN_SECONDS, then tried again; one more failure starts another cooldown
+    LLM_ROUTER_MAX_ERROR_RATE = float(os.getenv('LLM_ROUTER_MAX_ERROR_RATE', '0.5'))
+    LLM_ROUTER_MIN_CALLS = int(os.getenv('LLM_ROUTER_MIN_CALLS', '5'))
+    LLM_ROUTER_COOLDOWN_SECONDS = float(os.getenv('LLM_ROUTER_COOLDOWN_SECONDS', '30'))
+    # Share of the calls sent to a random other healthy backend, so its latency estimate stays current
+    LLM_ROUTER_EXPLORE_RATE = float(os.getenv('LLM_ROUTER_EXPLORE_RATE', '0.05'))
+    # Share of the time left in the deadline a backend gets when another could take over after it
+    LLM_FAILOVER_ATTEMPT_SHARE = float(os.getenv('LLM_FAILOVER_ATTEMPT_SHARE', '0.6'))
+
+
+class LLMBackend:
+    """One OpenAI-compatible chat endpoint, with its rolling latency (per task) and error rate"""
+    def __init__(self, name: str, client, model: Optional[str] = None, tasks=TASKS,
+                 window: int = RoutingConfig.LLM_ROUTER_WINDOW):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.tasks = frozenset(tasks)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.latencies: Dict[str, Deque[float]] = {task: deque(maxlen=window) for task in TASKS}
+        self.cooldown_until = 0.0
+        self.probation = False
+        self.cooldowns = 0
+
+    async def create(self, **request):
+        if self.model:
+            request['model'] = self.model
+        return await self.client.chat.completions.create(**request)
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def latency_ms(self, task: str) -> Optional[float]:
+        """Mean latency of the recent successful calls for `task`, None before the first"""
+        latencies = self.latencies[task]
+        return sum(latencies) / len(latencies) if latencies else None
+
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def observe(self, task: str, milliseconds: float, ok: bool):
+        """Record a call; too many recent failures (or one right after a cooldown) start a cooldown"""
+        if ok:
+            self.latencies[task].append(milliseconds)
+            if self.probation:
+                # Recovered: judge it on its calls from now on
+                self.probation = False
+                self.outcomes.clear()
+            self.outcomes.append(True)
+            return
+        self.outcomes.append(False)
+        if self.probation or (len(self.outcomes) >= RoutingConfig.LLM_ROUTER_MIN_CALLS
+                              and self.error_rate() > RoutingConfig.LLM_ROUTER_MAX_ERROR_RATE):
+            self.cooldown_until = time.monotonic() + RoutingConfig.LLM_ROUTER_COOLDOWN_SECONDS
+            self.probation = True
+            self.cooldowns += 1
+            logger.error(f"LLM backend {self.name} unhealthy (error rate {self.error_rate():.0%}), "
+                         f"skipping it for {RoutingConfig.LLM_ROUTER_COOLDOWN_SECONDS:.0f}s")
+
+    async def close(self):
+        await self.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'model': self.model,
+            'tasks': sorted(self.tasks),
+            'healthy': self.available(),
+            'calls': len(self.outcomes),
+            'error_rate': round(self.error_rate(), 3),
+            'cooldowns': self.cooldowns,
+            'latency_ms': {task: round(self.latency_ms(task), 1) for task in TASKS if self.latency_ms(task) is not None},
+        }
+
+
+class LLMRouter:
+    """Sends each chat completion to the best backend for its task, failing over to the next within the deadline
+
+    Backends are ranked per call: healthy ones by rolling latency (LLM_ROUTING=latency;
+    unmeasured ones after measured ones, in listed order) or in listed order
+    (LLM_ROUTING=priority), then the ones cooling down as a last resort.  When a
+    backend fails or runs out its share of the time left, the call moves to the next.
+    """
+    def __init__(self, backends: List[LLMBackend], routing: str = RoutingConfig.LLM_ROUTING,
+                 explore_rate: float = RoutingConfig.LLM_ROUTER_EXPLORE_RATE):
+        self.backends = backends
+        self.routing = routing
+        self.explore_rate = explore_rate
+        self.failovers = 0
+
+    @classmethod
+    def from_config(cls, openai_client, backends: List[Dict[str, Any]] = RoutingConfig.LLM_BACKENDS) -> 'LLMRouter':
+        """OpenAI plus the LLM_BACKENDS endpoints"""
+        from clients import create_openai_client
+
+        routed = []
+        for entry in backends:
+            tasks = entry.get('tasks') or [task for task in TASKS if task != 'structured']
+            if entry['name'] == 'openai':
+                routed.append(LLMBackend('openai', openai_client, entry.get('model'), entry.get('tasks') or TASKS))
+                continue
+            client, _ = create_openai_client(os.getenv(entry.get('api_key_env') or '', '') or 'EMPTY', entry['base_url'])
+            routed.append(LLMBackend(entry['name'], client, entry.get('model'), tasks))
+        if not any(backend.name == 'openai' for backend in routed):
+            routed.insert(0, LLMBackend('openai', openai_client))
+        return cls(routed)
+
+    def candidates(self, task: str) -> List[LLMBackend]:
+        """Backends serving `task`, in the order to try them"""
+        serving = [backend for backend in self.backends if task in backend.tasks]
+        healthy = [backend for backend in serving if backend.available()]
+        if self.routing == 'latency':
+            measured = sorted((backend for backend in healthy if backend.latency_ms(task) is not None),
+                              key=lambda backend: backend.latency_ms(task))
+            healthy = measured + [backend for backend in healthy if backend.latency_ms(task) is None]
+        if len(healthy) > 1 and random.random() < self.explore_rate:
+            healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        return healthy + [backend for backend in serving if backend not in healthy]
+
+    async def complete(self, task: str, reserve_ms: float = 0, degradation: Optional[Degradation] = None, **request):
+        """Chat completion for `task` (the keyword arguments of chat.completions.create)
+
+        Each attempt but the last gets LLM_FAILOVER_ATTEMPT_SHARE of the time left
+        (less `reserve_ms`), so the next backend can still answer within the deadline.
+        `degradation` is recorded if the last attempt runs out of time.  Raises the
+        last backend's error if every backend fails.
+        """
+        candidates = self.candidates(task)
+        if not candidates:
+            raise ValueError(f"No LLM backend serves {task}")
+        for position, backend in enumerate(candidates):
+            last = position == len(candidates) - 1
+            deadline = current_deadline()
+            cap_ms = None
+            if not last and deadline is not None:
+                cap_ms = deadline.remaining_ms(reserve_ms) * RoutingConfig.LLM_FAILOVER_ATTEMPT_SHARE
+            started = time.perf_counter()
+            try:
+                response = await within(backend.create(**request), reserve_ms=reserve_ms, cap_ms=cap_ms,
+                                        degradation=degradation if last else None)
+            except Exception as e:
+                seconds = time.perf_counter() - started
+                backend.observe(task, seconds * 1000, ok=False)
+                record_llm_call(backend.name, task, 'timeout' if isinstance(e, asyncio.TimeoutError) else 'error', seconds)
+                if last:
+                    raise
+                self.failovers += 1
+                record_failover(backend.name, task)
+                logger.error(f"LLM backend {backend.name} failed for {task} ({e!r}), trying {candidates[position + 1].name}")
+                continue
+            seconds = time.perf_counter() - started
+            backend.observe(task, seconds * 1000, ok=True)
+            record_llm_call(backend.name, task, 'ok', seconds)
+            return response
+
+    async def close(self):
+        """Close the backends' clients, except OpenAI's (its owner closes it)"""
+        for backend in self.backends:
+            if backend.name != 'openai':
+                await backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'routing': self.routing,
+            'failovers': self.failovers,
+            'backends': {backend.name: backend.stats() for backend in self.backends},
+        }
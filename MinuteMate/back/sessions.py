@@ -0,0 +1,270 @@
+import asyncio
+import json
+import os
+import re
+import time
+import uuid
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import LRUCache, SQLiteStore
+from context_packing import truncate_to_tokens
+from keywords import terms
+from tokenization import count_tokens, get_encoding
+
+
+class SessionConfig:
+    """Conversation session settings, read from the environment"""
+    # Sessions expire this long after their last turn
+    SESSION_TTL_SECONDS = float(os.getenv('SESSION_TTL_SECONDS', '1800'))
+    SESSION_MAX_SESSIONS = int(os.getenv('SESSION_MAX_SESSIONS', '10000'))
+    # SQLite file shared by every worker, so any of them can continue a session (empty keeps sessions per process)
+    SESSION_STORE_PATH = os.getenv('SESSION_STORE_PATH', '')
+    # Turns kept verbatim; older ones are folded into the rolling summary
+    SESSION_RECENT_TURNS = int(os.getenv('SESSION_RECENT_TURNS', '2'))
+    # Tokens of history (summary plus recent turns) sent with each turn, and the summary's share of them
+    SESSION_HISTORY_TOKEN_BUDGET = int(os.getenv('SESSION_HISTORY_TOKEN_BUDGET', '800'))
+    SESSION_SUMMARY_TOKENS = int(os.getenv('SESSION_SUMMARY_TOKENS', '250'))
+    SESSION_SUMMARY_MODEL = os.getenv('SESSION_SUMMARY_MODEL', 'gpt-4o-mini')
+    # Longest wait for the summary before generation; a slower one is replaced by an extractive summary
+    SESSION_SUMMARY_TIMEOUT_MS = float(os.getenv('SESSION_SUMMARY_TIMEOUT_MS', '3000'))
+    # Earlier prompts added to the retrieval query, so a follow-up finds what "that amendment" refers to
+    SESSION_QUERY_TURNS = int(os.getenv('SESSION_QUERY_TURNS', '1'))
+    # Context segments kept from a turn for the next, and the fraction of a prompt's keywords a kept segment must contain
+    SESSION_CONTEXT_SEGMENTS = int(os.getenv('SESSION_CONTEXT_SEGMENTS', '8'))
+    SESSION_CONTEXT_MIN_OVERLAP = float(os.getenv('SESSION_CONTEXT_MIN_OVERLAP', '0.5'))
+
+
+SUMMARY_INSTRUCTIONS = """You maintain the running summary of a conversation between a resident and a
+                        chat system that answers questions about a local government's public meetings.
+                        Update the summary with the new exchanges.  Keep the meetings, dates, case numbers,
+                        people and decisions discussed, so later questions that refer back to them can be
+                        understood.  Reply with the summary only, in at most {words} words."""
+
+SUMMARY_HEADER = 'Summary of the conversation so far:'
+
+
+class Session:
+    """Conversation state of one client between turns: a rolling summary, recent turns and the last turn's context"""
+    def __init__(self, session_id: str, summary: str = '', turns: Optional[List[Dict[str, str]]] = None,
+                 context: Optional[List[Dict[str, Any]]] = None, turn_count: int = 0, summarized_turns: int = 0,
+                 updated_at: Optional[float] = None):
+        self.session_id = session_id
+        self.summary = summary
+        self.turns = turns or []  # {'prompt', 'answer'}, oldest first
+        self.context = context or []  # ContextSegment dicts the last answer was generated from
+        self.turn_count = turn_count
+        self.summarized_turns = summarized_turns
+        self.updated_at = updated_at or time.time()
+
+    def record(self, prompt: str, answer: str, context: List[Dict[str, Any]],
+               max_segments: int = SessionConfig.SESSION_CONTEXT_SEGMENTS):
+        """Add an answered turn"""
+        self.turns.append({'prompt': prompt, 'answer': answer})
+        self.context = context[:max_segments]
+        self.turn_count += 1
+
+    def fold(self, summary: str, count: int):
+        """Replace the oldest `count` turns with `summary`"""
+        self.summary = summary
+        self.turns = self.turns[count:]
+        self.summarized_turns += count
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'session_id': self.session_id, 'summary': self.summary, 'turns': self.turns, 'context': self.context,
+            'turn_count': self.turn_count, 'summarized_turns': self.summarized_turns, 'updated_at': self.updated_at,
+        })
+
+    @classmethod
+    def from_json(cls, text: str) -> 'Session':
+        return cls(**json.loads(text))
+
+
+class SessionStore:
+    """Sessions by ID, expiring SESSION_TTL_SECONDS after their last turn
+
+    Sessions live in an in-process LRU, or with a `path` in a SQLite file every worker
+    shares (read and written off the event loop).  Turns of one session are serialized
+    within a process by `lock`; across workers the last turn to finish wins.
+    """
+    def __init__(
+        self,
+        path: str = SessionConfig.SESSION_STORE_PATH,
+        max_sessions: int = SessionConfig.SESSION_MAX_SESSIONS,
+        ttl_seconds: float = SessionConfig.SESSION_TTL_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.memory = LRUCache(max_sessions, ttl_seconds)
+        self.store = SQLiteStore(path, 'sessions', max_sessions) if path else None
+        self.locks: 'weakref.WeakValueDictionary[str, asyncio.Lock]' = weakref.WeakValueDictionary()
+        self.created = 0
+        self.expired = 0
+
+    def lock(self, session_id: str) -> asyncio.Lock:
+        """Lock held while a turn of `session_id` runs (dropped once no turn holds or waits for it)"""
+        lock = self.locks.get(session_id)
+        if lock is None:
+            lock = self.locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def create(self) -> Session:
+        session = Session(uuid.uuid4().hex)
+        await self.save(session)
+        self.created += 1
+        return session
+
+    async def load(self, session_id: str) -> Optional[Session]:
+        """The session, or None if there is no such session or it has expired"""
+        if self.store is None:
+            stored = self.memory.get(session_id)
+            return Session.from_json(stored) if stored is not None else None
+        stored = await asyncio.to_thread(self.store.get, session_id, False)
+        if stored is None:
+            return None
+        session = Session.from_json(stored)
+        if time.time() - session.updated_at > self.ttl_seconds:
+            self.expired += 1
+            await self.delete(session_id)
+            return None
+        return session
+
+    async def save(self, session: Session):
+        """Store the session, restarting its TTL"""
+        session.updated_at = time.time()
+        if self.store is None:
+            # Stored serialized, so a turn that fails halfway leaves the previous state intact
+            self.memory.set(session.session_id, session.to_json())
+        else:
+            await asyncio.to_thread(self.store.set, session.session_id, session.to_json())
+
+    async def delete(self, session_id: str):
+        self.memory.delete(session_id)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.delete, session_id)
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'active': len(self.memory) if self.store is None else len(self.store),
+            'created': self.created,
+            'expired': self.expired,
+            'evicted': self.memory.evictions,
+            'shared': self.store is not None,
+        }
+
+
+class Conversation:
+    """What a session turn brings to the pipeline: the retrieval query, earlier context and the summary being rolled up"""
+    def __init__(self, session: Session, search_query: str, carried: list, covered: bool,
+                 fold_task: Optional[asyncio.Task] = None, fold_count: int = 0):
+        self.session = session
+        self.search_query = search_query
+        self.carried = carried  # segments of the last turn still relevant to this prompt
+        self.covered = covered  # the carried segments contain every keyword of the prompt, so retrieval is skipped
+        self.fold_task = fold_task
+        self.fold_count = fold_count
+        self.history_tokens = 0
+
+    def close(self):
+        if self.fold_task is not None:
+            self.fold_task.cancel()
+
+    def report(self) -> Dict[str, Any]:
+        """Session fields of the turn's response"""
+        return {
+            'session_id': self.session.session_id,
+            'turn': self.session.turn_count + 1,
+            'history_tokens': self.history_tokens,
+            'reused_context_segments': len(self.carried),
+            'summarized_turns': self.session.summarized_turns,
+        }
+
+
+def contextual_query(session: Session, prompt: str, turns: int = SessionConfig.SESSION_QUERY_TURNS) -> str:
+    """Retrieval query for a turn: the prompt, then the most recent earlier prompts"""
+    earlier = [turn['prompt'] for turn in session.turns[-turns:]] if turns > 0 else []
+    return ' '.join([prompt, *reversed(earlier)])
+
+
+def relevant_context(context: List[Dict[str, Any]], keywords: List[str],
+                     min_overlap: float = SessionConfig.SESSION_CONTEXT_MIN_OVERLAP) -> Tuple[List[Dict[str, Any]], bool]:
+    """Kept segments containing at least `min_overlap` of the prompt's keywords, and whether they contain all of them"""
+    if not keywords:
+        return [], False
+    wanted = set(keywords)
+    relevant, found = [], set()
+    for segment in context:
+        present = wanted & set(terms(segment.get('content') or ''))
+        if len(present) >= min_overlap * len(wanted):
+            relevant.append(segment)
+            found |= present
+    return relevant, found == wanted
+
+
+def tail_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """The end of `text` that fits in `max_tokens` (the most recent part of a summary)"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[-max_tokens * 4:] if max_tokens > 0 else ''
+    tokens = encoding.encode(text, disallowed_special=())
+    return encoding.decode(tokens[-max_tokens:]) if max_tokens > 0 else ''
+
+
+def summary_messages(summary: str, turns: List[Dict[str, str]],
+                     max_tokens: int = SessionConfig.SESSION_SUMMARY_TOKENS) -> List[Dict[str, str]]:
+    """Chat messages asking the summary model to fold `turns` into `summary`"""
+    exchanges = '\n\n'.join(f"Resident: {turn['prompt']}\nAssistant: {turn['answer']}" for turn in turns)
+    return [
+        # About three quarters of a word per token
+        {'role': 'system', 'content': SUMMARY_INSTRUCTIONS.format(words=max_tokens * 3 // 4)},
+        {'role': 'user', 'content': f"Current summary:\n{summary or '(none)'}\n\nNew exchanges:\n{exchanges}"},
+    ]
+
+
+def first_sentence(text: str) -> str:
+    return re.split(r'(?<=[.!?])\s', text.strip(), maxsplit=1)[0]
+
+
+def extractive_summary(summary: str, turns: List[Dict[str, str]], model: str,
+                       max_tokens: int = SessionConfig.SESSION_SUMMARY_TOKENS) -> str:
+    """Summary without a model call: each folded prompt with the first sentence of its answer, newest kept"""
+    lines = [summary] if summary else []
+    lines += [f"Asked: {turn['prompt']} Answer: {first_sentence(turn['answer'])}" for turn in turns]
+    return tail_to_tokens('\n'.join(lines), max_tokens, model).strip()
+
+
+def history_messages(session: Session, model: str,
+                     budget: int = SessionConfig.SESSION_HISTORY_TOKEN_BUDGET) -> Tuple[List[Dict[str, str]], int]:
+    """Summary and recent turns as chat messages within `budget` tokens, and the tokens they use
+
+    The newest turns are kept first; an older turn that does not fit whole is cut
+    short (its answer first), and turns before it are left out.
+    """
+    messages, used = [], 0
+    if session.summary:
+        # The summary was bounded when it was rolled up; this only matters if the budget has shrunk since
+        summary = truncate_to_tokens(session.summary, min(SessionConfig.SESSION_SUMMARY_TOKENS, budget // 2), model)
+        messages.append({'role': 'system', 'content': f"{SUMMARY_HEADER}\n{summary}"})
+        used += count_tokens(messages[0]['content'], model)
+
+    recent = []
+    for turn in reversed(session.turns):
+        remaining = budget - used
+        prompt_tokens = count_tokens(turn['prompt'], model)
+        if prompt_tokens >= remaining:
+            break
+        answer = turn['answer']
+        answer_tokens = count_tokens(answer, model)
+        truncated = prompt_tokens + answer_tokens > remaining
+        if truncated:
+            answer = truncate_to_tokens(answer, remaining - prompt_tokens, model)
+            answer_tokens = count_tokens(answer, model)
+        recent[:0] = [{'role': 'user', 'content': turn['prompt']}, {'role': 'assistant', 'content': answer}]
+        used += prompt_tokens + answer_tokens
+        if truncated:
+            break
+    return messages + recent, used
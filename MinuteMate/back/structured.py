@@ -0,0 +1,99 @@
+import json
+import os
+from typing import List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, ValidationError
+
+from moderation import RESPONSE_CHECK_SYSTEM_PROMPT
+from tokenization import count_tokens
+
+
+class StructuredConfig:
+    """Structured generation settings, read from the environment"""
+    # Generate the answer, its safety verdict and citations in one JSON schema completion
+    STRUCTURED_GENERATION = os.getenv('STRUCTURED_GENERATION', 'false').lower() == 'true'
+    # Fraction of structured answers also checked by the separate response check, in the background
+    RESPONSE_AUDIT_RATE = float(os.getenv('RESPONSE_AUDIT_RATE', '0.1'))
+
+
+STRUCTURED_INSTRUCTIONS = """Answer the user's question about the local government's public meetings, using the
+                        context segments where relevant, then judge your own answer.
+
+                        Set `verdict` to 'appropriate', 'inappropriate' or 'ambiguous'.  Information that is accurate
+                        and politically relevant is appropriate, even if it is embarassing to the government or
+                        individuals or includes references to abusive, illegal, or controversial actions or ideas.
+                        Clearly toxic, abusive, or illegal content is inappropriate.  Give the top three to five
+                        concise factors behind the verdict in `verdict_reasons`.
+
+                        List in `cited_chunk_ids` the N of every <ContextSegmentN> the answer relies on."""
+
+RESPONSE_FORMAT = {
+    'type': 'json_schema',
+    'json_schema': {
+        'name': 'answer_with_verdict',
+        'strict': True,
+        'schema': {
+            'type': 'object',
+            'properties': {
+                'answer': {'type': 'string'},
+                'verdict': {'type': 'string', 'enum': ['appropriate', 'inappropriate', 'ambiguous']},
+                'verdict_reasons': {'type': 'string'},
+                'cited_chunk_ids': {'type': 'array', 'items': {'type': 'integer'}},
+            },
+            'required': ['answer', 'verdict', 'verdict_reasons', 'cited_chunk_ids'],
+            'additionalProperties': False,
+        },
+    },
+}
+
+
+class StructuredAnswer(BaseModel):
+    answer: str
+    verdict: Literal['appropriate', 'inappropriate', 'ambiguous']
+    verdict_reasons: str = ''
+    cited_chunk_ids: List[int] = []
+
+
+def parse_structured_answer(content: Optional[str]) -> Optional[StructuredAnswer]:
+    """The completion's JSON as a StructuredAnswer, or None if it does not match the schema"""
+    if not content:
+        return None
+    try:
+        return StructuredAnswer.model_validate_json(content)
+    except ValidationError:
+        return None
+
+
+class ResponseCheckCost:
+    """Running averages of the separate response check, to estimate what a structured completion saves"""
+    def __init__(self, smoothing: float = 0.1, completion_tokens: float = 40):
+        self.smoothing = smoothing
+        self.latency_ms: Optional[float] = None
+        # Assumed until a check has been observed
+        self.completion_tokens = completion_tokens
+        self.samples = 0
+
+    def observe(self, latency_ms: float, completion_tokens: Optional[int] = None):
+        """Fold in one separate response check (run directly or as an audit)"""
+        self.samples += 1
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+        if isinstance(completion_tokens, int):
+            self.completion_tokens += self.smoothing * (completion_tokens - self.completion_tokens)
+
+    def savings(self, answer: str, content: str, model: str) -> Tuple[Optional[float], int]:
+        """Estimated (milliseconds, tokens) saved by not making the separate check for `answer`
+
+        Tokens are the check's prompt and completion less what the structured call spent
+        on top of the plain answer (instructions, schema and the verdict fields).
+        """
+        check_tokens = count_tokens(RESPONSE_CHECK_SYSTEM_PROMPT, model) + count_tokens(answer, model) + self.completion_tokens
+        extra_tokens = (
+            count_tokens(STRUCTURED_INSTRUCTIONS, model)
+            + count_tokens(json.dumps(RESPONSE_FORMAT['json_schema']['schema']), model)
+            + count_tokens(content, model) - count_tokens(answer, model)
+        )
+        latency_ms = round(self.latency_ms, 1) if self.latency_ms is not None else None
+        return latency_ms, int(round(check_tokens - extra_tokens))
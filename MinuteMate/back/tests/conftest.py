@@ -1,25 +1,65 @@
+import os
+from typing import Generator
+from unittest.mock import Mock, patch
+
 import pytest
 from fastapi.testclient import TestClient
-from unittest.mock import Mock, patch
-from typing import Generator
 
-from app.main import app  # Adjust import path as needed
+import main
+from benchmarks.stubs import StubAsyncOpenAI, StubAsyncWeaviate
+
+TEST_ENV = {
+    'OPENAI_API_KEY': 'test-openai-key',
+    'WEAVIATE_ENDPOINT_URL': 'test-weaviate-url',
+    'WEAVIATE_API_KEY': 'test-weaviate-key'
+}
+
+
+@pytest.fixture
+def test_env():
+    with patch.dict(os.environ, TEST_ENV):
+        yield
+
+
+@pytest.fixture
+def openai_client():
+    """OpenAI client of the `processor` fixture; override it in a module, or parametrize it, for other stand-ins"""
+    return Mock()
+
+
+@pytest.fixture
+def weaviate_client():
+    """Weaviate client of the `processor` fixture; override it in a module, or parametrize it, for other stand-ins"""
+    return Mock()
+
 
 @pytest.fixture
-def test_client() -> Generator:
-    with TestClient(app) as client:
+def processor(test_env, openai_client, weaviate_client) -> main.PromptProcessor:
+    """A PromptProcessor on the `openai_client` and `weaviate_client` fixtures (a module can extend it under the same name)"""
+    return main.PromptProcessor(openai_client=openai_client, weaviate_client=weaviate_client)
+
+
+@pytest.fixture
+def test_client(test_env) -> Generator:
+    """The app with its processor wired to in-process OpenAI and Weaviate stand-ins"""
+    processor = main.PromptProcessor(
+        openai_client=StubAsyncOpenAI(latency=0), weaviate_client=StubAsyncWeaviate(latency=0)
+    )
+    with patch.object(main, 'processor', processor), TestClient(main.app) as client:
         yield client
 
+
 @pytest.fixture
-def mock_weaviate_client():
-    with patch('weaviate.connect_to_weaviate_cloud') as mock:
+def mock_weaviate_client(test_env):
+    with patch('weaviate.use_async_with_weaviate_cloud') as mock:
         mock_client = Mock()
         mock.return_value = mock_client
         yield mock_client
 
+
 @pytest.fixture
 def mock_openai_client():
-    with patch('openai.OpenAI') as mock:
+    with patch('openai.AsyncOpenAI') as mock:
         mock_client = Mock()
         mock.return_value = mock_client
-        yield mock_client
\ No newline at end of file
+        yield mock_client
@@ -1,6 +1,7 @@
+from unittest.mock import patch
+
 import pytest
-from fastapi.testclient import TestClient
-from app.main import app  # Adjust import path
+
 
 def test_process_prompt_valid_request(test_client):
     response = test_client.post(
@@ -22,4 +23,19 @@ def test_process_prompt_long_text(test_client):
         "/process-prompt",
         json={"user_prompt_text": "a" * 1001}
     )
-    assert response.status_code == 422
\ No newline at end of file
+    assert response.status_code == 422
+
+@pytest.mark.parametrize('path, body', [('/cache/invalidate', None), ('/keywords/corpus', {'rebuild': True})])
+def test_admin_endpoints_require_a_configured_token(test_client, path, body):
+    with patch.dict('os.environ', {'CACHE_ADMIN_TOKEN': ''}):
+        assert test_client.post(path, json=body).status_code == 403
+        assert test_client.post(path, json=body, headers={'X-Admin-Token': ''}).status_code == 403
+    with patch.dict('os.environ', {'CACHE_ADMIN_TOKEN': 'admin-secret'}):
+        assert test_client.post(path, json=body).status_code == 403
+        assert test_client.post(path, json=body, headers={'X-Admin-Token': 'guess'}).status_code == 403
+
+
+def test_cache_invalidation_with_the_admin_token(test_client):
+    with patch.dict('os.environ', {'CACHE_ADMIN_TOKEN': 'admin-secret'}):
+        response = test_client.post('/cache/invalidate', headers={'X-Admin-Token': 'admin-secret'})
+    assert response.status_code == 200 and response.json() == {'generation': 1}
@@ -0,0 +1,118 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from cache import AnswerCache, LRUCache, SQLiteStore, normalize_prompt, off_loop
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("  List the   Agenda from 7/16/2024?\n") == "list the agenda from 7/16/2024"
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_lru_cache_expires_entries():
+    cache = LRUCache(max_size=2, ttl_seconds=10)
+    with patch('cache.time.monotonic', return_value=100.0):
+        cache.set('a', 1)
+    with patch('cache.time.monotonic', return_value=111.0):
+        assert cache.get('a') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_semantic_tier_respects_threshold():
+    cache = AnswerCache(exact_size=4, semantic_size=4, ttl_seconds=None, semantic_threshold=0.9)
+    cache.put(('', 'budget meetings in 2023'), 'answer', embedding=[1.0, 0.0])
+
+    assert cache.get_semantic('', [0.99, 0.05]) == 'answer'
+    assert cache.get_semantic('', [0.0, 1.0]) is None
+    assert cache.get_semantic('other-options', [1.0, 0.0]) is None
+
+
+def test_invalidate_drops_answers_and_stale_writes():
+    cache = AnswerCache(exact_size=4, semantic_size=4, ttl_seconds=None)
+    generation = cache.generation
+    cache.put(('', 'prompt'), 'answer', embedding=[1.0, 0.0], generation=generation)
+    cache.invalidate()
+
+    assert cache.get_exact(('', 'prompt')) is None
+    cache.put(('', 'prompt'), 'stale answer', generation=generation)
+    assert cache.get_exact(('', 'prompt')) is None
+
+
+def test_answers_and_invalidations_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'answers.sqlite')
+    worker_a = AnswerCache(exact_size=4, semantic_size=4, ttl_seconds=None, path=path)
+    worker_b = AnswerCache(exact_size=4, semantic_size=4, ttl_seconds=None, path=path, generation_ttl=0)
+    generation = worker_b.generation
+
+    worker_a.put(('', 'prompt'), {'answer': 'shared'})
+    assert worker_b.get_exact(('', 'prompt')) == {'answer': 'shared'}
+    assert worker_b.stats()['store_hits'] == 1
+
+    worker_a.invalidate()
+    assert worker_b.get_exact(('', 'prompt')) is None
+    assert worker_b.generation == worker_a.generation == generation + 1
+    worker_b.put(('', 'prompt'), {'answer': 'stale'}, generation=generation)
+    assert worker_a.get_exact(('', 'prompt')) is None
+
+
+def test_shared_generation_is_reread_only_after_its_ttl(tmp_path):
+    path = str(tmp_path / 'answers.sqlite')
+    worker_a = AnswerCache(exact_size=4, semantic_size=4, ttl_seconds=None, path=path)
+    worker_b = AnswerCache(exact_size=4, semantic_size=4, ttl_seconds=None, path=path, generation_ttl=60)
+    generation = worker_b.generation
+
+    worker_a.invalidate()
+    with patch.object(worker_b.meta, 'get', wraps=worker_b.meta.get) as meta_get:
+        assert worker_b.generation == generation
+        meta_get.assert_not_called()
+    with patch('cache.time.monotonic', return_value=time.monotonic() + 61):
+        assert worker_b.generation == generation + 1
+
+
+def test_sqlite_store_writes_touches_in_batches(tmp_path):
+    path = str(tmp_path / 'store.sqlite')
+    store = SQLiteStore(path, 'answers')
+    store.set('a', '1')
+    reader = sqlite3.connect(path)
+    last_used = reader.execute('SELECT last_used FROM answers').fetchone()[0]
+
+    for _ in range(SQLiteStore.TOUCH_BATCH - 1):
+        assert store.get('a') == '1'
+    assert reader.execute('SELECT last_used FROM answers').fetchone()[0] == last_used
+    store.set('b', '2')
+    assert reader.execute("SELECT last_used FROM answers WHERE key = 'a'").fetchone()[0] > last_used
+    reader.close()
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_shared_store_lookups_run_off_the_event_loop(tmp_path):
+    cache = AnswerCache(exact_size=4, semantic_size=4, ttl_seconds=None, path=str(tmp_path / 'answers.sqlite'))
+    threads = []
+
+    def get_exact(key):
+        threads.append(threading.current_thread())
+        return cache.get_exact(key)
+
+    await off_loop(cache.store, cache.put, ('', 'prompt'), 'answer')
+    assert await off_loop(cache.store, get_exact, ('', 'prompt')) == 'answer'
+    assert await off_loop(None, get_exact, ('', 'prompt')) == 'answer'
+    assert threads[0] is not threading.main_thread() and threads[1] is threading.main_thread()
+    await asyncio.to_thread(cache.close)
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from clients import CountingTransport, InFlightCounter, WeaviatePool
+
+
+class FakeWeaviate:
+    """Async Weaviate stand-in whose readiness and query failures are controlled by the test"""
+    def __init__(self, name: str):
+        self.name = name
+        self.ready = True
+        self.connected = False
+        self.closed = False
+        self.release = asyncio.Event()
+        self.release.set()
+        query = SimpleNamespace(bm25=self.bm25)
+        self.collections = SimpleNamespace(get=lambda collection: SimpleNamespace(query=query))
+
+    async def bm25(self, **kwargs):
+        await self.release.wait()
+        if not self.ready:
+            raise ConnectionError('channel closed')
+        return self.name
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    async def connect(self):
+        self.connected = True
+
+    async def is_ready(self) -> bool:
+        return self.ready
+
+    async def close(self):
+        self.closed = True
+
+
+def make_pool(size: int):
+    created = []
+
+    def factory():
+        created.append(FakeWeaviate(f'client-{len(created)}'))
+        return created[-1]
+    return WeaviatePool(factory, size), created
+
+
+@pytest.mark.asyncio
+async def test_queries_go_to_the_least_busy_member():
+    pool, created = make_pool(2)
+    await pool.connect()
+    created[0].release.clear()
+
+    first = asyncio.create_task(pool.collections.get('MeetingDocument').query.bm25(query='budget'))
+    await asyncio.sleep(0)
+    second = await pool.collections.get('MeetingDocument').query.bm25(query='budget')
+    created[0].release.set()
+
+    assert (await first, second) == ('client-0', 'client-1')
+    assert pool.stats()['requests'] == 2
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_query_triggers_reconnect():
+    pool, created = make_pool(1)
+    await pool.connect()
+    created[0].ready = False
+
+    with pytest.raises(ConnectionError):
+        await pool.collections.get('MeetingDocument').query.bm25(query='budget')
+    for _ in range(20):
+        if pool.reconnects:
+            break
+        await asyncio.sleep(0.01)
+
+    assert pool.reconnects == 1 and created[0].closed
+    assert await pool.collections.get('MeetingDocument').query.bm25(query='budget') == 'client-1'
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_in_flight_queries():
+    pool, created = make_pool(1)
+    await pool.connect()
+    created[0].release.clear()
+    query = asyncio.create_task(pool.collections.get('MeetingDocument').query.bm25(query='budget'))
+    await asyncio.sleep(0)
+
+    assert await pool.drain(timeout=0.1) == 1
+    created[0].release.set()
+    assert await pool.drain(timeout=1) == 0
+    await query
+    await pool.close()
+
+
+class StreamedBody(httpx.AsyncByteStream):
+    async def __aiter__(self):
+        yield b'data'
+
+
+@pytest.mark.asyncio
+async def test_streamed_response_holds_its_slot_until_closed():
+    counter = InFlightCounter(limit=4)
+    upstream = httpx.MockTransport(lambda request: httpx.Response(200, stream=StreamedBody()))
+    transport = CountingTransport(upstream, counter)
+
+    async with httpx.AsyncClient(transport=transport) as client:
+        async with client.stream('GET', 'http://upstream/stream') as response:
+            assert counter.stats()['in_flight'] == 1
+            await response.aread()
+        assert counter.stats() == {'in_flight': 0, 'peak_in_flight': 1, 'requests': 1, 'failures': 0,
+                                   'limit': 4, 'utilization': 0.0}
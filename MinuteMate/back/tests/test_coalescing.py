@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from benchmarks.stubs import StubAsyncOpenAI, StubAsyncWeaviate
+from coalescing import SingleFlight
+from main import PromptRequest
+
+
+@pytest.fixture
+def openai_client():
+    return StubAsyncOpenAI(latency=0.05)
+
+
+@pytest.fixture
+def weaviate_client():
+    return StubAsyncWeaviate(latency=0.05)
+
+
+@pytest.mark.asyncio
+async def test_identical_concurrent_prompts_share_one_run(processor):
+    requests = [PromptRequest(user_prompt_text=text) for text in ['Budget vote?'] * 4 + ['  budget VOTE? ']]
+    requests.append(PromptRequest(user_prompt_text='Budget vote?', search_type='hybrid'))
+
+    responses = await asyncio.gather(*(processor.process_prompt(request) for request in requests))
+
+    assert [response.coalesced for response in responses] == [False, True, True, True, True, False]
+    assert len({response.generated_response for response in responses}) == 1
+    assert 'coalesced_wait' in responses[1].stage_timings_ms
+    assert processor.flights.stats() == {'in_flight': 0, 'started': 2, 'joined': 4}
+    # Each joined request saved the prompt check, search, generation and response check of the run it joined
+    assert processor.upstream_calls_saved >= 4 * 4
+
+
+@pytest.mark.asyncio
+async def test_every_caller_gets_the_exception_and_the_key_is_released(processor):
+    calls = []
+
+    async def failing(prompt_request):
+        calls.append(prompt_request)
+        await asyncio.sleep(0.05)
+        raise RuntimeError('pipeline failed')
+
+    processor.answer_or_reuse = failing
+    request = PromptRequest(user_prompt_text='Budget vote?')
+
+    results = await asyncio.gather(*(processor.process_prompt(request) for _ in range(3)), return_exceptions=True)
+
+    assert [type(result) for result in results] == [RuntimeError] * 3
+    assert len(calls) == 1 and not processor.flights.flights
+    with pytest.raises(RuntimeError):
+        await processor.process_prompt(request)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_caller_leaving_does_not_cancel_the_shared_run():
+    flights = SingleFlight()
+    finished = asyncio.Event()
+
+    async def work():
+        await asyncio.sleep(0.05)
+        finished.set()
+        return 'result'
+
+    async def call():
+        task, _ = flights.flight('key', work)
+        return await asyncio.shield(task)
+
+    leader = asyncio.create_task(call())
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(call())
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await follower == 'result' and finished.is_set()
@@ -1,27 +1,27 @@
 import pytest
 import os
 from unittest.mock import patch
-from app.main import WeaviateConfig, PromptProcessor  # Adjust import path
+from main import WeaviateConfig, PromptProcessor
 
 def test_weaviate_config_initialization():
     test_url = "https://test-url"
     test_api_key = "test-key"
     
-    with patch('weaviate.connect_to_weaviate_cloud') as mock_connect:
+    with patch('weaviate.use_async_with_weaviate_cloud') as mock_connect:
         WeaviateConfig.get_weaviate_client(test_url, test_api_key)
         mock_connect.assert_called_once()
 
-def test_prompt_processor_env_vars():
+def test_prompt_processor_env_vars(mock_weaviate_client, mock_openai_client):
     test_env_vars = {
         'OPENAI_API_KEY': 'test-openai-key',
-        'WEAVIATE_URL': 'test-weaviate-url',
+        'WEAVIATE_ENDPOINT_URL': 'test-weaviate-url',
         'WEAVIATE_API_KEY': 'test-weaviate-key'
     }
     
     with patch.dict(os.environ, test_env_vars):
         processor = PromptProcessor()
         assert processor.OPENAI_API_KEY == 'test-openai-key'
-        assert processor.WEAVIATE_URL == 'test-weaviate-url'
+        assert processor.WEAVIATE_ENDPOINT_URL == 'test-weaviate-url'
         assert processor.WEAVIATE_API_KEY == 'test-weaviate-key'
 
 def test_prompt_processor_missing_env_vars():
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from main import ContextSegment
+from context_packing import pack_context, remove_overlap
+from tokenization import count_tokens, get_encoding
+
+SHARED = 'The Board of Commissioners voted 5-0 to approve text amendment TA23-02 for mobile food vendors. '
+
+
+def segment(chunk_id, content, score=None):
+    return ContextSegment(chunk_id=chunk_id, content=content, score=score)
+
+
+def test_orders_by_score_and_drops_low_scores():
+    packed, _ = pack_context(
+        [segment(1, 'low value text', 0.1), segment(2, 'best match text', 0.9), segment(3, 'good match text', 0.6)],
+        model='gpt-4o', budget=1000, min_score_ratio=0.2
+    )
+    assert [seg.chunk_id for seg in packed] == [2, 3]
+
+
+def test_drops_duplicates_and_overlapping_spans():
+    packed, _ = pack_context(
+        [
+            segment(1, SHARED + 'Public comment followed.'),
+            segment(2, SHARED + 'Public comment followed.'),
+            segment(3, 'Earlier that evening the agenda was adopted. ' + SHARED),
+        ],
+        model='gpt-4o', budget=1000
+    )
+    assert [seg.chunk_id for seg in packed] == [1, 3]
+    assert packed[1].content == 'Earlier that evening the agenda was adopted.'
+
+
+def test_fits_budget_by_truncating_the_last_segment():
+    packed, tokens = pack_context(
+        [segment(1, 'minutes ' * 100), segment(2, 'agenda ' * 400)],
+        model='gpt-4o', budget=250, min_segment_tokens=10
+    )
+    assert tokens <= 250
+    assert len(packed) == 2
+    assert len(packed[1].content) < len('agenda ' * 400)
+
+
+def test_remove_overlap_ignores_short_matches():
+    assert remove_overlap('The board met.', ['The board adjourned.'], min_overlap_chars=80) == 'The board met.'
+
+
+def test_failed_encoding_load_is_not_retried():
+    get_encoding.cache_clear()
+    try:
+        with patch('tiktoken.encoding_for_model', side_effect=OSError('offline')) as load:
+            counts = [count_tokens('twelve chars', model='offline-model') for _ in range(3)]
+    finally:
+        get_encoding.cache_clear()
+
+    assert counts == [3, 3, 3]
+    assert load.call_count == 1
@@ -0,0 +1,96 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import pytest
+import weaviate.classes.query  # noqa: F401 (main imports it on first search; keep that out of the timings)
+
+from benchmarks.stubs import StubAsyncWeaviate
+from deadlines import DeadlineConfig, current_deadline
+from main import PromptRequest
+
+
+@pytest.fixture
+def weaviate_client():
+    return StubAsyncWeaviate(latency=0.01)
+
+
+@pytest.fixture
+def processor(processor):
+    processor.check_prompt = AsyncMock(return_value='appropriate civic question')
+    processor.generate_response = AsyncMock(return_value='answer')
+    processor.check_response = AsyncMock(return_value='appropriate')
+    yield processor
+
+
+@pytest.mark.asyncio
+async def test_slow_embedding_falls_back_to_bm25(processor):
+    async def slow_embedding(text):
+        await asyncio.sleep(1)
+        return [1.0, 0.0]
+
+    processor.embed_query = slow_embedding
+    with patch.object(DeadlineConfig, 'EMBED_QUERY_TIMEOUT_MS', 50):
+        response = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote', search_type='vector'))
+
+    assert response.generated_response == 'answer'
+    assert (response.error_code, response.degraded) == (1, ['search'])
+    assert response.keywords == ['budget', 'vote']
+    assert response.stage_timings_ms['total'] < 500
+
+
+@pytest.mark.asyncio
+async def test_tight_deadline_uses_fallback_model_and_is_not_cached(processor):
+    request = PromptRequest(user_prompt_text='Budget vote', deadline_ms=1000)
+
+    first = await processor.process_prompt(request)
+    second = await processor.process_prompt(request)
+
+    assert (first.error_code, first.degraded) == (6, ['context', 'model'])
+    assert processor.generate_response.await_args.kwargs['model'] == DeadlineConfig.FALLBACK_GENERATION_MODEL
+    assert second.cache is None
+
+
+@pytest.mark.asyncio
+async def test_overrun_returns_deadline_exceeded(processor):
+    async def hung_check(text):
+        await asyncio.sleep(10)
+
+    processor.check_response = hung_check
+    response = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote', deadline_ms=300))
+
+    assert response.error_code == 504
+    assert response.stage_timings_ms['total'] < 400
+
+
+@pytest.mark.asyncio
+async def test_prompt_check_timeout_or_failure_refuses_the_prompt(processor):
+    async def slow_verdict(**request):
+        await asyncio.sleep(10)
+
+    del processor.check_prompt
+    processor.openai_client.chat.completions.create = slow_verdict
+    timed_out = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote', deadline_ms=1000))
+
+    processor.openai_client.chat.completions.create = AsyncMock(side_effect=RuntimeError('moderation down'))
+    failed = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote'))
+
+    assert timed_out.generated_response == failed.generated_response == 'inappropriate prompt detected'
+    assert timed_out.degraded == ['check'] and timed_out.stage_timings_ms['total'] < 900
+    processor.generate_response.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_stream_under_a_tight_deadline_uses_fallback_model(processor):
+    models = []
+
+    async def stream(prompt, context_segments, model=None, history=None):
+        models.append(model)
+        yield 'answer'
+
+    processor.generate_response_stream = stream
+    events = [event async for event in processor.process_prompt_stream(PromptRequest(user_prompt_text='Budget vote', deadline_ms=1000))]
+
+    name, done = events[-1]
+    assert name == 'done' and (done['error_code'], done['degraded']) == (6, ['context', 'model'])
+    assert models == [DeadlineConfig.FALLBACK_GENERATION_MODEL]
+    assert current_deadline() is None
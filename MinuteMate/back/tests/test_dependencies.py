@@ -1,22 +1,25 @@
 import pytest
-from app.main import PromptProcessor, PromptRequest  # Adjust import path
+from unittest.mock import AsyncMock, Mock
+from keywords import KeywordConfig
+from main import PromptProcessor
 
 def test_extract_keywords(mock_weaviate_client):
     processor = PromptProcessor()
     text = "This is a test meeting about project planning and team coordination"
     keywords = processor.extract_keywords(text)
     assert isinstance(keywords, list)
-    assert len(keywords) <= 3
+    assert len(keywords) <= KeywordConfig.KEYWORD_COUNT
 
-def test_search_weaviate(mock_weaviate_client):
+@pytest.mark.asyncio
+async def test_search_weaviate(mock_weaviate_client):
     processor = PromptProcessor()
     
     # Mock the collection query response
     mock_result = Mock()
     mock_result.objects = []
-    mock_weaviate_client.collections.get().query.bm25.return_value = mock_result
+    mock_weaviate_client.collections.get().query.bm25 = AsyncMock(return_value=mock_result)
     
-    context_segments, keywords = processor.search_weaviate("test query")
+    context_segments, keywords = await processor.search_weaviate("test query")
     assert isinstance(context_segments, list)
     assert isinstance(keywords, list)
 
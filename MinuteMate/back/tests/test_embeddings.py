@@ -0,0 +1,37 @@
+import numpy as np
+
+from embeddings import EmbeddingCache, MemmapEmbeddingStore
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    first = EmbeddingCache(model='test-model', max_size=4, directory=str(tmp_path), dtype='float16')
+    first.set('budget meetings', [0.5, -0.25, 1.0])
+    first.close()
+
+    second = EmbeddingCache(model='test-model', max_size=4, directory=str(tmp_path), dtype='float16')
+    assert second.get('budget meetings') == [0.5, -0.25, 1.0]
+    assert second.stats()['disk_hits'] == 1
+    assert second.get('other prompt') is None
+    second.close()
+
+
+def test_disk_tier_is_keyed_by_model(tmp_path):
+    cache = EmbeddingCache(model='model-a', max_size=4, directory=str(tmp_path))
+    cache.set('prompt', [1.0, 0.0])
+    other = EmbeddingCache(model='model-b', max_size=4, directory=str(tmp_path))
+
+    assert other.get('prompt') is None
+    cache.close()
+    other.close()
+
+
+def test_memmap_store_overwrites_oldest_row_when_full(tmp_path):
+    store = MemmapEmbeddingStore(str(tmp_path), 'test-model', dtype='float32', capacity=2)
+    store.set('a', [1.0, 0.0])
+    store.set('b', [0.0, 1.0])
+    store.set('c', [1.0, 1.0])
+
+    assert store.get('a') is None
+    np.testing.assert_array_equal(store.get('c'), [1.0, 1.0])
+    assert len(store) == 2
+    store.close()
@@ -0,0 +1,71 @@
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+
+from keywords import CorpusStats, KeywordConfig, KeywordExtractor
+from main import CorpusUpdate, PromptProcessor
+
+CHUNKS = [
+    'The Board of Commissioners meeting opened with the pledge.',
+    'The Board meeting approved TA23-02 Mobile Food Vendors 5-0.',
+    'At the Board meeting the 74 Auto Group rezoning was continued.',
+    'Board meeting minutes from March were approved.',
+    'Staff updates: the Board meeting heard the parks report.',
+]
+
+
+def test_common_and_unseen_terms_are_dropped():
+    stats = CorpusStats()
+    stats.add(CHUNKS)
+    extractor = KeywordExtractor(stats, max_keywords=3, max_df=0.5)
+
+    keywords = extractor.extract('What did the board meeting decide about mobile food vendors and zucchini?')
+
+    assert set(keywords) == {'mobile', 'food', 'vendors'}
+
+
+def test_extractor_without_stats_keeps_prompt_terms():
+    extractor = KeywordExtractor(CorpusStats(), max_keywords=2)
+
+    assert extractor.extract('Summarize the rezoning vote') == ['rezoning', 'vote']
+
+
+def test_remove_undoes_add_and_snapshot_round_trips(tmp_path):
+    stats = CorpusStats()
+    stats.add(CHUNKS)
+    stats.add(['A replaced rezoning chunk.'])
+    stats.remove(['A replaced rezoning chunk.'])
+    path = str(tmp_path / 'stats.json')
+    stats.save(path)
+
+    loaded = CorpusStats.load(path)
+
+    assert loaded.lookup(['board', 'rezoning', 'replaced']) == (5, {'board': 5, 'rezoning': 1, 'replaced': 0})
+    assert CorpusStats.load(str(tmp_path / 'missing.json')).summary() == {'documents': 0, 'terms': 0}
+
+
+def test_concurrent_updates_are_counted_once():
+    stats = CorpusStats()
+    threads = [threading.Thread(target=stats.add, args=(CHUNKS,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats.lookup(['board']) == (40, {'board': 40})
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_snapshot_keep_and_reload_each_others_updates(tmp_path, test_env):
+    with patch.object(KeywordConfig, 'KEYWORD_STATS_PATH', str(tmp_path / 'keyword_stats.json')):
+        worker_a, worker_b = [PromptProcessor(openai_client=Mock(), weaviate_client=Mock()) for _ in range(2)]
+
+        await worker_a.update_keyword_stats(CorpusUpdate(added=CHUNKS[:3]))
+        # Worker B has never seen A's update; it still applies its own on top of it
+        await worker_b.update_keyword_stats(CorpusUpdate(added=CHUNKS[3:]))
+
+        assert worker_a.keyword_extractor.stats.lookup(['board']) == (3, {'board': 3})
+        assert worker_a.reload_keyword_stats() and not worker_a.reload_keyword_stats()
+        assert worker_a.keyword_extractor.stats.lookup(['board']) == (5, {'board': 5})
+        assert worker_b.keyword_extractor.stats.lookup(['board']) == (5, {'board': 5})
@@ -0,0 +1,129 @@
+import asyncio
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+import pytest
+
+from benchmarks.load_test import arrival_offsets, free_port, local_backend, summarize
+from benchmarks.stub_servers import Latency, StubServers, WeaviateSearchService, create_openai_app, load_corpus
+from main import WeaviateConfig
+from moderation import SYSTEM_PROMPTS
+
+
+def record(sent, finished, status=200, **body):
+    return {'sent': sent, 'finished': finished, 'lag': 0.001, 'status': status, 'body': body}
+
+
+def test_summary_reports_percentiles_throughput_and_stages():
+    records = [record(i * 0.1, i * 0.1 + 0.2, stage_timings_ms={'search': 50.0 + i, 'total': 200.0}) for i in range(10)]
+    records.append(record(1.0, 1.1, status=503))
+
+    report = summarize(records, qps=10)
+
+    assert report['requests'] == 11 and report['errors'] == 1
+    assert report['status_codes'] == {'200': 10, '503': 1}
+    assert report['latency_ms']['count'] == 10 and report['latency_ms']['p50'] == pytest.approx(200, abs=0.1)
+    assert report['throughput_rps'] == pytest.approx(10 / 1.1, abs=0.01)
+    assert report['stages_ms']['search']['p99'] == pytest.approx(58.9, abs=0.1)
+    assert arrival_offsets(4, 3, poisson=False) == [0, 0.25, 0.5]
+
+
+@pytest.mark.asyncio
+async def test_openai_stand_in_serves_the_openai_client():
+    from openai import AsyncOpenAI
+
+    app = create_openai_app(Latency(0), Latency(0), completion_tokens=5)
+    client = AsyncOpenAI(api_key='stub', base_url='http://stub/v1',
+                         http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)))
+
+    embeddings = await client.embeddings.create(model='text-embedding-3-small', input=['budget', 'budget', 'zoning'])
+    vectors = np.array([item.embedding for item in embeddings.data])
+    verdict = await client.chat.completions.create(model='gpt-4o', messages=[
+        {'role': 'system', 'content': SYSTEM_PROMPTS['prompt']}, {'role': 'user', 'content': 'Budget vote'}
+    ])
+    stream = await client.chat.completions.create(model='gpt-4o', messages=[], stream=True)
+
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1, atol=1e-5)
+    assert vectors[0] @ vectors[1] == pytest.approx(1) and abs(vectors[0] @ vectors[2]) < 0.2
+    assert verdict.choices[0].message.content.startswith('appropriate ')
+    assert len(''.join([chunk.choices[0].delta.content async for chunk in stream]).split()) == 5
+
+
+async def collection_items(collection):
+    return [item async for item in collection.iterator()]
+
+
+def test_weaviate_cursor_pages_end_after_the_last_id():
+    service = WeaviateSearchService(Latency(0), load_corpus(size=5))
+
+    def page(after):
+        return service.pick(SimpleNamespace(limit=2, after=after, HasField=lambda name: False))
+
+    assert page('') == page('00000000-0000-0000-0000-000000000000') == [0, 1]
+    assert page(service.ids[1]) == [2, 3]
+    assert page(service.ids[4]) == [] and page('ffffffff-ffff-ffff-ffff-ffffffffffff') == []
+
+
+@pytest.mark.asyncio
+async def test_weaviate_stand_in_serves_the_weaviate_client():
+    servers = StubServers(openai_port=free_port(), weaviate_port=free_port(), grpc_port=free_port(),
+                          search_latency=0, corpus_size=250)
+    await servers.start()
+    env = servers.env()
+    try:
+        with patch.object(WeaviateConfig, 'WEAVIATE_GRPC_ENDPOINT_URL', env['WEAVIATE_GRPC_ENDPOINT_URL']):
+            # No PyPI version check, so the test runs offline
+            client = WeaviateConfig.get_weaviate_client(
+                env['WEAVIATE_ENDPOINT_URL'], env['WEAVIATE_API_KEY'], skip_init_checks=True
+            )
+        await client.connect()
+        collection = client.collections.get('MeetingDocument')
+
+        results = await collection.query.bm25(query='zoning', limit=4, return_properties=['content', 'chunk_index'])
+        # The client pages 100 objects at a time, until a page comes back empty
+        chunks = await asyncio.wait_for(collection_items(collection), 10)
+
+        assert len(results.objects) == 4
+        assert set(results.objects[0].properties) == {'content', 'chunk_index'}
+        assert len(chunks) == 250 and len({item.uuid for item in chunks}) == 250
+        assert (await collection.aggregate.over_all(total_count=True)).total_count == 250
+        await client.close()
+    finally:
+        await servers.stop()
+
+
+class FakeProcess:
+    """Popen stand-in: the stand-in servers 'start' by writing their ready file"""
+    started = []
+
+    def __init__(self, command, env=None, **kwargs):
+        self.command, self.env = command, env
+        if '--ready-file' in command:
+            with open(command[command.index('--ready-file') + 1], 'w') as f:
+                f.write('{"OPENAI_BASE_URL": "http://127.0.0.1:1/v1"}')
+        FakeProcess.started.append(self)
+
+    def poll(self):
+        return None
+
+    def terminate(self):
+        pass
+
+    def wait(self, timeout=None):
+        return 0
+
+
+def test_local_backend_writes_nothing_outside_its_run_directory():
+    args = SimpleNamespace(llm_latency=0, embedding_latency=0, search_latency=0, jitter=0, completion_tokens=5, workers=0)
+    with patch('benchmarks.load_test.subprocess.Popen', FakeProcess), patch('benchmarks.load_test.ready', return_value=True):
+        with local_backend(args, log=None):
+            env = FakeProcess.started[-1].env
+            run_directory = os.path.dirname(env['KEYWORD_STATS_PATH'])
+
+    assert env['OPENAI_BASE_URL'] == 'http://127.0.0.1:1/v1'
+    for name in ('SHARED_CACHE_DIR', 'KEYWORD_STATS_PATH', 'LOCAL_VECTOR_INDEX_DIR'):
+        assert os.path.dirname(env[name]) == run_directory != os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert not os.path.exists(run_directory)
@@ -0,0 +1,100 @@
+import math
+import os
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from benchmarks.stubs import StubAsyncOpenAI, StubAsyncWeaviate
+from metrics import Counter, Gauge, Histogram, Metric, format_value, resolve_trace_id
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram('test_seconds', 'Test durations', ['stage'], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage='search')
+    histogram.observe(0.5, stage='search')
+    histogram.observe(5, stage='search')
+
+    assert histogram.render().splitlines() == [
+        '# HELP test_seconds Test durations',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{stage="search",le="0.1"} 1',
+        'test_seconds_bucket{stage="search",le="1"} 2',
+        'test_seconds_bucket{stage="search",le="+Inf"} 3',
+        'test_seconds_sum{stage="search"} 5.55',
+        'test_seconds_count{stage="search"} 3',
+    ]
+
+
+def test_counter_escapes_label_values():
+    counter = Counter('test_total', 'Test counter', ['model'])
+    counter.inc(2, model='say "hi"\n')
+
+    assert counter.render().splitlines()[-1] == 'test_total{model="say \\"hi\\"\\n"} 2'
+
+
+def test_label_values_escape_backslashes_before_quotes_in_every_sample():
+    histogram = Histogram('test_seconds', 'Test durations', ['path'], buckets=(1.0,))
+    histogram.observe(0.5, path=r'C:\tmp\"x"')
+
+    lines = histogram.render().splitlines()[2:]
+    assert lines[0] == r'test_seconds_bucket{path="C:\\tmp\\\"x\"",le="1"} 1'
+    assert all(r'path="C:\\tmp\\\"x\""' in line for line in lines)
+
+
+def test_inf_bucket_counts_every_observation():
+    histogram = Histogram('test_seconds', 'Test durations', buckets=(1.0, 0.1))
+    for value in (0.1, 1.0, 1.5, math.inf):
+        histogram.observe(value)
+    bucketless = Histogram('test_bucketless_seconds', 'Test durations', buckets=())
+    bucketless.observe(3)
+
+    assert histogram.render().splitlines()[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 4',
+        'test_seconds_sum +Inf',
+        'test_seconds_count 4',
+    ]
+    assert bucketless.render().splitlines()[2] == 'test_bucketless_seconds_bucket{le="+Inf"} 1'
+
+
+def test_special_values_use_the_exposition_spelling():
+    gauge = Gauge('test_ratio', 'Test gauge', ['kind'])
+    gauge.set(-math.inf, kind='low')
+    gauge.set(math.nan, kind='unknown')
+
+    assert [format_value(value) for value in (math.inf, -math.inf, math.nan, 2.0, 0.25)] == ['+Inf', '-Inf', 'NaN', '2', '0.25']
+    assert gauge.render().splitlines()[2:] == ['test_ratio{kind="low"} -Inf', 'test_ratio{kind="unknown"} NaN']
+
+
+def test_metric_families_must_define_their_samples():
+    with pytest.raises(TypeError):
+        Metric('test_untyped', 'No samples')
+
+
+def test_trace_ids_are_reused_only_when_well_formed():
+    assert resolve_trace_id('abc-123') == 'abc-123'
+    assert resolve_trace_id('bad id\n') != 'bad id\n'
+    assert len(resolve_trace_id(None)) == 32
+
+
+def test_prompt_metrics_and_trace_header(monkeypatch):
+    env = {'OPENAI_API_KEY': 'test', 'WEAVIATE_ENDPOINT_URL': 'test', 'WEAVIATE_API_KEY': 'test'}
+    with patch.dict(os.environ, env):
+        processor = main.PromptProcessor(openai_client=StubAsyncOpenAI(0), weaviate_client=StubAsyncWeaviate(0))
+    monkeypatch.setattr(main, 'processor', processor)
+    client = TestClient(main.app)
+
+    response = client.post('/process-prompt', json={'user_prompt_text': 'Budget vote'}, headers={'X-Trace-Id': 'trace-1'})
+    client.post('/process-prompt', json={'user_prompt_text': 'Budget vote'})
+    metrics = client.get('/metrics')
+
+    assert response.headers['X-Trace-Id'] == 'trace-1'
+    assert metrics.headers['content-type'].startswith('text/plain; version=0.0.4')
+    lines = metrics.text.splitlines()
+    assert 'minutemate_stage_duration_seconds_count{stage="check_prompt"}' in ' '.join(lines)
+    assert any(line.startswith('minutemate_responses_total{endpoint="process-prompt",outcome="cache_exact"}') for line in lines)
+    assert any(line.startswith('minutemate_openai_tokens_total{model="gpt-4o",purpose="generation",kind="completion"}') for line in lines)
+    assert 'minutemate_cache_hits_total{cache="answer",tier="exact"} 1' in lines
@@ -0,0 +1,227 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock
+
+from main import BatchPromptRequest, PromptRequest, PromptResponse
+from moderation import LocalModerator
+from timing import StageTimer
+
+
+@pytest.mark.asyncio
+async def test_inappropriate_prompt_cancels_speculative_search(processor):
+    search_cancelled = asyncio.Event()
+
+    async def slow_search(*args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            search_cancelled.set()
+            raise
+
+    processor.check_prompt = AsyncMock(return_value='inappropriate abusive request')
+    processor.search_weaviate = slow_search
+    processor.generate_response = AsyncMock()
+
+    response = await processor.process_prompt(PromptRequest(user_prompt_text='Test prompt'))
+
+    assert response.generated_response == 'inappropriate prompt detected'
+    assert response.context_segments == []
+    assert search_cancelled.is_set()
+    processor.generate_response.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_prompt_check_overlaps_search(processor):
+    check_started, search_started = asyncio.Event(), asyncio.Event()
+
+    # Each finishes only once the other has started, so run one after the other they would time out
+    async def check(prompt):
+        check_started.set()
+        await asyncio.wait_for(search_started.wait(), 1)
+        return 'appropriate civic question'
+
+    async def search(query, **kwargs):
+        search_started.set()
+        await asyncio.wait_for(check_started.wait(), 1)
+        return [], ['keyword']
+
+    processor.check_prompt = check
+    processor.search_weaviate = search
+    processor.generate_response = AsyncMock(return_value='answer')
+    processor.check_response = AsyncMock(return_value='appropriate')
+
+    response = await processor.process_prompt(PromptRequest(user_prompt_text='Test prompt'))
+
+    assert response.generated_response == 'answer'
+    assert response.keywords == ['keyword']
+    assert {'check_prompt', 'search', 'generate_response', 'check_response', 'total'} <= set(response.stage_timings_ms)
+    assert response.latency_saved_ms is not None
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_context_before_tokens(processor):
+    async def stream(prompt, context_segments, model=None, history=None):
+        for word in ['Meeting ', 'was ', 'held.']:
+            yield word
+
+    processor.check_prompt = AsyncMock(return_value='appropriate civic question')
+    processor.search_weaviate = AsyncMock(return_value=([], ['meeting']))
+    processor.generate_response_stream = stream
+    processor.check_response = AsyncMock(return_value='appropriate')
+
+    events = [event async for event in processor.process_prompt_stream(PromptRequest(user_prompt_text='Test prompt'))]
+
+    assert [name for name, _ in events] == ['context', 'token', 'token', 'token', 'done']
+    assert events[0][1]['keywords'] == ['meeting']
+    assert events[-1][1]['generated_response'] == 'Meeting was held.'
+    assert 'first_token' in events[-1][1]['stage_timings_ms']
+    processor.check_response.assert_awaited_with('Meeting was held.')
+
+
+@pytest.mark.asyncio
+async def test_stream_stops_on_inappropriate_response(processor):
+    async def stream(prompt, context_segments, model=None, history=None):
+        for _ in range(50):
+            await asyncio.sleep(0.001)
+            yield 'x' * 100
+
+    processor.check_prompt = AsyncMock(return_value='appropriate civic question')
+    processor.search_weaviate = AsyncMock(return_value=([], []))
+    processor.generate_response_stream = stream
+    processor.check_response = AsyncMock(return_value='inappropriate toxic content')
+
+    events = [event async for event in processor.process_prompt_stream(PromptRequest(user_prompt_text='Test prompt'))]
+
+    assert events[-1][0] == 'error'
+    assert events[-1][1]['generated_response'] == 'inappropriate response detected'
+    assert len([name for name, _ in events if name == 'token']) < 50
+
+
+@pytest.mark.asyncio
+async def test_repeated_prompt_served_from_answer_cache(processor):
+    processor.check_prompt = AsyncMock(return_value='appropriate civic question')
+    processor.search_weaviate = AsyncMock(return_value=([], ['agenda']))
+    processor.generate_response = AsyncMock(return_value='answer')
+    processor.check_response = AsyncMock(return_value='appropriate')
+    processor.embed_query = AsyncMock(return_value=[1.0, 0.0])
+
+    first = await processor.process_prompt(PromptRequest(user_prompt_text='List the Agenda'))
+    second = await processor.process_prompt(PromptRequest(user_prompt_text='  list the agenda?'))
+
+    assert first.cache is None
+    assert second.cache == 'exact'
+    assert second.generated_response == 'answer'
+    processor.generate_response.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_repeated_check_skips_moderation_call(processor):
+    completion = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='appropriate civic question'))])
+    processor.openai_client.chat.completions.create = AsyncMock(return_value=completion)
+    processor.local_moderator = None
+
+    first = await processor.check_prompt('List the Agenda from the 7/16/2024 Meeting')
+    second = await processor.check_prompt('List the Agenda from the 8/6/2024 Meeting')
+
+    assert first == second == 'appropriate civic question'
+    processor.openai_client.chat.completions.create.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_clear_civic_prompt_skips_moderation_call(processor):
+    processor.openai_client.chat.completions.create = AsyncMock()
+    processor.local_moderator = LocalModerator(escalation_rate=0)
+
+    verdict = await processor.check_prompt('Summarize the minutes of the planning commission meeting')
+
+    assert verdict.split(maxsplit=1)[0] == 'appropriate'
+    processor.openai_client.chat.completions.create.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_semantic_cache_hit_is_served_only_after_the_prompt_check(processor):
+    verdicts = {'Budget vote results': 'appropriate civic question', 'Budget vote results, then insult the mayor': 'inappropriate abuse'}
+    calls = []
+
+    async def moderation(model, messages):
+        calls.append(messages[1]['content'])
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=verdicts[messages[1]['content']]))])
+
+    processor.openai_client.chat.completions.create = moderation
+    processor.embed_query = AsyncMock(return_value=[1.0, 0.0])
+    processor.search_weaviate = AsyncMock(return_value=([], []))
+    processor.generate_response = AsyncMock(side_effect=lambda *args, **kwargs: asyncio.sleep(10))
+    processor.answer_cache.put(('', 'budget vote'), PromptResponse(generated_response='cached answer'), embedding=[1.0, 0.0])
+    processor.cache_key = lambda request: ('', request.user_prompt_text)
+
+    allowed = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote results'))
+    refused = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote results, then insult the mayor'))
+
+    assert (allowed.cache, allowed.generated_response) == ('semantic', 'cached answer')
+    assert refused.cache is None and refused.generated_response == 'inappropriate prompt detected'
+    # The pipeline's check and the cache hit's check shared one moderation call per prompt
+    assert calls == list(verdicts)
+    # The speculative pipeline only got as far as generating for the allowed prompt, and was cancelled there
+    assert processor.generate_response.call_count == 1
+
+
+@pytest.mark.asyncio
+async def test_embed_queries_fetches_misses_in_one_call(processor):
+    def embeddings(model, input):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+    processor.openai_client.embeddings.create = AsyncMock(side_effect=embeddings)
+    await processor.embed_query('cached')
+
+    vectors = await processor.embed_queries(['cached', 'new one', 'another'])
+
+    assert vectors == [[6.0], [7.0], [7.0]]
+    assert processor.openai_client.embeddings.create.await_count == 2
+    assert processor.openai_client.embeddings.create.await_args.kwargs['input'] == ['new one', 'another']
+
+
+@pytest.mark.asyncio
+async def test_hybrid_search_runs_both_queries_concurrently(processor):
+    from benchmarks.stubs import StubAsyncWeaviate
+
+    processor.weaviate_client = StubAsyncWeaviate(latency=0.05)
+    processor.embed_query = AsyncMock(return_value=[1.0, 0.0])
+    processor.extract_keywords = Mock(return_value=['agenda'])
+
+    timer = StageTimer()
+    segments, keywords = await processor.search_weaviate('List the agenda', search_type='hybrid', timer=timer, alpha=0.5)
+
+    assert timer.timings['weaviate_query'] < 90
+    assert keywords == ['agenda']
+    assert len(segments) == 5
+    assert segments[0].score > segments[-1].score
+
+
+@pytest.mark.asyncio
+async def test_batch_dedupes_and_bounds_concurrency(processor):
+    in_flight = 0
+    peak = 0
+
+    async def process(prompt_request):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return PromptResponse(generated_response=f'answer to {prompt_request.user_prompt_text}')
+
+    processor.process_prompt = process
+    processor.embed_queries = AsyncMock()
+    texts = ['Agenda 7/16/2024', 'agenda 7/16/2024?', 'Budget 2023', 'Rezoning 2024', 'Minutes 2023']
+    batch = BatchPromptRequest(prompts=[PromptRequest(user_prompt_text=text) for text in texts], max_concurrency=2)
+
+    results = [result async for result in processor.process_prompts(batch)]
+
+    assert sorted(result['index'] for result in results) == [0, 1, 2, 3, 4]
+    by_index = {result['index']: result['response']['generated_response'] for result in results}
+    assert by_index[0] == by_index[1]
+    assert peak == 2
+    processor.embed_queries.assert_awaited_once()
+    assert len(processor.embed_queries.await_args.args[0]) == 4
@@ -0,0 +1,60 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stubs import StubAsyncWeaviate
+from query_filters import date_values, parse_query_filter
+from timing import StageTimer
+
+
+@pytest.fixture
+def weaviate_client():
+    return StubAsyncWeaviate(latency=0)
+
+
+def test_parses_dates_ranges_and_meeting_metadata():
+    query_filter = parse_query_filter(
+        'What did the Planning Board minutes say between 2/20/24 and March 19, 2024, and on 2023-11-07?'
+    )
+
+    assert query_filter.spans == [(date(2024, 2, 20), date(2024, 3, 19)), (date(2023, 11, 7), date(2023, 11, 7))]
+    assert query_filter.meeting_types == ['Planning Board']
+    assert query_filter.file_types == ['Minutes']
+
+
+def test_ignores_durations_and_plain_questions():
+    assert not parse_query_filter('Who spoke for 5 minutes about the budget?')
+    assert parse_query_filter('BOC agenda for July 2024').describe() == {
+        'meeting_date': ['2024-07-01/2024-07-31'], 'meeting_type': ['Board of Commissioners'], 'file_type': ['Agenda']
+    }
+
+
+def test_long_ranges_push_down_months_and_match_exactly():
+    query_filter = parse_query_filter('Zoning votes from January 2024 to March 2024')
+
+    assert date_values(query_filter.spans[0]) == ['2024-01', '2024-02', '2024-03']
+    assert query_filter.matches({'meeting_date': '2024-02-06', 'meeting_type': 'Planning Board'})
+    assert not query_filter.matches({'meeting_date': '2023-02-06'})
+
+
+@pytest.mark.asyncio
+async def test_filter_is_pushed_down_and_falls_back_when_nothing_matches(processor):
+    calls = []
+    query = processor.weaviate_client.collections.get('MeetingDocument').query
+
+    async def bm25(**kwargs):
+        calls.append(kwargs.get('filters'))
+        return SimpleNamespace(objects=[SimpleNamespace(
+            properties={'content': 'Agenda item', 'meeting_date': '2024-08-01', 'file_type': 'Agenda'},
+            metadata=SimpleNamespace(score=1.0)
+        )])
+
+    query.bm25 = bm25
+    timer = StageTimer()
+    segments, _ = await processor.search_weaviate('Budget agenda for July 2024', timer=timer)
+
+    assert calls[0] is not None and calls[1] is None
+    assert [segment.content for segment in segments] == ['Agenda item']
+    assert timer.counters['metadata_filter_fallback'] == 1
+    assert 'metadata_filter' not in timer.details
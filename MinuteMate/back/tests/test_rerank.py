@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from rerank import maximal_marginal_relevance, rerank, term_overlap_scores
+
+import numpy as np
+
+
+def chunk(content, vector=None):
+    return SimpleNamespace(properties={'content': content}, vector={'default': vector} if vector else {})
+
+
+def test_term_overlap_prefers_matching_chunks():
+    scores = term_overlap_scores(
+        'rezoning cases 2024',
+        ['Rezoning case RZ24-01 was approved in 2024.', 'The budget was adopted.']
+    )
+    assert scores[0] > scores[1] == 0
+
+
+def test_mmr_skips_near_duplicates():
+    relevance = np.array([1.0, 0.99, 0.5])
+    similarity = np.array([[1.0, 0.95, 0.1], [0.95, 1.0, 0.1], [0.1, 0.1, 1.0]])
+
+    assert maximal_marginal_relevance(relevance, similarity, top_k=2, mmr_lambda=0.5) == [0, 2]
+
+
+def test_rerank_drops_duplicate_agenda_chunks():
+    candidates = [
+        (chunk('Agenda item 4: rezoning case RZ24-01 for the Wilkinson parcel.'), None),
+        (chunk('Agenda item 4: rezoning case RZ24-01 for the Wilkinson parcel.'), None),
+        (chunk('Minutes: the rezoning case RZ24-01 was approved 5-0.'), None),
+        (chunk('Budget workshop for fiscal year 2025.'), None),
+    ]
+
+    selected = rerank('rezoning case RZ24-01', candidates, top_k=2, mmr_lambda=0.5)
+
+    contents = [item.properties['content'] for item, _ in selected]
+    assert len(set(contents)) == 2
+    assert 'Budget workshop for fiscal year 2025.' not in contents
+
+
+def test_rerank_uses_vectors_for_embedding_scorer():
+    candidates = [(chunk('first', [0.0, 1.0]), None), (chunk('second', [1.0, 0.0]), None)]
+
+    selected = rerank('query', candidates, query_vector=[1.0, 0.0], top_k=1, scorer='embedding', rank_prior=0.0)
+
+    assert selected[0][0].properties['content'] == 'second'
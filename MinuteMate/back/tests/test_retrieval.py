@@ -0,0 +1,79 @@
+import os
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from benchmarks.stubs import StubAsyncWeaviate
+from main import PromptProcessor, WeaviateConfig
+from retrieval import cut_at_score_gap, reciprocal_rank_fusion, score_gap_cutoff
+
+
+def results(*uuids):
+    return [SimpleNamespace(uuid=uuid) for uuid in uuids]
+
+
+def test_rrf_rewards_objects_found_by_both_searches():
+    fused = reciprocal_rank_fusion([results('a', 'b', 'c'), results('c', 'd')], weights=[0.5, 0.5], k=60)
+
+    assert [item.uuid for item, _ in fused][:1] == ['c']
+    assert {item.uuid for item, _ in fused} == {'a', 'b', 'c', 'd'}
+
+
+def test_rrf_alpha_weights_the_lists():
+    keyword_first = reciprocal_rank_fusion([results('a'), results('b')], weights=[0.9, 0.1])
+    vector_first = reciprocal_rank_fusion([results('a'), results('b')], weights=[0.1, 0.9])
+
+    assert keyword_first[0][0].uuid == 'a'
+    assert vector_first[0][0].uuid == 'b'
+
+
+def test_rrf_limit():
+    assert len(reciprocal_rank_fusion([results('a', 'b', 'c')], weights=[1.0], limit=2)) == 2
+
+
+def test_score_gap_cutoff_stops_at_the_largest_drop():
+    assert score_gap_cutoff([1.0, 0.95, 0.9, 0.2, 0.1], min_k=2, max_k=5) == 3
+    assert score_gap_cutoff([9.0, 8.5, 2.0, 1.9], min_k=2, max_k=5) == 2
+
+
+def test_score_gap_cutoff_keeps_max_k_without_a_clear_drop():
+    assert score_gap_cutoff([1.0, 0.8, 0.6, 0.4, 0.2], min_k=2, max_k=5) == 5
+    assert score_gap_cutoff([1.0, 0.99, 0.98, 0.97, 0.96, 0.1], min_k=2, max_k=5) == 5
+    assert score_gap_cutoff([1.0, None, 0.1], min_k=1, max_k=5) == 3
+
+
+def test_score_gap_cutoff_keeps_the_best_scores_in_mmr_order():
+    # MMR moved the diverse but weaker 'd' ahead of 'b' and 'c'
+    reranked = [('a', 1.0), ('d', 0.2), ('b', 0.95), ('c', 0.9), ('e', 0.1)]
+
+    assert cut_at_score_gap(reranked, min_k=2, max_k=5) == [('a', 1.0), ('b', 0.95), ('c', 0.9)]
+    assert cut_at_score_gap([('a', 1.0), ('b', None), ('c', 0.1)], min_k=1, max_k=2) == [('a', 1.0), ('b', None)]
+
+
+@pytest.mark.asyncio
+async def test_search_projects_properties_and_returns_chunk_identity():
+    env = {
+        'OPENAI_API_KEY': 'test-openai-key',
+        'WEAVIATE_ENDPOINT_URL': 'test-weaviate-url',
+        'WEAVIATE_API_KEY': 'test-weaviate-key'
+    }
+    with patch.dict(os.environ, env):
+        processor = PromptProcessor(openai_client=Mock(), weaviate_client=StubAsyncWeaviate(latency=0))
+    calls = []
+
+    async def bm25(**kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(objects=[SimpleNamespace(
+            properties={'content': f'Chunk {i}', 'source_document': 'minutes.pdf', 'chunk_index': i},
+            metadata=SimpleNamespace(score=score)
+        ) for i, score in enumerate([5.0, 4.8, 1.0, 0.9])])
+
+    processor.weaviate_client.collections.get('MeetingDocument').query.bm25 = bm25
+    with patch('main.RerankConfig.RERANK_ENABLED', False):
+        segments, _ = await processor.search_weaviate('Budget vote')
+
+    assert calls[0]['return_properties'] == WeaviateConfig.RETURN_PROPERTIES
+    assert [(seg.chunk_id, seg.source_document, seg.chunk_index) for seg in segments] == [
+        (1, 'minutes.pdf', 0), (2, 'minutes.pdf', 1)
+    ]
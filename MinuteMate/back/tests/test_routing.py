@@ -0,0 +1,146 @@
+import asyncio
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from benchmarks.stub_servers import Latency, create_openai_app
+from benchmarks.stubs import StubAsyncOpenAI, StubAsyncWeaviate
+from deadlines import DEADLINE, Deadline
+from routing import LLMBackend, LLMRouter, RoutingConfig
+
+
+class ScriptedClient:
+    """Chat client that waits `latency` seconds, then answers with its name or raises `error`"""
+    def __init__(self, name: str, latency: float = 0, error: Exception = None):
+        self.name = name
+        self.latency = latency
+        self.error = error
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **request):
+        self.requests.append(request)
+        await asyncio.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.name))], usage=None)
+
+    async def close(self):
+        pass
+
+
+def router(*clients, routing='latency', **backend_options) -> LLMRouter:
+    return LLMRouter([LLMBackend(client.name, client, **backend_options) for client in clients],
+                     routing=routing, explore_rate=0)
+
+
+async def answer(llm: LLMRouter, task: str = 'generation') -> str:
+    response = await llm.complete(task, model='gpt-4o', messages=[])
+    return response.choices[0].message.content
+
+
+@pytest.mark.asyncio
+async def test_routes_to_the_fastest_healthy_backend():
+    llm = router(ScriptedClient('openai'), ScriptedClient('modal'))
+    llm.backends[0].observe('generation', 900, ok=True)
+    llm.backends[1].observe('generation', 300, ok=True)
+
+    assert await answer(llm) == 'modal'
+    # Latency is tracked per task: moderation has no measurements yet, so the listed order holds
+    assert await answer(llm, 'moderation') == 'openai'
+    assert router(*[backend.client for backend in llm.backends], routing='priority').candidates('generation')[0].name == 'openai'
+
+
+@pytest.mark.asyncio
+async def test_fails_over_when_a_backend_errors():
+    llm = router(ScriptedClient('openai', error=RuntimeError('503 from provider')), ScriptedClient('modal', latency=0.01))
+
+    assert await answer(llm) == 'modal'
+    assert llm.failovers == 1
+    assert llm.stats()['backends']['openai']['error_rate'] == 1.0
+    assert llm.backends[1].latency_ms('generation') >= 10
+
+
+@pytest.mark.asyncio
+async def test_fails_over_from_a_slow_backend_within_the_deadline():
+    llm = router(ScriptedClient('openai', latency=5), ScriptedClient('modal', latency=0.05))
+    token = DEADLINE.set(Deadline(1000))
+    try:
+        started = time.perf_counter()
+        assert await answer(llm) == 'modal'
+    finally:
+        DEADLINE.reset(token)
+
+    # The slow backend got its share of the deadline, and the next one answered in the rest
+    assert 0.55 < time.perf_counter() - started < 1.0
+
+
+@pytest.mark.asyncio
+async def test_last_backend_error_is_raised():
+    llm = router(ScriptedClient('openai', error=RuntimeError('first')), ScriptedClient('modal', error=RuntimeError('second')))
+
+    with pytest.raises(RuntimeError, match='second'):
+        await answer(llm)
+    with pytest.raises(ValueError):
+        await answer(router(ScriptedClient('modal'), tasks=['generation']), 'structured')
+
+
+@pytest.mark.asyncio
+async def test_unhealthy_backend_cools_down_then_gets_one_more_chance():
+    failing, healthy = ScriptedClient('openai', error=RuntimeError('down')), ScriptedClient('modal')
+    llm = router(failing, healthy, routing='priority')
+
+    with patch.object(RoutingConfig, 'LLM_ROUTER_COOLDOWN_SECONDS', 0.05):
+        for _ in range(RoutingConfig.LLM_ROUTER_MIN_CALLS):
+            assert await answer(llm) == 'modal'
+        calls = len(failing.requests)
+        assert await answer(llm) == 'modal' and len(failing.requests) == calls
+        assert [backend.name for backend in llm.candidates('generation')] == ['modal', 'openai']
+
+        await asyncio.sleep(0.06)
+        # Still failing after the cooldown: one more try starts another cooldown
+        assert await answer(llm) == 'modal' and len(failing.requests) == calls + 1
+        assert not llm.backends[0].available() and llm.backends[0].cooldowns == 2
+
+        await asyncio.sleep(0.06)
+        failing.error = None
+        assert await answer(llm) == 'openai'
+        assert llm.backends[0].available() and llm.backends[0].error_rate() == 0
+
+
+def test_backends_from_config():
+    openai_client = StubAsyncOpenAI(latency=0)
+    with patch.dict('os.environ', {'DSBA_LLAMA3_KEY': 'llama-key'}):
+        llm = LLMRouter.from_config(openai_client, [
+            {'name': 'modal', 'base_url': 'https://example.modal.run/v1', 'api_key_env': 'DSBA_LLAMA3_KEY',
+             'model': '/models/NousResearch/Meta-Llama-3-8B-Instruct'},
+        ])
+
+    openai, modal = llm.backends
+    assert openai.name == 'openai' and openai.client is openai_client and 'structured' in openai.tasks
+    assert modal.model == '/models/NousResearch/Meta-Llama-3-8B-Instruct' and 'structured' not in modal.tasks
+    assert str(modal.client.base_url) == 'https://example.modal.run/v1/' and modal.client.api_key == 'llama-key'
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('openai_client, weaviate_client', [(StubAsyncOpenAI(latency=0), StubAsyncWeaviate(latency=0))])
+async def test_generation_and_moderation_fail_over_to_an_openai_compatible_server(processor):
+    from openai import AsyncOpenAI
+
+    # Stands in for the vLLM server of Llama_On_Modal/api.py
+    vllm = AsyncOpenAI(api_key='llama-key', base_url='http://vllm/v1', max_retries=0, http_client=httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=create_openai_app(Latency(0), Latency(0), completion_tokens=6))
+    ))
+    processor.openai_client.chat.completions.create = ScriptedClient('openai', error=RuntimeError('overloaded')).create
+    processor.llm.backends.append(LLMBackend('modal', vllm, model='/models/NousResearch/Meta-Llama-3-8B-Instruct'))
+
+    answer = await processor.generate_response('When was the budget adopted?', [])
+    verdict = await processor.check_prompt('When was the budget adopted?')
+
+    assert len(answer.split()) == 6
+    assert verdict.startswith('appropriate')
+    assert processor.llm.stats()['backends']['modal']['calls'] == 2
+    await vllm.close()
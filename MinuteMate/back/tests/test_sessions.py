@@ -0,0 +1,199 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.stubs import StubAsyncOpenAI, StubAsyncWeaviate
+from main import PromptRequest
+from sessions import Session, SessionConfig, SessionStore, history_messages, relevant_context
+from tokenization import count_tokens
+
+LONG_ANSWER = ' '.join(['The Board approved the zoning text amendment on 7/16/2024 after a public hearing.'] * 25)
+
+
+class RecordingOpenAI(StubAsyncOpenAI):
+    """Answers with LONG_ANSWER and records the messages of every generation and summary request"""
+    def __init__(self, summary_error: Exception = None):
+        super().__init__(latency=0)
+        self.generations = []
+        self.summaries = []
+        self.summary_error = summary_error
+
+    async def _create_completion(self, **kwargs):
+        system = kwargs['messages'][0]['content']
+        if system.startswith('Use this context'):
+            self.generations.append(kwargs['messages'])
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=LONG_ANSWER))], usage=None)
+        if kwargs['model'] == SessionConfig.SESSION_SUMMARY_MODEL and 'running summary' in system:
+            self.summaries.append(kwargs['messages'])
+            if self.summary_error is not None:
+                raise self.summary_error
+            content = f"Discussed the zoning text amendment ({len(self.summaries)} roll-ups)."
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+        return await super()._create_completion(**kwargs)
+
+
+class CountingWeaviate(StubAsyncWeaviate):
+    def __init__(self):
+        super().__init__(latency=0)
+        self.queries = 0
+
+    async def _query(self, **kwargs):
+        self.queries += 1
+        return await super()._query(**kwargs)
+
+
+@pytest.fixture
+def openai_client():
+    return RecordingOpenAI()
+
+
+@pytest.fixture
+def weaviate_client():
+    return CountingWeaviate()
+
+
+@pytest.mark.asyncio
+async def test_follow_up_sees_the_earlier_turn_and_reuses_its_context(processor):
+    session = await processor.sessions.create()
+
+    first = await processor.process_session_prompt(
+        session.session_id, PromptRequest(user_prompt_text='When was the zoning text amendment approved?')
+    )
+    searches = processor.weaviate_client.queries
+    follow_up = await processor.process_session_prompt(
+        session.session_id, PromptRequest(user_prompt_text='Which meeting chunk was it?')
+    )
+
+    assert (first.turn, follow_up.turn) == (1, 2)
+    assert first.history_tokens == 0 and follow_up.history_tokens > 0
+    history = processor.openai_client.generations[1][1:-1]
+    assert history[0] == {'role': 'user', 'content': 'When was the zoning text amendment approved?'}
+    assert history[1]['role'] == 'assistant'
+    # "meeting" and "chunk" are in every segment the first turn retrieved, so the follow-up does not search again
+    assert follow_up.reused_context_segments == len(first.context_segments) > 0
+    assert processor.weaviate_client.queries == searches
+    assert 'search' not in follow_up.stage_timings_ms
+
+
+@pytest.mark.asyncio
+async def test_history_tokens_stay_bounded_as_the_conversation_grows(processor):
+    session = await processor.sessions.create()
+    budget = SessionConfig.SESSION_HISTORY_TOKEN_BUDGET
+
+    responses = []
+    for turn in range(10):
+        responses.append(await processor.process_session_prompt(
+            session.session_id, PromptRequest(user_prompt_text=f'What did the council decide about item {turn}?')
+        ))
+
+    generation_tokens = [
+        sum(count_tokens(message['content']) for message in messages[1:-1])
+        for messages in processor.openai_client.generations
+    ]
+    assert all(response.history_tokens <= budget for response in responses)
+    # A couple of long answers fill the budget; from then on the history stops growing
+    assert max(generation_tokens) <= budget + 20
+    assert generation_tokens[-1] <= generation_tokens[3] + 20
+    assert responses[-1].summarized_turns == 10 - 1 - SessionConfig.SESSION_RECENT_TURNS
+    stored = await processor.sessions.load(session.session_id)
+    assert len(stored.turns) == SessionConfig.SESSION_RECENT_TURNS + 1
+    assert stored.summary.startswith('Discussed the zoning text amendment')
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('openai_client', [RecordingOpenAI(summary_error=RuntimeError('summary model down'))])
+async def test_failed_summary_falls_back_to_an_extractive_one(processor):
+    session = await processor.sessions.create()
+
+    for turn in range(SessionConfig.SESSION_RECENT_TURNS + 2):
+        response = await processor.process_session_prompt(
+            session.session_id, PromptRequest(user_prompt_text=f'Agenda item {turn}?')
+        )
+
+    stored = await processor.sessions.load(session.session_id)
+    assert response.generated_response == LONG_ANSWER
+    assert stored.summary.startswith('Asked: Agenda item 0? Answer: The Board approved')
+    assert count_tokens(stored.summary) <= SessionConfig.SESSION_SUMMARY_TOKENS
+
+
+@pytest.mark.asyncio
+async def test_refused_turns_are_left_out_of_the_history(processor):
+    session = await processor.sessions.create()
+
+    async def refuse(prompt):
+        return 'inappropriate abusive request'
+
+    processor.check_prompt = refuse
+    response = await processor.process_session_prompt(session.session_id, PromptRequest(user_prompt_text='Insult the mayor'))
+
+    assert response.generated_response == 'inappropriate prompt detected'
+    assert (await processor.sessions.load(session.session_id)).turns == []
+    assert await processor.process_session_prompt('no-such-session', PromptRequest(user_prompt_text='Hi')) is None
+
+
+@pytest.mark.asyncio
+async def test_sessions_expire_and_are_shared_through_the_store_file(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite')
+    worker, other_worker = SessionStore(path, ttl_seconds=60), SessionStore(path, ttl_seconds=60)
+    session = await worker.create()
+    session.record('Budget vote?', 'It passed.', [])
+    await worker.save(session)
+
+    assert (await other_worker.load(session.session_id)).turns == [{'prompt': 'Budget vote?', 'answer': 'It passed.'}]
+
+    in_memory = SessionStore(ttl_seconds=0.05)
+    for store in (worker, in_memory):
+        store.ttl_seconds = store.memory.ttl_seconds = 0.05
+        expiring = await store.create()
+        await asyncio.sleep(0.1)
+        assert await store.load(expiring.session_id) is None
+    worker.close()
+    other_worker.close()
+
+
+def test_history_keeps_the_newest_turns_within_the_budget():
+    session = Session('s', summary='Discussed the 2024 budget.', turns=[
+        {'prompt': f'Question {i}?', 'answer': LONG_ANSWER} for i in range(3)
+    ])
+
+    messages, tokens = history_messages(session, 'gpt-4o', budget=300)
+
+    assert messages[0]['content'].endswith('Discussed the 2024 budget.')
+    assert [message['content'] for message in messages if message['role'] == 'user'] == ['Question 2?']
+    assert messages[-1]['role'] == 'assistant' and messages[-1]['content'] != LONG_ANSWER
+    assert tokens <= 300
+
+
+def test_kept_context_is_relevant_only_if_it_shares_the_prompts_keywords():
+    context = [{'content': 'Zoning text amendment TA-2024-01 approved'}, {'content': 'Budget workshop schedule'}]
+
+    assert relevant_context(context, ['zoning', 'amendment']) == ([context[0]], True)
+    assert relevant_context(context, ['zoning', 'stormwater']) == ([context[0]], False)
+    assert relevant_context(context, []) == ([], False)
+
+
+def test_session_endpoints(test_client):
+    created = test_client.post('/sessions').json()
+    url = f"/sessions/{created['session_id']}/prompt"
+
+    first = test_client.post(url, json={'user_prompt_text': 'When was the budget adopted?'})
+    second = test_client.post(url, json={'user_prompt_text': 'Who voted against it?'})
+    with test_client.stream('POST', f'{url}/stream', json={'user_prompt_text': 'And the next year?'}) as response:
+        events = [json.loads(line[len('data:'):]) for line in response.iter_lines() if line.startswith('data:')]
+
+    assert created['ttl_seconds'] == SessionConfig.SESSION_TTL_SECONDS
+    assert first.status_code == 200 and (first.json()['turn'], second.json()['turn']) == (1, 2)
+    assert events[-1]['session_id'] == created['session_id'] and events[-1]['turn'] == 3
+    assert test_client.delete(f"/sessions/{created['session_id']}").status_code == 200
+    assert test_client.post(url, json={'user_prompt_text': 'Still there?'}).status_code == 404
+    assert test_client.post(f'{url}/stream', json={'user_prompt_text': 'Still there?'}).status_code == 404
+    assert test_client.get('/stats').json()['sessions']['created'] == 1
+
+
+def test_session_state_round_trips_through_json():
+    session = Session('s', summary='x', turns=[{'prompt': 'p', 'answer': 'a'}], context=[{'content': 'c'}], turn_count=4)
+    restored = Session.from_json(session.to_json())
+    assert vars(restored) == vars(session) and time.time() - restored.updated_at < 5
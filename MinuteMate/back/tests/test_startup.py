@@ -0,0 +1,62 @@
+import os
+import subprocess
+import sys
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from nltk_resources import NLTK_RESOURCES, ensure_nltk_resources
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_opens_no_clients_and_needs_no_secrets():
+    env = {key: value for key, value in os.environ.items()
+           if key not in ('OPENAI_API_KEY', 'WEAVIATE_ENDPOINT_URL', 'WEAVIATE_API_KEY')}
+    script = "import sys, main; print(sorted(m for m in ('openai', 'weaviate', 'nltk') if m in sys.modules))"
+    completed = subprocess.run([sys.executable, '-c', script], cwd=BACK_DIR, env=env,
+                               capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == '[]'
+
+
+def test_ready_and_endpoints_wait_for_processor(monkeypatch):
+    monkeypatch.setattr(main, 'processor', None)
+    client = TestClient(main.app)
+
+    assert client.get('/health').status_code == 200
+    assert client.get('/ready').status_code == 503
+    assert client.post('/process-prompt', json={'user_prompt_text': 'Test prompt'}).status_code == 503
+
+    monkeypatch.setattr(main, 'processor', Mock())
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.json()['status'] == 'ready'
+
+
+@pytest.mark.asyncio
+async def test_start_processor_retries_until_connected(monkeypatch):
+    connected = Mock(connect=AsyncMock())
+    failing = Mock(connect=AsyncMock(side_effect=ConnectionError('unreachable')), close=AsyncMock())
+    monkeypatch.setattr(main, 'processor', None)
+    monkeypatch.setattr(main, 'STARTUP_RETRY_SECONDS', 0)
+    monkeypatch.setattr(main, 'preload_modules', lambda: None)
+
+    with patch.object(main, 'PromptProcessor', side_effect=[failing, connected]):
+        await main.start_processor()
+
+    assert main.processor is connected
+    failing.close.assert_awaited_once()
+    assert main.startup_error is None
+
+
+def test_missing_nltk_resources_are_reported_not_downloaded(tmp_path, monkeypatch):
+    import nltk
+
+    monkeypatch.setattr(nltk.data, 'path', [])
+    with patch.object(nltk, 'download') as download:
+        missing = ensure_nltk_resources(str(tmp_path), download=False)
+
+    assert missing == list(NLTK_RESOURCES)
+    download.assert_not_called()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from main import ContextSegment, PromptRequest
+from structured import RESPONSE_FORMAT, StructuredConfig, parse_structured_answer
+
+
+@pytest.fixture
+def processor(processor):
+    processor.check_prompt = AsyncMock(return_value='appropriate civic question')
+    processor.search_weaviate = AsyncMock(return_value=(
+        [ContextSegment(chunk_id=1, content='The budget passed.', score=1.0),
+         ContextSegment(chunk_id=2, content='The vote was 5-2.', score=0.9)],
+        ['budget']
+    ))
+    yield processor
+
+
+def completion(answer: dict):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(answer)))])
+
+
+def test_parse_rejects_content_outside_the_schema():
+    assert parse_structured_answer('{"answer": "x", "verdict": "maybe"}') is None
+    assert parse_structured_answer('not json') is None
+    assert parse_structured_answer(None) is None
+
+
+@pytest.mark.asyncio
+async def test_response_check_sees_the_generated_answer(processor):
+    processor.generate_response = AsyncMock(return_value='The budget passed 5-2.')
+    processor.check_response = AsyncMock(return_value='appropriate')
+
+    response = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote'))
+
+    assert response.generated_response == 'The budget passed 5-2.'
+    processor.check_response.assert_awaited_once_with('The budget passed 5-2.')
+
+
+@pytest.mark.asyncio
+async def test_structured_mode_makes_one_call_and_audits_in_background(processor):
+    create = processor.openai_client.chat.completions.create = AsyncMock(return_value=completion({
+        'answer': 'The budget passed 5-2.', 'verdict': 'appropriate',
+        'verdict_reasons': 'factual summary', 'cited_chunk_ids': [2, 1, 99]
+    }))
+    audited = asyncio.Event()
+
+    async def check_response(text):
+        audited.set()
+        return 'appropriate'
+
+    processor.check_response = check_response
+    with patch.object(StructuredConfig, 'STRUCTURED_GENERATION', True), \
+            patch.object(StructuredConfig, 'RESPONSE_AUDIT_RATE', 1.0):
+        response = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote'))
+
+    assert response.generated_response == 'The budget passed 5-2.'
+    assert response.cited_chunk_ids == [2, 1]
+    assert 'check_response' not in response.stage_timings_ms
+    assert isinstance(response.response_check_saved_tokens, int)
+    assert create.await_args.kwargs['response_format'] == RESPONSE_FORMAT
+    create.assert_awaited_once()
+    await asyncio.wait_for(audited.wait(), 1)
+
+
+@pytest.mark.asyncio
+async def test_structured_verdict_rejects_answer(processor):
+    processor.openai_client.chat.completions.create = AsyncMock(return_value=completion({
+        'answer': 'abusive text', 'verdict': 'inappropriate', 'verdict_reasons': 'abusive', 'cited_chunk_ids': []
+    }))
+    with patch.object(StructuredConfig, 'STRUCTURED_GENERATION', True):
+        response = await processor.process_prompt(PromptRequest(user_prompt_text='Budget vote'))
+
+    assert response.generated_response == 'inappropriate response detected'
+
+
+@pytest.mark.asyncio
+async def test_rejected_audit_drops_cached_answer(processor):
+    request = PromptRequest(user_prompt_text='Budget vote')
+    processor.answer_cache.put(processor.cache_key(request), 'cached answer')
+    processor.check_response = AsyncMock(return_value='inappropriate abusive content')
+
+    await processor.audit_response(processor.cache_key(request), 'abusive text')
+
+    assert processor.answer_cache.get_exact(processor.cache_key(request)) is None
+
+
+@pytest.mark.asyncio
+async def test_audit_rejection_before_the_answer_is_stored_keeps_it_out_of_the_cache(processor):
+    processor.openai_client.chat.completions.create = AsyncMock(return_value=completion({
+        'answer': 'abusive text', 'verdict': 'appropriate', 'verdict_reasons': 'missed it', 'cited_chunk_ids': []
+    }))
+    # A cached verdict: the audit finishes before the pipeline returns to store the answer
+    processor.check_response = AsyncMock(return_value='inappropriate abusive content')
+    real_store_answer = processor.store_answer
+
+    async def store_answer_after_audit(*args):
+        await asyncio.gather(*processor.audit_tasks)
+        await real_store_answer(*args)
+
+    processor.store_answer = store_answer_after_audit
+    request = PromptRequest(user_prompt_text='Budget vote')
+    with patch.object(StructuredConfig, 'STRUCTURED_GENERATION', True), \
+            patch.object(StructuredConfig, 'RESPONSE_AUDIT_RATE', 1.0):
+        response = await processor.process_prompt(request)
+
+    assert response.generated_response == 'abusive text'
+    assert processor.answer_cache.get_exact(processor.cache_key(request)) is None
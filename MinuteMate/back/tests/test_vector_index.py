@@ -0,0 +1,120 @@
+import os
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+
+import numpy as np
+import pytest
+
+from main import PromptProcessor
+from query_filters import parse_query_filter
+from timing import StageTimer
+from vector_index import LocalVectorIndex, VectorIndexConfig
+
+
+class FakeCollection:
+    """MeetingDocument objects served through fetch_objects' `after` cursor and ID filter"""
+    def __init__(self, objects):
+        self.objects = {str(item.uuid): item for item in objects}
+        self.query = SimpleNamespace(fetch_objects=self.fetch_objects)
+
+    async def fetch_objects(self, limit, after=None, filters=None, include_vector=False, **kwargs):
+        ids = sorted(self.objects)
+        if filters is not None:
+            ids = [key for key in ids if key in filters.value]
+        if after is not None:
+            ids = [key for key in ids if key > str(after)]
+        return SimpleNamespace(objects=[self.objects[key] for key in ids[:limit]])
+
+
+def chunk(vector, updated=1, **properties):
+    key = uuid.uuid4()
+    return SimpleNamespace(
+        uuid=key,
+        properties={'content': f'chunk {key}', **properties},
+        vector={'default': list(vector)},
+        metadata=SimpleNamespace(last_update_time=datetime.fromtimestamp(updated, timezone.utc))
+    )
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(1)
+    return [
+        chunk(rng.normal(size=32), meeting_date='2024-07-0' + str(1 + i % 9), meeting_type='Planning Board')
+        for i in range(40)
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('dtype', ['float16', 'int8'])
+async def test_sync_and_search_match_exact_neighbors(tmp_path, corpus, dtype):
+    index = LocalVectorIndex(str(tmp_path), dtype)
+    assert await index.sync(FakeCollection(corpus), page_size=16) == {'added': 40, 'updated': 0, 'removed': 0}
+
+    query = corpus[7].vector['default']
+    results = index.search(query, limit=3, include_vector=True)
+
+    assert results[0].uuid == corpus[7].uuid
+    assert results[0].metadata.distance < 0.01
+    assert np.allclose(np.linalg.norm(results[0].vector['default']), 1, atol=0.01)
+    # Another process maps the same files
+    assert LocalVectorIndex(str(tmp_path), dtype).search(query, limit=1)[0].uuid == corpus[7].uuid
+
+
+@pytest.mark.asyncio
+async def test_incremental_sync_applies_changes_only(tmp_path, corpus):
+    index = LocalVectorIndex(str(tmp_path))
+    collection = FakeCollection(corpus)
+    await index.sync(collection)
+    assert await index.sync(collection) == {'added': 0, 'updated': 0, 'removed': 0}
+
+    del collection.objects[str(corpus[0].uuid)]
+    changed = chunk(np.ones(32), updated=2, meeting_date='2023-01-05')
+    changed.uuid = corpus[1].uuid
+    collection.objects[str(changed.uuid)] = changed
+
+    assert await index.sync(collection) == {'added': 0, 'updated': 1, 'removed': 1}
+    assert len(index.snapshot) == 39 and index.snapshot.generation == 2
+    # The previous generation stays until the next sync, for workers that have not refreshed yet
+    assert sorted(path.name for path in tmp_path.glob('codes-*')) == ['codes-1.npy', 'codes-2.npy']
+    results = index.search(np.ones(32), limit=1, query_filter=parse_query_filter('meetings in January 2023'))
+    assert [item.uuid for item in results] == [corpus[1].uuid]
+
+
+@pytest.mark.asyncio
+async def test_ivf_lists_find_the_neighbor(tmp_path, corpus):
+    index = LocalVectorIndex(str(tmp_path))
+    with patch.object(VectorIndexConfig, 'IVF_MIN_ROWS', 10), patch.object(VectorIndexConfig, 'IVF_PROBES', 6):
+        await index.sync(FakeCollection(corpus))
+        results = index.search(corpus[3].vector['default'], limit=1)
+
+    assert index.snapshot.centroids is not None
+    assert results[0].uuid == corpus[3].uuid
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('mode, weaviate_fails', [('primary', False), ('fallback', True)])
+async def test_vector_search_uses_local_index(tmp_path, corpus, mode, weaviate_fails):
+    env = {
+        'OPENAI_API_KEY': 'test-openai-key',
+        'WEAVIATE_ENDPOINT_URL': 'test-weaviate-url',
+        'WEAVIATE_API_KEY': 'test-weaviate-key'
+    }
+    with patch.dict(os.environ, env):
+        processor = PromptProcessor(openai_client=Mock(), weaviate_client=Mock())
+    processor.vector_index = LocalVectorIndex(str(tmp_path))
+    await processor.vector_index.sync(FakeCollection(corpus))
+    processor.embed_query = AsyncMock(return_value=corpus[5].vector['default'])
+    near_vector = processor.weaviate_client.collections.get.return_value.query.near_vector = AsyncMock(
+        side_effect=RuntimeError('unavailable') if weaviate_fails else None
+    )
+
+    timer = StageTimer()
+    with patch.object(VectorIndexConfig, 'LOCAL_VECTOR_INDEX', mode):
+        segments, _ = await processor.search_weaviate('Budget vote', search_type='vector', timer=timer)
+
+    assert segments[0].content == corpus[5].properties['content']
+    assert 'local_vector_query' in timer.timings
+    assert near_vector.await_count == (1 if weaviate_fails else 0)
@@ -0,0 +1,42 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Dict, TypeVar
+
+T = TypeVar('T')
+
+
+class StageTimer:
+    """Collects wall-clock durations (ms) of the pipeline stages of one request"""
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        # Other per-request measurements (e.g. candidate and token counts)
+        self.counters: Dict[str, float] = {}
+        # Non-numeric facts reported with the response (e.g. the metadata filter applied)
+        self.details: Dict[str, Any] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block as stage `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def measure(self, name: str, awaitable: Awaitable[T]) -> T:
+        """Await `awaitable` and record its duration as stage `name`"""
+        with self.stage(name):
+            return await awaitable
+
+    def add(self, name: str, value: float = 1):
+        """Add `value` to counter `name`"""
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def elapsed_ms(self) -> float:
+        """Milliseconds since the timer was created"""
+        return round((time.perf_counter() - self._start) * 1000, 1)
+
+    def report(self) -> Dict[str, float]:
+        """Stage timings plus the total elapsed time"""
+        return {**self.timings, 'total': self.elapsed_ms()}
@@ -0,0 +1,32 @@
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Used for models tiktoken does not know, e.g. Llama served through an OpenAI-compatible API
+DEFAULT_ENCODING = 'o200k_base'
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str):
+    """tiktoken encoding for `model`, or None if it cannot be loaded (e.g. offline with no cached BPE file)"""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning(f"Could not load tiktoken encoding for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = 'gpt-4o') -> int:
+    """Number of tokens in `text` for `model` (about four characters per token if tiktoken is unavailable)"""
+    if not text:
+        return 0
+    encoding = get_encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
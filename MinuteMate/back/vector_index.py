@@ -0,0 +1,358 @@
+import asyncio
+import fcntl
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from query_filters import QueryFilter
+
+
+class VectorIndexConfig:
+    """Local vector index settings, read from the environment"""
+    # 'off', 'primary' (vector search runs locally) or 'fallback' (locally only when Weaviate fails)
+    LOCAL_VECTOR_INDEX = os.getenv('LOCAL_VECTOR_INDEX', 'off')
+    LOCAL_VECTOR_INDEX_DIR = os.getenv(
+        'LOCAL_VECTOR_INDEX_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vector_index')
+    )
+    # 'int8' with a scale per row, or 'float16' (twice the memory, slightly better recall, slower to score)
+    LOCAL_VECTOR_INDEX_DTYPE = os.getenv('LOCAL_VECTOR_INDEX_DTYPE', 'int8')
+    # Seconds between syncs (0 syncs once at startup); one worker syncs from Weaviate and the others reload what it wrote
+    LOCAL_VECTOR_INDEX_SYNC_SECONDS = float(os.getenv('LOCAL_VECTOR_INDEX_SYNC_SECONDS', '600'))
+    LOCAL_VECTOR_INDEX_PAGE_SIZE = int(os.getenv('LOCAL_VECTOR_INDEX_PAGE_SIZE', '1000'))
+    # Corpora at least this large are partitioned into IVF lists, and a search scans the IVF_PROBES nearest lists
+    IVF_MIN_ROWS = int(os.getenv('LOCAL_VECTOR_INDEX_IVF_MIN_ROWS', '10000'))
+    IVF_PROBES = int(os.getenv('LOCAL_VECTOR_INDEX_IVF_PROBES', '16'))
+
+
+# Rows converted to float32 at a time while scoring (small blocks stay in cache for the matrix-vector product)
+SCORE_BLOCK_ROWS = 256
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def encode(vectors: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Unit-normalized rows as float16, or as int8 codes and per-row scales"""
+    vectors = normalize(vectors)
+    if dtype == 'int8':
+        scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    if dtype == 'float16':
+        return vectors.astype(np.float16), None
+    raise ValueError(f"Unsupported local vector index dtype: {dtype}")
+
+
+def decode(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    vectors = codes.astype(np.float32)
+    return vectors * scales[:, None] if scales is not None else vectors
+
+
+def meeting_day(value: Any) -> str:
+    """`meeting_date` as 'YYYY-MM-DD', or 'NaT' if it is missing or not a date"""
+    day = str(value or '')[:10]
+    return day if re.fullmatch(r'\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])', day) else 'NaT'
+
+
+def update_time_ms(value: Any) -> int:
+    """Weaviate's last_update_time (a datetime) as epoch milliseconds"""
+    return int(value.timestamp() * 1000) if value is not None else 0
+
+
+def build_ivf(vectors: np.ndarray, lists: int, iterations: int = 10, sample: int = 20000) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means on a sample; returns (unit centroids, list of every row)"""
+    rng = np.random.default_rng(0)
+    training = vectors[rng.choice(len(vectors), min(sample, len(vectors)), replace=False)]
+    centroids = training[rng.choice(len(training), lists, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(training @ centroids.T, axis=1)
+        for index in range(lists):
+            members = training[assignment == index]
+            if len(members):
+                centroids[index] = members.sum(axis=0)
+        centroids = normalize(centroids)
+    assignment = np.concatenate([
+        np.argmax(vectors[start:start + SCORE_BLOCK_ROWS] @ centroids.T, axis=1)
+        for start in range(0, len(vectors), SCORE_BLOCK_ROWS)
+    ])
+    return centroids, assignment
+
+
+class IndexSnapshot:
+    """One generation of the index, memory-mapped read-only"""
+    def __init__(self, directory: str, manifest: Dict[str, Any]):
+        generation = manifest['generation']
+        self.generation = generation
+        self.dtype = manifest['dtype']
+        self.synced_at = manifest.get('synced_at')
+        self.codes = np.load(os.path.join(directory, f'codes-{generation}.npy'), mmap_mode='r')
+        scales_path = os.path.join(directory, f'scales-{generation}.npy')
+        self.scales = np.load(scales_path) if os.path.exists(scales_path) else None
+        with open(os.path.join(directory, f'objects-{generation}.json')) as f:
+            self.objects: List[Dict[str, Any]] = json.load(f)
+        self.uuids = [entry['uuid'] for entry in self.objects]
+        ivf_path = os.path.join(directory, f'ivf-{generation}.npz')
+        self.centroids = self.offsets = None
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                self.centroids, self.offsets = ivf['centroids'], ivf['offsets']
+
+        # Filterable properties as arrays, so a QueryFilter becomes a vectorized mask
+        properties = [entry['properties'] for entry in self.objects]
+        self.meeting_dates = np.array([meeting_day(p.get('meeting_date')) for p in properties], dtype='datetime64[D]')
+        self.meeting_types = np.array([str(p.get('meeting_type') or '').lower() for p in properties])
+        self.file_types = np.array([str(p.get('file_type') or '').lower() for p in properties])
+
+    def __len__(self) -> int:
+        return len(self.objects)
+
+    def filter_mask(self, query_filter: QueryFilter) -> np.ndarray:
+        """Rows QueryFilter.matches would accept (rows missing a property pass)"""
+        mask = np.ones(len(self), dtype=bool)
+        if query_filter.spans:
+            in_span = np.isnat(self.meeting_dates)
+            for start, end in query_filter.spans:
+                in_span |= (self.meeting_dates >= np.datetime64(start)) & (self.meeting_dates <= np.datetime64(end))
+            mask &= in_span
+        for values, column in ((query_filter.meeting_types, self.meeting_types), (query_filter.file_types, self.file_types)):
+            if values:
+                mask &= (column == '') | np.isin(column, [value.lower() for value in values])
+        return mask
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of `query` to every row, or to `rows`"""
+        count = len(self) if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            selection = slice(start, start + SCORE_BLOCK_ROWS) if rows is None else rows[start:start + SCORE_BLOCK_ROWS]
+            block = self.codes[selection].astype(np.float32) @ query
+            if self.scales is not None:
+                block *= self.scales[selection]
+            scores[start:start + len(block)] = block
+        return scores
+
+
+class LocalVectorIndex:
+    """
+    In-process mirror of the MeetingDocument vectors and properties, searched with NumPy.
+
+    Each sync writes a new generation of files (`codes-<n>.npy`, `objects-<n>.json` and,
+    for large corpora, `ivf-<n>.npz`) and then swaps `manifest.json`, so uvicorn workers
+    can map the same files read-only and pick up new generations without locking.
+    """
+    def __init__(self, directory: str = VectorIndexConfig.LOCAL_VECTOR_INDEX_DIR,
+                 dtype: str = VectorIndexConfig.LOCAL_VECTOR_INDEX_DTYPE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dtype = dtype
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.snapshot: Optional[IndexSnapshot] = None
+        self.searches = 0
+        self._lock_file = None
+        self._write_lock = threading.Lock()
+        self.refresh()
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None and len(self.snapshot) > 0
+
+    def refresh(self) -> bool:
+        """Map the newest generation if another worker (or a sync) wrote one; returns whether it changed"""
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return False
+        if self.snapshot is not None and self.snapshot.generation == manifest['generation']:
+            return False
+        self.snapshot = IndexSnapshot(self.directory, manifest)
+        return True
+
+    def acquire_writer(self) -> bool:
+        """Become the worker that syncs from Weaviate (an exclusive, non-blocking file lock held until close)"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(os.path.join(self.directory, 'sync.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def search(self, vector: Sequence[float], limit: int, query_filter: Optional[QueryFilter] = None,
+               include_vector: bool = False) -> List[SimpleNamespace]:
+        """Nearest chunks to `vector`, shaped like Weaviate near_vector result objects"""
+        snapshot = self.snapshot
+        self.searches += 1
+        query = normalize(vector)
+        rows = None
+        if snapshot.centroids is not None:
+            nearest = np.argsort(snapshot.centroids @ query)[::-1][:VectorIndexConfig.IVF_PROBES]
+            rows = np.concatenate([np.arange(snapshot.offsets[index], snapshot.offsets[index + 1]) for index in nearest])
+        if query_filter:
+            mask = snapshot.filter_mask(query_filter)
+            rows = np.flatnonzero(mask) if rows is None else rows[mask[rows]]
+        scores = snapshot.scores(query, rows)
+        if len(scores) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+
+        results = []
+        for position in top:
+            row = int(position if rows is None else rows[position])
+            entry = snapshot.objects[row]
+            vector_field = {}
+            if include_vector:
+                scales = snapshot.scales[row:row + 1] if snapshot.scales is not None else None
+                vector_field = {'default': decode(snapshot.codes[row:row + 1], scales)[0].tolist()}
+            results.append(SimpleNamespace(
+                uuid=uuid.UUID(entry['uuid']),
+                properties=dict(entry['properties']),
+                metadata=SimpleNamespace(distance=1 - float(scores[position]), score=None),
+                vector=vector_field
+            ))
+        return results
+
+    async def sync(self, collection, page_size: int = VectorIndexConfig.LOCAL_VECTOR_INDEX_PAGE_SIZE) -> Dict[str, int]:
+        """
+        Bring the index up to date with `collection` and write a new generation if anything changed.
+
+        The collection is walked with Weaviate's `after` cursor fetching only IDs and update
+        times; vectors and properties are then fetched just for chunks that are new or changed.
+        """
+        from weaviate.classes.query import Filter, MetadataQuery
+
+        snapshot = self.snapshot if self.snapshot is not None and self.snapshot.dtype == self.dtype else None
+        known = {entry['uuid']: entry['updated'] for entry in snapshot.objects} if snapshot is not None else {}
+
+        seen: Dict[str, int] = {}
+        cursor = None
+        while True:
+            page = await collection.query.fetch_objects(
+                limit=page_size, after=cursor, return_properties=[],
+                return_metadata=MetadataQuery(last_update_time=True)
+            )
+            for item in page.objects:
+                seen[str(item.uuid)] = update_time_ms(item.metadata.last_update_time)
+            if len(page.objects) < page_size:
+                break
+            cursor = page.objects[-1].uuid
+
+        changed = [key for key, updated in seen.items() if known.get(key) != updated]
+        removed = len(known.keys() - seen.keys())
+        if snapshot is not None and not changed and not removed:
+            return {'added': 0, 'updated': 0, 'removed': 0}
+
+        fetched = []
+        for start in range(0, len(changed), page_size):
+            ids = changed[start:start + page_size]
+            page = await collection.query.fetch_objects(
+                limit=len(ids), filters=Filter.by_id().contains_any(ids), include_vector=True,
+                return_metadata=MetadataQuery(last_update_time=True)
+            )
+            fetched.extend(page.objects)
+
+        await asyncio.to_thread(self.write, snapshot, seen, fetched)
+        updated = sum(key in known for key in changed)
+        return {'added': len(changed) - updated, 'updated': updated, 'removed': removed}
+
+    def write(self, snapshot: Optional[IndexSnapshot], seen: Dict[str, int], fetched: List[Any]):
+        """Write the next generation: unchanged rows of `snapshot` plus the `fetched` objects, minus deletions"""
+        fresh = [
+            item for item in fetched
+            if str(item.uuid) in seen and (getattr(item, 'vector', None) or {}).get('default') is not None
+        ]
+        fresh_ids = {str(item.uuid) for item in fresh}
+        kept = [] if snapshot is None else [
+            row for row, key in enumerate(snapshot.uuids) if key in seen and key not in fresh_ids
+        ]
+
+        objects = [snapshot.objects[row] for row in kept] + [
+            {'uuid': str(item.uuid), 'updated': seen[str(item.uuid)], 'properties': item.properties} for item in fresh
+        ]
+        parts = []
+        if kept:
+            parts.append((np.asarray(snapshot.codes[kept]), snapshot.scales[kept] if snapshot.scales is not None else None))
+        if fresh:
+            parts.append(encode(np.asarray([item.vector['default'] for item in fresh]), self.dtype))
+        if not parts:
+            # Every chunk was deleted; an empty generation keeps the index from serving stale rows
+            dimensions = snapshot.codes.shape[1] if snapshot is not None else 0
+            parts.append(encode(np.zeros((0, dimensions)), self.dtype))
+        codes = np.concatenate([part[0] for part in parts])
+        scales = np.concatenate([part[1] for part in parts]) if parts[0][1] is not None else None
+
+        ivf = None
+        if len(objects) >= VectorIndexConfig.IVF_MIN_ROWS:
+            lists = int(np.sqrt(len(objects)))
+            centroids, assignment = build_ivf(decode(codes, scales), lists)
+            # Store each list's rows contiguously so a probe scans one slice
+            order = np.argsort(assignment, kind='stable')
+            codes, objects = codes[order], [objects[row] for row in order]
+            scales = scales[order] if scales is not None else None
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=lists))])
+            ivf = (centroids, offsets)
+
+        with self._write_lock:
+            generation = (snapshot.generation if snapshot is not None else self._current_generation()) + 1
+            path = lambda name: os.path.join(self.directory, name)  # noqa: E731
+            np.save(path(f'codes-{generation}.npy'), codes)
+            if scales is not None:
+                np.save(path(f'scales-{generation}.npy'), scales)
+            if ivf is not None:
+                np.savez(path(f'ivf-{generation}.npz'), centroids=ivf[0], offsets=ivf[1])
+            with open(path(f'objects-{generation}.json'), 'w') as f:
+                json.dump(objects, f, default=str)
+            temporary_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+            with open(temporary_path, 'w') as f:
+                json.dump({'generation': generation, 'dtype': self.dtype, 'rows': len(objects), 'synced_at': time.time()}, f)
+            os.replace(temporary_path, self.manifest_path)
+            self.refresh()
+            self._remove_generations_before(generation - 1)
+
+    def _current_generation(self) -> int:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)['generation']
+        except FileNotFoundError:
+            return 0
+
+    def _remove_generations_before(self, generation: int):
+        """Delete old generations (workers still mapping one keep it readable until they refresh)"""
+        for name in os.listdir(self.directory):
+            stem, _, extension = name.rpartition('.')
+            prefix, _, number = stem.rpartition('-')
+            if prefix in ('codes', 'scales', 'objects', 'ivf') and number.isdigit() and int(number) < generation:
+                os.remove(os.path.join(self.directory, name))
+
+    def close(self):
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            'mode': VectorIndexConfig.LOCAL_VECTOR_INDEX,
+            'dtype': snapshot.dtype if snapshot is not None else self.dtype,
+            'rows': len(snapshot) if snapshot is not None else 0,
+            'generation': snapshot.generation if snapshot is not None else None,
+            'ivf_lists': len(snapshot.centroids) if snapshot is not None and snapshot.centroids is not None else None,
+            'synced_at': snapshot.synced_at if snapshot is not None else None,
+            'writer': self._lock_file is not None,
+            'searches': self.searches,
+        }
@@ -1,3 +1,5 @@
+import json
+
 import streamlit as st
 import requests
 
@@ -18,6 +20,36 @@ import requests
 
 NUM_IMAGES_PER_ROW = 3
 
+BACKEND_URL = "http://host.docker.internal:8000"  # Adjust URL as needed
+
+def create_session() -> str:
+    """Start a conversation session on the backend, which keeps the chat history."""
+    response = requests.post(f"{BACKEND_URL}/sessions", timeout=30)
+    response.raise_for_status()
+    return response.json()["session_id"]
+
+def stream_backend_events(prompt: str):
+    """Yield (event, data) pairs from the backend's Server-Sent Events stream for the next turn of the session."""
+    for attempt in range(2):
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = create_session()
+        url = f"{BACKEND_URL}/sessions/{st.session_state.session_id}/prompt/stream"
+        with requests.post(url, json={"user_prompt_text": prompt}, stream=True) as response:
+            if response.status_code == 404 and attempt == 0:
+                # The session expired on the backend; continue in a new one
+                del st.session_state.session_id
+                continue
+            if response.status_code != 200:
+                yield "error", {"generated_response": f"API Error: {response.text}"}
+                return
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[len("event:"):].strip()
+                elif line.startswith("data:"):
+                    yield event, json.loads(line[len("data:"):])
+            return
+
 def display_chat_messages() -> None:
     """Display chat message history."""
     for message in st.session_state.messages:
@@ -116,29 +148,24 @@ if prompt := (st.chat_input("Type your prompt") or button_pressed):
     st.session_state.messages.append({"role": "user", "content": prompt})
 
     try:
-        # Make API call to backend
-        response = requests.post(
-            "http://host.docker.internal:8000/process-prompt",  # Adjust URL as needed
-            json={"user_prompt_text": prompt}
-        )
-        
-        # Check if request was successful
-        if response.status_code == 200:
-            # Extract the generated response
-            generated_response = response.json().get('generated_response', 'No response generated')
-            
-            # Display the response
-            with st.chat_message("assistant"):
-                st.markdown(generated_response)
-            
-            # Add to message history
-            st.session_state.messages.append({
-                "role": "assistant", 
-                "content": generated_response
-            })
-        else:
-            st.error(f"API Error: {response.text}")
+        # Stream the answer from the backend, showing tokens as they arrive
+        generated_response = ""
+        with st.chat_message("assistant"):
+            placeholder = st.empty()
+            for event, data in stream_backend_events(prompt):
+                if event == "token":
+                    generated_response += data["text"]
+                    placeholder.markdown(generated_response + "▌")
+                elif event in ("done", "error"):
+                    # The final event carries the confirmed (or replacement) response
+                    generated_response = data.get("generated_response", "No response generated")
+            placeholder.markdown(generated_response or "No response generated")
+
+        # Add to message history
+        st.session_state.messages.append({
+            "role": "assistant", 
+            "content": generated_response or "No response generated"
+        })
     
     except requests.RequestException as e:
         st.error(f"Connection error: {e}")
-
@@ -6,6 +6,21 @@ import requests
 import json
 
 
+def fetch_responses(prompts):
+    """Send all prompts to the batch endpoint and return the generated responses in prompt order"""
+    response = requests.post(
+        "http://127.0.0.1:8000/process-prompts",  # Adjust URL as needed
+        json={"prompts": [{"user_prompt_text": prompt} for prompt in prompts]},
+        stream=True
+    )
+    generated = {}
+    for line in response.iter_lines():
+        if line:
+            result = json.loads(line)
+            generated[result["index"]] = result["response"].get('generated_response', 'No response generated')
+    return [generated.get(i, 'No response generated') for i in range(len(prompts))]
+
+
 def test_cases():
     answer_relevancy_metric = AnswerRelevancyMetric(threshold=0.8)
     answer_faithfulness_metric = FaithfulnessMetric(threshold=0.5)
@@ -16,17 +31,13 @@ def test_cases():
 
     with open('MinuteMate\\test\\test_data.json', 'r') as file:
         data = json.load(file)
+    generated_responses = fetch_responses([item["prompt"] for item in data])
     
-    for item in data:
+    for item, generated_response in zip(data, generated_responses):
         input=item["prompt"]
         retrieval_context = item["retrieval_context"]
         expected_output = item["expected_output"]
         print (input) 
-        response = requests.post(
-                "http://127.0.0.1:8000/process-prompt",  # Adjust URL as needed
-                json={"user_prompt_text": input}
-            )
-        generated_response = response.json().get('generated_response', 'No response generated')
         print(generated_response)
         test_case_1 = LLMTestCase(
             input=input,
@@ -50,17 +61,13 @@ def test_case_hallucination():
     answer_hallucination_metric = HallucinationMetric(threshold=0.5)
     with open('MinuteMate\\test\\test_data_hallucination.json', 'r') as file:
         data = json.load(file)
+    generated_responses = fetch_responses([item["prompt"] for item in data])
     
-    for item in data:
+    for item, generated_response in zip(data, generated_responses):
         input=item["prompt"]
         retrieval_context = item["retrieval_context"]
         expected_output = item["expected_output"]
         print (input) 
-        response = requests.post(
-                "http://127.0.0.1:8000/process-prompt",  # Adjust URL as needed
-                json={"user_prompt_text": input}
-            )
-        generated_response = response.json().get('generated_response', 'No response generated')
         print(generated_response)
 
         test_case_3 = LLMTestCase(
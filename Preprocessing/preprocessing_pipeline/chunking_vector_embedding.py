@@ -1,3 +1,4 @@
+import os
 import streamlit as st
 import requests
 import weaviate
@@ -56,6 +57,7 @@ def fetch_matching_chunks(meeting_date, meeting_type, file_type, source_document
                     {{ path: ["source_document"], operator: Equal, valueString: "{source_document}" }}
                 ]
             }}) {{
+                content
                 _additional {{
                     id
                 }}
@@ -81,6 +83,42 @@ def delete_matching_chunks(documents):
         print(f"Deleted chunk ID: {doc_id}")
 
 
+def notify_backend_of_ingestion(added_chunks=None, removed_chunks=None):
+    """
+    Tell the MinuteMate backend about new chunks: drop cached answers and update keyword statistics.
+
+    Does nothing unless MINUTEMATE_BACKEND_URL is set. The backend also notices
+    ingestion on its own by polling the MeetingDocument count, so a failed
+    notification only delays the cache refresh; keyword statistics stay stale
+    until the next successful update or a rebuild.
+
+    Args:
+        added_chunks (list): Content of the chunks just uploaded.
+        removed_chunks (list): Content of the chunks deleted before re-uploading.
+    """
+    backend_url = os.getenv("MINUTEMATE_BACKEND_URL")
+    if not backend_url:
+        return
+
+    headers = {"X-Admin-Token": os.getenv("CACHE_ADMIN_TOKEN", "")}
+    try:
+        response = requests.post(
+            f"{backend_url.rstrip('/')}/keywords/corpus",
+            headers=headers,
+            json={"added": added_chunks or [], "removed": removed_chunks or []},
+            timeout=30
+        )
+        print(f"Backend keyword statistics update: {response.status_code}")
+        response = requests.post(
+            f"{backend_url.rstrip('/')}/cache/invalidate",
+            headers=headers,
+            timeout=5
+        )
+        print(f"Backend cache invalidation: {response.status_code}")
+    except requests.RequestException as e:
+        print(f"Could not notify backend of ingestion: {e}")
+
+
 def tokenize_and_embed_text(clean_file_name, metadata, max_chunk_size=250):
     """
     Tokenizes, chunks, and embeds cleaned text into Weaviate.
@@ -111,6 +149,7 @@ def tokenize_and_embed_text(clean_file_name, metadata, max_chunk_size=250):
 
         # Check for existing embeddings
         matching_chunks = fetch_matching_chunks(meeting_date, meeting_type, file_type, source_document)
+        removed_chunks = [doc.get("content") or "" for doc in matching_chunks]
         if matching_chunks:
             print(f"Found {len(matching_chunks)} existing chunks. Deleting...")
             delete_matching_chunks(matching_chunks)
@@ -146,6 +185,7 @@ def tokenize_and_embed_text(clean_file_name, metadata, max_chunk_size=250):
             print(f"Uploaded chunk {i + 1}/{len(chunks)} to Weaviate.")
 
         print("Successfully processed and embedded all chunks.")
+        notify_backend_of_ingestion(chunks, removed_chunks)
 
     except Exception as e:
         print(f"Error during tokenization and embedding: {e}")